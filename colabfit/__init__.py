@@ -19,6 +19,8 @@ _PROPDEFS_COLLECTION        = 'property_definitions'
 _PROPSETTINGS_COLLECTION    = 'property_settings'
 _CONFIGSETS_COLLECTION      = 'configuration_sets'
 _DATASETS_COLLECTION        = 'datasets'
+_CONFIGSET_LINKS_COLLECTION = 'configuration_set_links'
+_DATASET_LINKS_COLLECTION   = 'dataset_links'
 
 ATOMS_NAME_FIELD            = '_name'
 ATOMS_LABELS_FIELD          = '_labels'
@@ -0,0 +1,93 @@
+"""
+Simple timings of the CPU-bound steps of the converters and of
+MongoDatabase.insert_data(). These don't require a running Mongo server.
+
+Usage:
+
+    python colabfit/tests/benchmark_ingestion.py [nconfigurations]
+"""
+
+import sys
+import time
+import numpy as np
+from ase import Atoms
+
+from colabfit.tools.configuration import Configuration
+from colabfit.tools.property import Property
+
+
+definition = {
+    'property-id': 'benchmark-energy-forces-stress',
+    'property-title': 'A property used for benchmarking',
+    'property-description': 'A description of the property',
+    'energy': {'type': 'float', 'has-unit': True, 'extent': [], 'required': True, 'description': 'empty'},
+    'forces': {'type': 'float', 'has-unit': True, 'extent': [':', 3], 'required': True, 'description': 'empty'},
+    'stress': {'type': 'float', 'has-unit': True, 'extent': [6], 'required': True, 'description': 'empty'},
+}
+
+property_map = {
+    'energy': {'field': 'energy', 'units': 'eV'},
+    'forces': {'field': 'forces', 'units': 'eV/Ang'},
+    'stress': {'field': 'stress', 'units': 'GPa'},
+}
+
+
+def build_atoms(n, natoms=64):
+    images = []
+    for _ in range(n):
+        atoms = Atoms(
+            f'Si{natoms}', positions=np.random.random((natoms, 3)),
+            cell=np.eye(3)*10, pbc=True
+        )
+
+        atoms.info['energy'] = np.random.random()
+        atoms.info['stress'] = np.random.random(6)
+        atoms.arrays['forces'] = np.random.random((natoms, 3))
+
+        images.append(atoms)
+
+    return images
+
+
+def build_configurations(n, natoms=64):
+    return [Configuration.adopt(atoms) for atoms in build_atoms(n, natoms)]
+
+
+def benchmark_conversion(images, method):
+    """Times the per-frame conversion done at the end of the converters"""
+
+    start = time.perf_counter()
+
+    for atoms in images:
+        method(atoms)
+
+    return time.perf_counter() - start
+
+
+def benchmark_from_definition(configurations):
+    start = time.perf_counter()
+
+    for conf in configurations:
+        Property.from_definition(definition, conf, property_map)
+
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    images = build_atoms(n)
+
+    for name, method in [
+        ('Configuration.from_ase', Configuration.from_ase),
+        ('Configuration.adopt', Configuration.adopt),
+    ]:
+        runtime = benchmark_conversion(images, method)
+        print('{}: {:.1f} us/configuration'.format(name, runtime/n*1e6))
+
+    configurations = build_configurations(n)
+
+    runtime = benchmark_from_definition(configurations)
+    print('Property.from_definition: {:.1f} us/configuration'.format(
+        runtime/n*1e6
+    ))
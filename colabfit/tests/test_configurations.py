@@ -1,9 +1,13 @@
 import unittest
 import numpy as np
 from ase import Atoms
+from ase.constraints import FixAtoms
 
 from colabfit import ATOMS_CONSTRAINTS_FIELD, ATOMS_NAME_FIELD, ATOMS_LABELS_FIELD
-from colabfit.tools.configuration import Configuration
+from colabfit.tools.configuration import (
+    Configuration, ConfigurationView, hash_many, process_species_list,
+    process_species_many, _digest_arrays
+)
 
 
 class TestConfigurations(unittest.TestCase):
@@ -45,6 +49,37 @@ class TestConfigurations(unittest.TestCase):
         np.testing.assert_allclose(np.array(conf.pbc), np.array([True]*3))
 
 
+    def test_adopt(self):
+        atoms = Atoms(
+            'H4', positions=np.random.random((4, 3)), cell=np.eye(3), pbc=True,
+            constraint=FixAtoms(indices=[0, 2])
+        )
+        atoms.info[ATOMS_NAME_FIELD] = 'test'
+        atoms.info['energy'] = 1.0
+        atoms.arrays['forces'] = np.random.random((4, 3))
+
+        conf = Configuration.adopt(atoms)
+        reference = Configuration.from_ase(atoms.copy())
+
+        self.assertEqual(hash(conf), hash(reference))
+        self.assertEqual(conf.info[ATOMS_NAME_FIELD], {'test'})
+        self.assertSetEqual(conf.info[ATOMS_LABELS_FIELD], set())
+        self.assertEqual(conf.info['energy'], 1.0)
+        self.assertEqual(atoms.info[ATOMS_NAME_FIELD], 'test')
+
+        # Arrays are shared, not copied
+        self.assertIs(conf.arrays['positions'], atoms.arrays['positions'])
+        self.assertIs(conf.arrays['forces'], atoms.arrays['forces'])
+
+        self.assertEqual(len(conf.constraints), 1)
+        np.testing.assert_equal(conf.constraints[0].index, [0, 2])
+
+        # from_ase() converts the constraints of the Atoms to dictionaries
+        Configuration.from_ase(atoms)
+        conf = Configuration.adopt(atoms)
+        self.assertIsInstance(conf.constraints[0], FixAtoms)
+
+
     def test_hashing_identical(self):
         atoms = Atoms('H4', pbc=True)
         atoms.info[ATOMS_NAME_FIELD] = 'test'
@@ -101,6 +136,96 @@ class TestConfigurations(unittest.TestCase):
         self.assertEqual(hash(conf1), hash(conf3))
 
 
+    def test_hashing_cache_invalidated(self):
+        conf = Configuration.from_ase(Atoms(
+            'H4', positions=np.random.random((4, 3)), cell=np.eye(3), pbc=True
+        ))
+
+        h0 = hash(conf)
+
+        # In-place changes
+        x = conf.positions[0, 0]
+        conf.positions[0, 0] += 1
+        self.assertNotEqual(hash(conf), h0)
+        conf.positions[0, 0] = x
+        self.assertEqual(hash(conf), h0)
+
+        conf.numbers[0] = 2
+        self.assertNotEqual(hash(conf), h0)
+        conf.numbers[0] = 1
+        self.assertEqual(hash(conf), h0)
+
+        conf.set_cell(np.eye(3)*2)
+        self.assertNotEqual(hash(conf), h0)
+        conf.set_cell(np.eye(3))
+        self.assertEqual(hash(conf), h0)
+
+        conf.pbc[1] = False
+        self.assertNotEqual(hash(conf), h0)
+        conf.pbc = True
+        self.assertEqual(hash(conf), h0)
+
+        # The cache key also depends on the dtypes and shapes of the arrays
+        a = np.zeros(4)
+        digests = {
+            _digest_arrays(a),
+            _digest_arrays(a.reshape(2, 2)),
+            _digest_arrays(a.view(np.int64)),
+        }
+        self.assertEqual(len(digests), 3)
+
+
+    def test_hash_many(self):
+        configurations = [
+            Configuration.from_ase(Atoms(
+                f'H{n}', positions=np.random.random((n, 3)),
+                cell=np.random.random((3, 3)), pbc=[True, False, True]
+            ))
+            for n in [1, 4, 2, 7]
+        ]
+
+        hashes = hash_many(
+            np.concatenate([c.positions for c in configurations]),
+            np.concatenate([c.numbers for c in configurations]),
+            np.stack([np.array(c.cell) for c in configurations]),
+            np.stack([c.pbc for c in configurations]),
+            [len(c) for c in configurations],
+        )
+
+        self.assertListEqual(hashes, [hash(c) for c in configurations])
+
+
+    def test_process_species_list(self):
+        fields = process_species_list(Atoms('OFe2O2H2'))
+
+        self.assertEqual(fields['natoms'], 7)
+        self.assertListEqual(fields['elements'], ['Fe', 'H', 'O'])
+        self.assertEqual(fields['nelements'], 3)
+        np.testing.assert_allclose(fields['elements_ratios'], [2/7, 2/7, 3/7])
+        self.assertEqual(fields['chemical_formula_reduced'], 'Fe2H2O3')
+        self.assertEqual(fields['chemical_formula_anonymous'], 'A3B2C2')
+
+        # Cached results shouldn't be shared between calls
+        fields['elements'].append('X')
+        self.assertListEqual(
+            process_species_list(Atoms('Fe2H2O3'))['elements'],
+            ['Fe', 'H', 'O']
+        )
+
+
+    def test_process_species_many(self):
+        images = [Atoms('H2O'), Atoms('Si8'), Atoms('OFe2O2H2'), Atoms('H2O')]
+
+        metadata = process_species_many(
+            np.concatenate([atoms.numbers for atoms in images]),
+            [len(atoms) for atoms in images]
+        )
+
+        self.assertListEqual(
+            metadata, [process_species_list(atoms) for atoms in images]
+        )
+
+
     # def test_constrained_hashing_same(self):
     #     atoms = Atoms('H4', pbc=True)
     #     atoms.info[ATOMS_NAME_FIELD] = 'test'
@@ -155,4 +280,40 @@ class TestConfigurations(unittest.TestCase):
     #     conf1 = Configuration.from_ase(atoms)
     #     conf2 = Configuration.from_ase(atoms2)
 
-    #     self.assertNotEqual(hash(conf1), hash(conf2))
\ No newline at end of file
+    #     self.assertNotEqual(hash(conf1), hash(conf2))
+
+
+class TestConfigurationViews(unittest.TestCase):
+    def test_view(self):
+        positions = np.random.random((3, 3))
+        positions.flags.writeable = False
+
+        view = ConfigurationView(
+            numbers=np.array([8, 1, 1]),
+            positions=positions,
+            cell=np.eye(3)*10,
+            pbc=np.array([True, True, False]),
+            info={'_id': 'CO_1', ATOMS_LABELS_FIELD: {'label1'}},
+            arrays={'forces': np.ones((3, 3))},
+        )
+
+        # The buffers are wrapped without copying
+        self.assertIs(view.positions, positions)
+        self.assertEqual(len(view), 3)
+        self.assertListEqual(view.get_chemical_symbols(), ['O', 'H', 'H'])
+
+        conf = view.to_configuration()
+
+        self.assertIsInstance(conf, Configuration)
+        self.assertEqual(hash(view), hash(conf))
+        self.assertEqual(conf.info['_id'], 'CO_1')
+        self.assertSetEqual(conf.info[ATOMS_LABELS_FIELD], {'label1'})
+        np.testing.assert_allclose(conf.arrays['forces'], np.ones((3, 3)))
+
+        # The Configuration has its own copy of the data
+        conf.positions[0, 0] = -1
+        self.assertNotEqual(view.positions[0, 0], -1)
+
+        atoms = view.to_atoms()
+        self.assertNotIsInstance(atoms, Configuration)
+        self.assertEqual(atoms.get_chemical_formula(), 'H2O')
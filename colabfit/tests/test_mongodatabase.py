@@ -5,10 +5,12 @@ np.random.seed(42)
 import random
 random.seed(42)
 from ase import Atoms
+from ase.io import write as ase_write
 
 from colabfit import ATOMS_NAME_FIELD, ATOMS_LABELS_FIELD, ID_FORMAT_STRING
-from colabfit.tools.configuration import Configuration
-from colabfit.tools.database import MongoDatabase
+from colabfit.tools.configuration import Configuration, ConfigurationView
+from colabfit.tools.database import MongoDatabase, load_data
+from colabfit.tools.property import Property
 from colabfit.tools.property_settings import PropertySettings
 
 
@@ -1009,6 +1011,42 @@ class TestConfigurationSets:
 
                 assert img == img2
 
+
+    def test_aggregate_configuration_info(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+
+        images = []
+        for symbols, labels in [
+            ('H2O', {'water'}), ('H2O', {'water', 'md'}), ('CH4', {'md'}),
+            ]:
+            atoms = Atoms(symbols, cell=np.eye(3)*10, pbc=True)
+            atoms.positions = np.random.random((len(atoms), 3))
+            atoms.info[ATOMS_LABELS_FIELD] = labels
+            images.append(Configuration.from_ase(atoms))
+
+        ids = [_[0] for _ in database.insert_data(images)]
+
+        info = database.aggregate_configuration_info(ids)
+
+        assert info['nconfigurations'] == 3
+        assert info['nsites'] == 11
+        assert info['nelements'] == 3
+        assert sorted(info['elements']) == ['C', 'H', 'O']
+        assert sorted(info['chemical_systems']) == ['CH', 'HO']
+        np.testing.assert_allclose(
+            [info['total_elements_ratios'][e] for e in ['C', 'H', 'O']],
+            [1/11, 8/11, 2/11]
+        )
+        assert sorted(info['individual_elements_ratios']['H']) == [0.67, 0.8]
+        assert dict(zip(info['labels'], info['labels_counts'])) == {
+            'water': 2, 'md': 2
+        }
+        assert sorted(info['chemical_formula_hill']) == ['CH4', 'H2O']
+        assert info['nperiodic_dimensions'] == [3]
+        assert info['dimension_types'] == [(1, 1, 1)]
+
+        database.drop_database(database.database_name)
+
 class TestDatasets:
     database_name = 'colabfit_test'
 
@@ -1083,4 +1121,1091 @@ class TestDatasets:
             )
 
             ds_doc = next(database.datasets.find({'_id': ds_id}))
-            assert ds_doc['authors'] == ['colabfit']
\ No newline at end of file
+            assert ds_doc['authors'] == ['colabfit']
+
+    def test_aggregate_property_info(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+
+        pr_ids = [_[1] for _ in database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )]
+
+        database.properties.update_many(
+            {'_id': {'$in': pr_ids[:2]}},
+            {'$addToSet': {'labels': 'label1', 'methods': 'DFT'}}
+        )
+
+        info = database.aggregate_property_info(pr_ids)
+
+        assert info['types'] == ['default']
+        assert info['types_counts'] == [5]
+        assert sorted(info['fields']) == [
+            'default.energy', 'default.forces', 'default.stress'
+        ]
+        assert info['fields_counts'] == [5, 5, 5]
+        assert info['methods'] == ['DFT']
+        assert info['methods_counts'] == [2]
+        assert info['labels'] == ['label1']
+        assert info['labels_counts'] == [2]
+
+        database.drop_database(database.database_name)
+
+
+    def test_incremental_aggregated_info(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(6)[0]
+
+        co_ids, pr_ids = zip(*database.insert_data(
+            images, property_map=TestInsertData.property_map
+        ))
+
+        # The configuration sets share two configurations
+        cs_id1 = database.insert_configuration_set(co_ids[:4])
+        cs_id2 = database.insert_configuration_set(co_ids[2:])
+
+        ds_id = database.insert_dataset(
+            cs_ids=[cs_id1, cs_id2], pr_ids=pr_ids, name='example_dataset'
+        )
+
+        ds_info = database.datasets.find_one({'_id': ds_id})['aggregated_info']
+        assert ds_info['nconfigurations'] == 6
+        assert ds_info['nsites'] == sum(len(img) for img in images)
+
+        assert database.apply_labels(
+            ds_id, 'configurations', {'_id': {'$in': list(co_ids[1:4])}},
+            {'label1', 'label2'}
+        ) == 3
+        assert database.apply_labels(
+            ds_id, 'configurations', {'_id': co_ids[3]}, 'label1'
+        ) == 0
+        assert database.apply_labels(
+            ds_id, 'properties', {'_id': {'$in': list(pr_ids[:2])}}, 'label3'
+        ) == 2
+
+        def counts(info, k):
+            return dict(zip(info[k], info[k+'_counts']))
+
+        cs_info = database.configuration_sets.find_one(
+            {'_id': cs_id1}
+        )['aggregated_info']
+        assert counts(cs_info, 'labels') == {'label1': 3, 'label2': 3}
+
+        ds_info = database.datasets.find_one({'_id': ds_id})['aggregated_info']
+        assert counts(ds_info, 'configuration_labels') == {
+            'label1': 3, 'label2': 3
+        }
+        assert counts(ds_info, 'property_labels') == {'label3': 2}
+
+        # Should match a full re-synchronization
+        database.resync_dataset(ds_id)
+
+        resynced = database.datasets.find_one({'_id': ds_id})['aggregated_info']
+        for k in ['configuration_labels', 'property_labels', 'property_types']:
+            assert counts(ds_info, k) == counts(resynced, k)
+
+        for k in ['nconfigurations', 'nsites', 'nelements']:
+            assert ds_info[k] == resynced[k]
+
+        for e, ratio in resynced['total_elements_ratios'].items():
+            np.testing.assert_allclose(ds_info['total_elements_ratios'][e], ratio)
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('nprocs', [1, 2])
+    def test_reingested_labels(self, nprocs):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(6)[0]
+
+        co_ids, pr_ids = zip(*database.insert_data(
+            images, property_map=TestInsertData.property_map
+        ))
+
+        cs_id1 = database.insert_configuration_set(co_ids[:4])
+        cs_id2 = database.insert_configuration_set(co_ids[2:])
+
+        ds_id = database.insert_dataset(
+            cs_ids=[cs_id1, cs_id2], pr_ids=pr_ids, name='example_dataset'
+        )
+
+        # Re-ingesting existing configurations merges the new labels into
+        # them, which should also update the stored summaries at each flush.
+        # The repeated configuration should only be counted once.
+        for img in images[1:4]:
+            img.info[ATOMS_LABELS_FIELD] = {'newlabel'}
+
+        database.nprocs = nprocs
+
+        with pytest.warns(UserWarning):
+            database.insert_data(
+                images[1:4] + images[3:4],
+                property_map=TestInsertData.property_map,
+                chunk_size=2,
+                flush_size=1,
+            )
+
+        def counts(info, k):
+            return dict(zip(info[k], info[k+'_counts']))
+
+        cs_info = database.configuration_sets.find_one(
+            {'_id': cs_id1}
+        )['aggregated_info']
+        assert counts(cs_info, 'labels') == {'newlabel': 3}
+
+        cs_info = database.configuration_sets.find_one(
+            {'_id': cs_id2}
+        )['aggregated_info']
+        assert counts(cs_info, 'labels') == {'newlabel': 2}
+
+        ds_info = database.datasets.find_one({'_id': ds_id})['aggregated_info']
+        assert counts(ds_info, 'configuration_labels') == {'newlabel': 3}
+
+        # A new dataset built from the stored summaries matches a fresh
+        # aggregation
+        ds_id2 = database.insert_dataset(
+            cs_ids=cs_id1, pr_ids=pr_ids[:4], name='example_dataset2'
+        )
+
+        ds_info = database.datasets.find_one({'_id': ds_id2})['aggregated_info']
+        info = database.aggregate_configuration_info(list(co_ids[:4]))
+
+        assert ds_info['configuration_labels'] == info['labels'] == ['newlabel']
+        assert ds_info['configuration_labels_counts'] == info['labels_counts']
+
+        database.close()
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('nprocs', [1, 2])
+    def test_resync_configuration_sets(self, nprocs):
+        database = MongoDatabase(
+            self.database_name, nprocs=nprocs, drop_database=True
+        )
+
+        images = build_n(6)[0]
+        for img in images[:3]:
+            img.info[ATOMS_LABELS_FIELD] = {'label1'}
+
+        co_ids = [_[0] for _ in database.insert_data(images)]
+
+        cs_id1 = database.insert_configuration_set(co_ids[:4])
+        cs_id2 = database.insert_configuration_set(co_ids[2:])
+
+        database.configuration_sets.update_many(
+            {}, {'$unset': {'aggregated_info': '', 'aggregated_summary': ''}}
+        )
+
+        summary = database.resync_configuration_sets([cs_id1, cs_id2])
+
+        assert summary['nconfigurations'] == 6
+        assert summary['labels'] == [['label1', 3]]
+
+        for cs_id, ids in [(cs_id1, co_ids[:4]), (cs_id2, co_ids[2:])]:
+            cs_info = database.configuration_sets.find_one(
+                {'_id': cs_id}
+            )['aggregated_info']
+            info = database.aggregate_configuration_info(ids)
+
+            for k in ['nconfigurations', 'nsites', 'labels', 'labels_counts']:
+                assert cs_info[k] == info[k]
+
+            assert sorted(cs_info['elements']) == sorted(info['elements'])
+
+        database.close()
+        database.drop_database(database.database_name)
+
+
+
+    def test_summarize_overlapping_sets(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+
+        images = build_n(12)[0]
+        for i, img in enumerate(images):
+            img.info[ATOMS_LABELS_FIELD] = {'a', 'b'} if i % 2 else {'b'}
+
+        co_ids = [_[0] for _ in database.insert_data(images)]
+
+        # Nested and overlapping sets, one of which has no stored summary
+        cs_ids = [
+            database.insert_configuration_set(co_ids[:8]),
+            database.insert_configuration_set(co_ids[2:6]),
+            database.insert_configuration_set(co_ids[4:]),
+        ]
+
+        database.configuration_sets.update_one(
+            {'_id': cs_ids[1]}, {'$unset': {'aggregated_summary': ''}}
+        )
+
+        summary = database.summarize_configuration_sets(cs_ids)
+        expected = database.summarize_configurations(co_ids)
+
+        for k, v in expected.items():
+            if isinstance(v, list):
+                assert sorted(map(repr, summary[k])) == sorted(map(repr, v))
+            else:
+                assert summary[k] == v
+
+        database.drop_database(database.database_name)
+
+
+class TestIndexes:
+    database_name = 'colabfit_test'
+
+    def test_ensure_indexes(self):
+        database = MongoDatabase(
+            self.database_name, create_indexes=False, drop_database=True
+        )
+
+        assert 'type_1' not in database.properties.index_information()
+
+        names = database.ensure_indexes(property_fields='default.energy')
+
+        assert 'default.energy.source-value_1' in names['properties']
+        assert 'type_1' in database.properties.index_information()
+        assert 'chemical_formula_reduced_1' in database.configurations.index_information()
+        assert database.configuration_set_links.index_information()[
+            'configuration_set_1_configuration_1'
+        ]['unique']
+
+        # Creating the indexes again is a no-op
+        database = MongoDatabase(self.database_name)
+        assert names == database.ensure_indexes(property_fields='default.energy')
+
+        database.drop_database(database.database_name)
+
+
+    def test_index_report(self):
+        database = MongoDatabase(
+            self.database_name, create_indexes=False, drop_database=True
+        )
+
+        # Collections need to exist for their queries to be planned
+        database.insert_property_definition(TestInsertData.property_definition)
+        database.insert_data(
+            build_n(2)[0], property_map=TestInsertData.property_map
+        )
+
+        report = database.index_report()
+        assert any(r['collection_scan'] for r in report)
+
+        database.ensure_indexes()
+
+        report = database.index_report()
+        assert not any(r['collection_scan'] for r in report)
+
+        database.drop_database(database.database_name)
+
+
+class TestAttachProperties:
+    database_name = 'colabfit_test'
+
+    def test_client_join(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        property_map = {'default': [{
+            **TestInsertData.property_map['default'][0],
+            '_settings': {
+                '_method': 'VASP',
+                '_description': 'A basic test calculation',
+                '_files': None,
+                '_labels': ['PBE'],
+            }
+        }]}
+
+        images = build_n(5)[0]
+        ids = database.insert_data(images, property_map=property_map)
+        co_ids = [_[0] for _ in ids]
+        pr_ids = [_[1] for _ in ids]
+
+        lookup = database.get_configurations(co_ids, attach_properties=True)
+        client = database.get_configurations(
+            co_ids, attach_properties=True, join='client'
+        )
+
+        assert len(lookup) == len(client)
+
+        for c1, c2 in zip(lookup, client):
+            assert c1.info['_id'] == c2.info['_id']
+            assert set(c1.info) == set(c2.info)
+            assert set(c1.arrays) == set(c2.arrays)
+
+            for k in ['default.forces', 'default.stress']:
+                dct = c1.arrays if k in c1.arrays else c1.info
+                np.testing.assert_allclose(
+                    dct[k], (c2.arrays if k in c2.arrays else c2.info)[k]
+                )
+
+        client = database.get_configurations(
+            co_ids, property_ids=pr_ids[:2], attach_properties=True,
+            attach_settings=True, join='client'
+        )
+
+        assert len(client) == 2
+        assert all('_settings._id' in c.info for c in client)
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('parallel', ['threads', 'processes'])
+    @pytest.mark.parametrize('ordered', [True, False])
+    def test_parallel(self, parallel, ordered, monkeypatch):
+        monkeypatch.setattr('colabfit.tools.database._PARTITION_SIZE', 3)
+
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(10)[0]
+        ids = database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )
+        co_ids = [_[0] for _ in ids]
+
+        serial = database.get_configurations(co_ids, attach_properties=True)
+
+        database.nprocs = 2
+
+        for configuration_ids in [co_ids, 'all']:
+            configurations = database.get_configurations(
+                configuration_ids, attach_properties=True, parallel=parallel,
+                ordered=ordered
+            )
+
+            found = [c.info['_id'] for c in configurations]
+            expected = [c.info['_id'] for c in serial]
+
+            if ordered:
+                assert found == expected
+            else:
+                assert sorted(found) == sorted(expected)
+
+            for c in configurations:
+                assert 'default.forces' in c.arrays
+
+        database.drop_database(database.database_name)
+        database.close()
+
+
+    def test_views(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        ids = database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )
+        co_ids = [_[0] for _ in ids]
+
+        configurations = database.get_configurations(
+            co_ids, attach_properties=True
+        )
+        views = database.get_configurations(
+            co_ids, attach_properties=True, views=True
+        )
+
+        for conf, view in zip(configurations, views):
+            assert isinstance(view, ConfigurationView)
+            assert hash(conf) == hash(view)
+            assert conf.info.keys() == view.to_configuration().info.keys()
+            assert conf.info['_id'] == view.info['_id']
+
+            np.testing.assert_allclose(
+                conf.arrays['default.forces'],
+                view.to_configuration().arrays['default.forces']
+            )
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('join', ['lookup', 'client'])
+    def test_property_fields(self, join):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        ids = database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )
+
+        configurations = database.get_configurations(
+            [_[0] for _ in ids], attach_properties=True,
+            property_fields=['default.forces'], join=join
+        )
+
+        for img, conf in zip(images, configurations):
+            assert 'default.forces' in conf.arrays
+            assert 'default.stress' not in conf.info
+            assert 'default.energy' not in conf.info
+            assert 'default.energy' not in conf.arrays
+
+        database.drop_database(database.database_name)
+
+
+class TestLinkCollections:
+    database_name = 'colabfit_test'
+
+    def test_link_collections(self):
+        database = MongoDatabase(
+            self.database_name, link_collections=True, drop_database=True
+        )
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(6)[0]
+        for img in images[:2]:
+            img.info['energy'] = -1
+
+        co_ids, pr_ids = zip(*database.insert_data(
+            images, property_map=TestInsertData.property_map
+        ))
+
+        cs_id1 = database.insert_configuration_set(co_ids[:4])
+        cs_id2 = database.insert_configuration_set(co_ids[2:])
+
+        ds_id = database.insert_dataset(
+            cs_ids=[cs_id1, cs_id2], pr_ids=pr_ids, name='example_dataset'
+        )
+
+        cs_doc = database.configuration_sets.find_one({'_id': cs_id1})
+        assert 'configurations' not in cs_doc['relationships']
+        assert database.configuration_set_links.count_documents({}) == 8
+
+        cs = database.get_configuration_set(cs_id1)['configuration_set']
+        cs.configuration_ids.page_size = 3
+
+        assert len(cs.configuration_ids) == 4
+        assert list(cs.configuration_ids) == sorted(co_ids[:4])
+        assert co_ids[0] in cs.configuration_ids
+        assert co_ids[5] not in cs.configuration_ids
+
+        ds = database.get_dataset(ds_id)['dataset']
+        assert sorted(ds.property_ids) == sorted(pr_ids)
+        assert ds.aggregated_info['nconfigurations'] == 6
+
+        configuration_sets, filtered_pr_ids = database.filter_on_configurations(
+            ds_id, {'_id': {'$in': list(co_ids[3:])}}
+        )
+        assert sorted(len(cs.configuration_ids) for cs in configuration_sets) == [1, 3]
+        assert sorted(filtered_pr_ids) == sorted(pr_ids[3:])
+
+        configuration_sets, filtered_pr_ids = database.filter_on_properties(
+            ds_id, query={'default.energy.source-value': -1}
+        )
+        assert sorted(filtered_pr_ids) == sorted(pr_ids[:2])
+        assert sorted(len(cs.configuration_ids) for cs in configuration_sets) == [0, 2]
+
+        database.apply_labels(
+            ds_id, 'configurations', {'_id': co_ids[0]}, 'label1'
+        )
+        database.resync_dataset(ds_id)
+
+        ds_info = database.datasets.find_one({'_id': ds_id})['aggregated_info']
+        assert ds_info['configuration_labels'] == ['label1']
+        assert ds_info['nconfigurations'] == 6
+        assert ds_info['property_types_counts'] == [6]
+
+        database.drop_database(database.database_name)
+
+
+class TestBatchedQueries:
+    database_name = 'colabfit_test'
+
+    def test_batched_queries(self, monkeypatch):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(10)[0]
+
+        co_ids, pr_ids = zip(*database.insert_data(
+            images, property_map=TestInsertData.property_map
+        ))
+        co_ids = list(co_ids)
+
+        energies = database.get_data(
+            'properties', 'default.energy', ids=pr_ids, keep_ids=True
+        )
+        info = database.aggregate_configuration_info(co_ids)
+
+        # Split the IDs into batches of 3, queried concurrently
+        monkeypatch.setattr(
+            'colabfit.tools.database._IN_BATCH_SIZE', 3
+        )
+
+        batched = database.get_data(
+            'properties', 'default.energy', ids=pr_ids, keep_ids=True
+        )
+        assert batched['_id'] == sorted(pr_ids)
+        assert batched == energies
+
+        configurations = database.get_configurations(co_ids[::-1])
+        assert [c.info['_id'] for c in configurations] == sorted(co_ids)
+
+        batched = database.aggregate_configuration_info(co_ids)
+        for k in ['nconfigurations', 'nsites', 'elements', 'chemical_systems']:
+            assert batched[k] == info[k]
+
+        cs_id = database.insert_configuration_set(co_ids)
+        ds_id = database.insert_dataset(cs_id, pr_ids, name='example_dataset')
+
+        assert len(database.get_dataset(ds_id)['dataset'].property_ids) == 10
+
+        database.drop_database(database.database_name)
+
+
+class TestColumnarData:
+    database_name = 'colabfit_test'
+
+    @pytest.mark.parametrize('binary_arrays', [False, True])
+    def test_columnar_get_data(self, binary_arrays):
+        database = MongoDatabase(
+            self.database_name, binary_arrays=binary_arrays, drop_database=True
+        )
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images, energies = build_n(5)[:2]
+
+        pr_ids = [_[1] for _ in database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )]
+
+        data = database.get_data(
+            'properties', ['default.forces', 'default.energy'], ids=pr_ids,
+            columnar=True
+        )
+
+        forces = data['default.forces']
+        assert forces.ids == sorted(pr_ids)
+        assert forces.data.shape == (15, 3)
+
+        # The entries are sorted by ID
+        images = {pid: img for pid, img in zip(pr_ids, images)}
+        for pid, f in zip(forces.ids, forces):
+            np.testing.assert_allclose(f, images[pid].arrays['forces'])
+            assert np.shares_memory(f, forces.data)
+
+        energy = data['default.energy']
+        assert energy.data.shape == (5,)
+        np.testing.assert_allclose(
+            energy.padded()[:, 0],
+            [images[pid].info['energy'] for pid in energy.ids]
+        )
+
+        positions = database.get_data('configurations', 'positions', columnar=True)
+        np.testing.assert_array_equal(sorted(positions.lengths), [1, 2, 3, 4, 5])
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('nrows', [0, 100])
+    def test_columnar_row_counts(self, nrows, monkeypatch):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        database.insert_data(images, property_map=TestInsertData.property_map)
+
+        expected = database.get_data(
+            'properties', 'default.forces', columnar=True
+        )
+
+        # Simulates documents being inserted (or deleted) between counting
+        # the rows and reading the data
+        monkeypatch.setattr(
+            'colabfit.tools.database._nrows_expression',
+            lambda field, unpack_properties=True: nrows
+        )
+
+        forces = database.get_data('properties', 'default.forces', columnar=True)
+
+        assert forces.data.shape == (15, 3)
+        assert forces.ids == expected.ids
+        np.testing.assert_array_equal(forces.offsets, expected.offsets)
+        np.testing.assert_array_equal(forces.data, expected.data)
+
+        database.drop_database(database.database_name)
+
+
+    def test_different_shapes(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition({
+            'property-id': 'diff-shapes',
+            'property-title': 'A property with values of different shapes',
+            'property-description': 'A description of the property',
+            'nd-diff-shapes': {'type': 'float', 'has-unit': True, 'extent': [":", ":", ":"], 'required': True, 'description': 'empty'},
+        })
+
+        images = build_n(4)[0]
+        values = np.concatenate([
+            img.info['nd-diff-shapes'].ravel() for img in images
+        ])
+
+        database.insert_data(images, property_map={
+            'diff-shapes': [{
+                'nd-diff-shapes': {'field': 'nd-diff-shapes', 'units': 'eV'},
+            }]
+        })
+
+        with pytest.raises(RuntimeError, match='different shapes'):
+            database.get_data(
+                'properties', 'diff-shapes.nd-diff-shapes', columnar=True
+            )
+
+        with pytest.raises(RuntimeError, match='different shapes'):
+            list(database.get_data(
+                'properties', 'diff-shapes.nd-diff-shapes', batch_size=2
+            ))
+
+        # The values are flattened for statistics and histograms
+        stats = database.get_statistics(
+            'diff-shapes.nd-diff-shapes', batch_size=2
+        )
+        np.testing.assert_allclose(stats['average'], np.average(values))
+        np.testing.assert_allclose(stats['std'], np.std(values))
+        assert stats['count'] == values.shape[0]
+
+        counts, _ = database.get_histograms(
+            'diff-shapes.nd-diff-shapes', nbins=5
+        )
+        assert counts.sum() == values.shape[0]
+
+        database.drop_database(database.database_name)
+
+
+    def test_chunked_get_data(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        forces = np.concatenate([img.arrays['forces'] for img in images])
+
+        database.insert_data(images, property_map=TestInsertData.property_map)
+
+        chunks = list(database.get_data(
+            'properties', ['default.forces', 'default.energy'], batch_size=2
+        ))
+
+        assert [len(chunk['default.forces']) for chunk in chunks] == [2, 2, 1]
+
+        np.testing.assert_allclose(
+            np.sort(np.concatenate([
+                chunk['default.forces'].data for chunk in chunks
+            ]).ravel()),
+            np.sort(forces.ravel())
+        )
+
+        stats = database.get_statistics('default.forces', batch_size=2)
+        np.testing.assert_allclose(stats['average'], np.average(forces))
+        np.testing.assert_allclose(stats['std'], np.std(forces))
+        np.testing.assert_allclose(stats['min'], np.min(forces))
+        np.testing.assert_allclose(stats['average_abs'], np.average(np.abs(forces)))
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('nprocs', [1, 2])
+    def test_multi_field_statistics(self, nprocs):
+        database = MongoDatabase(
+            self.database_name, nprocs=nprocs, drop_database=True
+        )
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        data = {
+            'default.forces': np.concatenate([
+                img.arrays['forces'] for img in images
+            ]),
+            'default.energy': np.array([img.info['energy'] for img in images]),
+        }
+
+        ids = database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )
+        pr_ids = [_[1] for _ in ids]
+
+        for kwargs in [{}, {'ids': pr_ids}]:
+            stats = database.get_statistics(
+                list(data.keys()), batch_size=2, quantiles=[0, 0.5, 1],
+                **kwargs
+            )
+
+            for f, values in data.items():
+                assert stats[f]['count'] == values.size
+                np.testing.assert_allclose(stats[f]['average'], np.average(values))
+                np.testing.assert_allclose(stats[f]['std'], np.std(values))
+                np.testing.assert_allclose(stats[f]['max'], np.max(values))
+                np.testing.assert_allclose(
+                    list(stats[f]['quantiles'].values()),
+                    np.quantile(values, [0, 0.5, 1])
+                )
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('binary_arrays', [False, True])
+    def test_histograms(self, binary_arrays):
+        database = MongoDatabase(
+            self.database_name, binary_arrays=binary_arrays, drop_database=True
+        )
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(5)[0]
+        data = {
+            'default.forces': np.concatenate([
+                img.arrays['forces'] for img in images
+            ]),
+            'default.energy': np.array([img.info['energy'] for img in images]),
+        }
+
+        ids = database.insert_data(
+            images, property_map=TestInsertData.property_map
+        )
+        pr_ids = [_[1] for _ in ids]
+
+        for kwargs in [{}, {'ids': pr_ids[:3]}]:
+            histograms = database.get_histograms(
+                list(data.keys()), nbins=7, batch_size=2, **kwargs
+            )
+
+            for f, values in data.items():
+                if 'ids' in kwargs:
+                    if f == 'default.energy':
+                        values = values[:3]
+                    else:
+                        values = values[:sum(
+                            len(img) for img in images[:3]
+                        )]
+
+                counts, bin_edges = histograms[f]
+                np_counts, np_bin_edges = np.histogram(values, bins=7)
+
+                np.testing.assert_allclose(bin_edges, np_bin_edges)
+                np.testing.assert_equal(counts, np_counts)
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('stratify', [None, 'chemical_formula_reduced'])
+    def test_sampled_statistics(self, stratify):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = build_n(10)[0]
+        forces = np.concatenate([img.arrays['forces'] for img in images])
+
+        database.insert_data(images, property_map=TestInsertData.property_map)
+
+        stats = database.get_statistics(
+            'default.forces', sample=4, stratify=stratify
+        )
+
+        assert stats['sample']['ndocuments'] == 4
+        assert stats['sample']['population'] == 10
+        assert stats['sample']['average_stderr'] > 0
+
+        # Sampling every document gives the exact results
+        stats = database.get_statistics(
+            'default.forces', sample=10, stratify=stratify
+        )
+
+        np.testing.assert_allclose(stats['average'], np.average(forces))
+        assert stats['sample']['average_stderr'] == 0
+
+        counts, _ = database.get_histograms(
+            'default.forces', nbins=5, sample=10, stratify=stratify
+        )
+        np.testing.assert_allclose(counts, np.histogram(forces, bins=5)[0])
+
+        assert database.count_distinct(
+            'properties', 'default.energy.source-value'
+        ) == 10
+
+        database.drop_database(database.database_name)
+
+
+    @pytest.mark.parametrize('use_ids', [False, True])
+    def test_sampled_small_stratum(self, use_ids):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(TestInsertData.property_definition)
+
+        images = []
+        for i in range(20):
+            symbols, value = ('H2', 1.0) if i < 18 else ('He2', 100.0)
+
+            atoms = Atoms(symbols, positions=np.random.random((2, 3)))
+            atoms.info['energy'] = np.random.random()
+            atoms.info['stress'] = np.random.random(6)
+            atoms.arrays['forces'] = np.full((2, 3), value)
+
+            images.append(Configuration.from_ase(atoms))
+
+        database.insert_data(images, property_map=TestInsertData.property_map)
+
+        ids = None
+        if use_ids:
+            ids = [d['_id'] for d in database.properties.find({}, {'_id': 1})]
+
+        # The two He2 documents are sampled even though their share of the
+        # sample rounds to 0, and are weighted by their population
+        stats = database.get_statistics(
+            'default.forces', ids=ids, sample=6,
+            stratify='chemical_formula_reduced'
+        )
+
+        forces = np.concatenate([img.arrays['forces'] for img in images])
+
+        assert stats['sample']['ndocuments'] == 6
+        assert stats['sample']['population'] == 20
+        assert stats['count'] == 36
+        assert np.isfinite(stats['sample']['average_stderr'])
+        np.testing.assert_allclose(stats['average'], np.average(forces))
+        np.testing.assert_allclose(stats['std'], np.std(forces))
+
+        database.drop_database(database.database_name)
+
+
+class TestInsertData:
+    database_name = 'colabfit_test'
+
+    property_definition = {
+        'property-id': 'default',
+        'property-title': 'A default property used for testing',
+        'property-description': 'A description of the property',
+        'energy': {'type': 'float', 'has-unit': True, 'extent': [], 'required': True, 'description': 'empty'},
+        'stress': {'type': 'float', 'has-unit': True, 'extent': [6], 'required': True, 'description': 'empty'},
+        'forces': {'type': 'float', 'has-unit': True, 'extent': [":", 3], 'required': True, 'description': 'empty'},
+    }
+
+    property_map = {
+        'default': [{
+            'energy': {'field': 'energy', 'units': 'eV'},
+            'stress': {'field': 'stress', 'units': 'GPa'},
+            'forces': {'field': 'forces', 'units': 'eV/Ang'},
+        }]
+    }
+
+    def test_generator_flushes(self):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(self.property_definition)
+
+        images = build_n(10)[0]
+
+        ids = list(database.insert_data(
+            images, property_map=self.property_map, generator=True,
+            flush_size=3, flush_bytes=1000,
+        ))
+
+        assert len(ids) == 10
+        assert database.configurations.count_documents({}) == 10
+        assert database.properties.count_documents({}) == 10
+
+        # Duplicates are counted over all of the flushes
+        with pytest.warns(UserWarning, match='10 duplicate configurations'):
+            list(database.insert_data(
+                images, property_map=self.property_map, generator=True,
+                flush_size=3,
+            ))
+
+        database.drop_database(database.database_name)
+
+
+    def test_parallel_streaming(self):
+        database = MongoDatabase(
+            self.database_name, nprocs=2, drop_database=True
+        )
+        database.insert_property_definition(self.property_definition)
+
+        images = build_n(10)[0]
+
+        # Chunks are pulled from a generator, and results stay in input order
+        ids = list(database.insert_data(
+            (img for img in images), property_map=self.property_map,
+            generator=True, chunk_size=3,
+        ))
+
+        assert [cid for cid, _ in ids] == [
+            ID_FORMAT_STRING.format('CO', hash(img), 0) for img in images
+        ]
+        assert database.configurations.count_documents({}) == 10
+        assert database.properties.count_documents({}) == 10
+
+        # The worker pool is re-used between calls
+        pool = database._insert_pool
+
+        with pytest.warns(UserWarning, match='10 duplicate configurations'):
+            database.insert_data(
+                images, property_map=self.property_map, chunk_size=3,
+            )
+
+        assert database._insert_pool is pool
+
+        # ... unless the number of processes was changed
+        database.nprocs = 3
+        assert database._get_insert_pool() is not pool
+        assert database._insert_pool_size == 3
+
+        database.drop_database(database.database_name)
+        database.close()
+
+        assert database._insert_pool is None
+
+
+    def test_insert_from_files(self, tmp_path):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(self.property_definition)
+
+        # Avoids the names that ASE converts into calculator results
+        property_map = {
+            'default': [{
+                'energy': {'field': 'dft_energy', 'units': 'eV'},
+                'stress': {'field': 'dft_stress', 'units': 'GPa'},
+                'forces': {'field': 'dft_forces', 'units': 'eV/Ang'},
+            }]
+        }
+
+        for fi in range(3):
+            images = []
+            for i in range(1, 4):
+                atoms = Atoms(f'H{i}', positions=np.random.random((i, 3)))
+
+                atoms.info['dft_energy'] = np.random.random()
+                atoms.info['dft_stress'] = np.random.random(6)
+                atoms.arrays['dft_forces'] = np.random.random((i, 3))
+
+                images.append(atoms)
+
+            ase_write(
+                str(tmp_path / f'data_{fi}.xyz'), images, format='extxyz'
+            )
+
+        ids = database.insert_data_from_files(
+            tmp_path, file_format='xyz', name_field=None, elements=['H'],
+            default_name='test', glob_string='*.xyz',
+            property_map=property_map,
+        )
+
+        loaded = []
+        for fi in range(3):
+            loaded += load_data(
+                str(tmp_path / f'data_{fi}.xyz'), file_format='xyz',
+                name_field=None, elements=['H'], generator=False,
+            )
+
+        assert [cid for cid, _ in ids] == [
+            ID_FORMAT_STRING.format('CO', hash(img), 0) for img in loaded
+        ]
+        assert database.configurations.count_documents({}) == 9
+        assert database.properties.count_documents({}) == 9
+
+        # Default names are unique over all of the files
+        assert database.configurations.count_documents(
+            {'names': 'test_2_0'}
+        ) == 1
+
+        database.drop_database(database.database_name)
+
+
+    def test_skip_existing(self, monkeypatch):
+        database = MongoDatabase(self.database_name, drop_database=True)
+        database.insert_property_definition(self.property_definition)
+
+        images = build_n(10)[0]
+
+        ids = database.insert_data(images[:5], property_map=self.property_map)
+
+        for img in images:
+            img.info[ATOMS_NAME_FIELD] = {'renamed'}
+
+        # Properties should only be built for the new configurations
+        built = []
+        from_definition = Property.from_definition
+
+        def counting_from_definition(*args, **kwargs):
+            built.append(1)
+            return from_definition(*args, **kwargs)
+
+        monkeypatch.setattr(
+            Property, 'from_definition', counting_from_definition
+        )
+
+        new_ids = database.insert_data(
+            images, property_map=self.property_map, skip_existing=True,
+        )
+
+        assert len(built) == 5
+        assert new_ids[:5] == ids
+        assert database.configurations.count_documents({}) == 10
+        assert database.properties.count_documents({}) == 10
+        assert database.configurations.count_documents(
+            {'names': 'renamed'}
+        ) == 10
+
+        database.drop_database(database.database_name)
+
+
+class TestBinaryArrays:
+    database_name = 'colabfit_test'
+
+    property_definition = TestInsertData.property_definition
+    property_map = TestInsertData.property_map
+
+    def test_binary_roundtrip(self):
+        database = MongoDatabase(
+            self.database_name, drop_database=True, binary_arrays=True
+        )
+        database.insert_property_definition(self.property_definition)
+
+        images, energies, stress = build_n(10)[:3]
+        forces = [img.arrays['forces'] for img in images]
+
+        ids = database.insert_data(images, property_map=self.property_map)
+
+        co_doc = database.configurations.find_one({'_id': ids[-1][0]})
+        assert isinstance(co_doc['positions']['data'], bytes)
+
+        np.testing.assert_allclose(
+            database.get_data('properties', 'default.forces', vstack=True),
+            np.concatenate(forces)
+        )
+        np.testing.assert_allclose(
+            database.get_data('properties', 'default.stress', vstack=True),
+            np.vstack(stress)
+        )
+
+        stats = database.get_statistics(['default.forces'])
+        np.testing.assert_allclose(
+            stats['average'], np.average(np.concatenate(forces))
+        )
+
+        configurations = {
+            conf.info['_id']: conf for conf in database.get_configurations(
+                [cid for cid, _ in ids], attach_properties=True
+            )
+        }
+        for img, (cid, _) in zip(images, ids):
+            conf = configurations[cid]
+            np.testing.assert_allclose(img.positions, conf.positions)
+            np.testing.assert_allclose(
+                img.arrays['forces'], conf.arrays['default.forces'][0]
+            )
+
+        # Migrating back to lists
+        assert database.convert_array_encoding(binary=False) == (10, 10)
+        assert database.convert_array_encoding(binary=False) == (0, 0)
+
+        co_doc = database.configurations.find_one({'_id': ids[-1][0]})
+        np.testing.assert_allclose(co_doc['positions'], images[-1].positions)
+
+        np.testing.assert_allclose(
+            database.get_data('properties', 'default.forces', vstack=True),
+            np.concatenate(forces)
+        )
+
+        assert database.convert_array_encoding(binary=True) == (10, 10)
+
+        database.drop_database(database.database_name)
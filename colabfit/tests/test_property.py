@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+import kim_edn
+import numpy as np
+from ase import Atoms
+
+from colabfit.tools.configuration import Configuration
+from colabfit.tools.property import (
+    Property, PropertyParsingError, get_property_template
+)
+
+
+definition = {
+    'property-id': 'test-template',
+    'property-title': 'A property used for testing templates',
+    'property-description': 'A description of the property',
+    'energy': {'type': 'float', 'has-unit': True, 'extent': [], 'required': True, 'description': 'empty'},
+    'stress': {'type': 'float', 'has-unit': True, 'extent': [6], 'required': False, 'description': 'empty'},
+    'name': {'type': 'string', 'has-unit': False, 'extent': [], 'required': False, 'description': 'empty'},
+    'forces': {'type': 'float', 'has-unit': True, 'extent': [':', 3], 'required': True, 'description': 'empty'},
+}
+
+property_map = {
+    'energy': {'field': 'energy', 'units': 'eV'},
+    'stress': {'field': 'stress', 'units': 'GPa'},
+    'name': {'field': 'name', 'units': None},
+    'forces': {'field': 'forces', 'units': 'eV/Ang'},
+}
+
+
+def build_configuration(natoms=4):
+    atoms = Atoms(f'H{natoms}', positions=np.random.random((natoms, 3)))
+
+    atoms.info['energy'] = np.random.random()
+    atoms.info['stress'] = np.random.random(6)
+    atoms.info['name'] = 'test'
+    atoms.arrays['forces'] = np.random.random((natoms, 3))
+
+    return Configuration.from_ase(atoms)
+
+
+class TestPropertyTemplates(unittest.TestCase):
+    def test_template_is_cached(self):
+        t1 = get_property_template(definition)
+        t2 = get_property_template(definition)
+
+        self.assertIs(t1, t2)
+        self.assertEqual(
+            t1.property_id, 'tag:@,0000-00-00:property/test-template'
+        )
+        self.assertSetEqual(t1.required_fields, {'energy', 'forces'})
+
+
+    def test_same_id_different_definitions(self):
+        # Same property ID, but stress is required
+        other = dict(definition)
+        other['stress'] = dict(definition['stress'], required=True)
+
+        t1 = get_property_template(definition)
+        t2 = get_property_template(other)
+
+        self.assertIsNot(t1, t2)
+        self.assertSetEqual(t2.required_fields, {'energy', 'forces', 'stress'})
+
+        conf = build_configuration()
+        del conf.info['stress']
+
+        with self.assertRaises(PropertyParsingError):
+            Property.from_definition(other, conf, property_map)
+
+        # The first definition is still used as it is
+        Property.from_definition(definition, conf, property_map)
+
+
+    def test_edited_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'definition.edn')
+
+            kim_edn.dump(definition, path)
+            t1 = get_property_template(path)
+
+            other = dict(definition)
+            other['stress'] = dict(definition['stress'], required=True)
+            kim_edn.dump(other, path)
+
+            # Make sure that the modification time changes
+            mtime = os.path.getmtime(path) + 10
+            os.utime(path, (mtime, mtime))
+
+            t2 = get_property_template(path)
+
+            self.assertIsNot(t1, t2)
+            self.assertIn('stress', t2.required_fields)
+            self.assertIs(t2, get_property_template(path))
+
+
+    def test_from_definition(self):
+        conf = build_configuration()
+
+        prop = Property.from_definition(definition, conf, property_map)
+
+        self.assertEqual(prop.name, 'test-template')
+        np.testing.assert_allclose(
+            prop['forces']['source-value'], conf.arrays['forces']
+        )
+        self.assertEqual(prop['energy']['source-unit'], 'eV')
+        self.assertNotIn('source-unit', prop['name'])
+        self.assertEqual(prop.configuration_ids, [str(hash(conf))])
+
+        # Building from the instance should give the same Property
+        self.assertEqual(
+            hash(prop),
+            hash(Property(definition, prop.instance, prop.configuration_ids))
+        )
+
+
+    def test_instances_are_independent(self):
+        conf1 = build_configuration()
+        conf2 = build_configuration()
+
+        prop1 = Property.from_definition(definition, conf1, property_map)
+        prop2 = Property.from_definition(definition, conf2, property_map)
+
+        self.assertNotEqual(hash(prop1), hash(prop2))
+        self.assertNotIn('energy', get_property_template(definition).new_instance())
+
+
+    def test_missing_required_field(self):
+        conf = build_configuration()
+        del conf.arrays['forces']
+
+        with self.assertRaises(PropertyParsingError):
+            Property.from_definition(definition, conf, property_map)
+
+
+    def test_wrong_dimensions(self):
+        conf = build_configuration()
+        conf.info['stress'] = np.random.random((2, 3))
+
+        with self.assertRaises(PropertyParsingError):
+            Property.from_definition(definition, conf, property_map)
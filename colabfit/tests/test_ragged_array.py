@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+
+from colabfit.tools.ragged_array import RaggedArray
+
+
+class TestRaggedArray(unittest.TestCase):
+    def test_views(self):
+        arrays = [np.random.random((n, 3)) for n in [2, 5, 1]]
+
+        ragged = RaggedArray.from_arrays(arrays, ids=['a', 'b', 'c'])
+
+        self.assertEqual(len(ragged), 3)
+        self.assertEqual(ragged.data.shape, (8, 3))
+        np.testing.assert_array_equal(ragged.offsets, [0, 2, 7, 8])
+        np.testing.assert_array_equal(ragged.lengths, [2, 5, 1])
+
+        for a, b in zip(arrays, ragged):
+            np.testing.assert_array_equal(a, b)
+            self.assertTrue(np.shares_memory(b, ragged.data))
+
+        np.testing.assert_array_equal(ragged[-1], arrays[-1])
+
+        with self.assertRaises(IndexError):
+            ragged[3]
+
+
+    def test_slices(self):
+        arrays = [np.random.random((n, 3)) for n in [2, 5, 1, 3]]
+
+        ragged = RaggedArray.from_arrays(arrays, ids=['a', 'b', 'c', 'd'])
+
+        sliced = ragged[1:3]
+        self.assertEqual(len(sliced), 2)
+        self.assertEqual(sliced.ids, ['b', 'c'])
+        np.testing.assert_array_equal(sliced.offsets, [0, 5, 6])
+        self.assertTrue(np.shares_memory(sliced.data, ragged.data))
+
+        for a, b in zip(arrays[1:3], sliced):
+            np.testing.assert_array_equal(a, b)
+
+        self.assertEqual(len(ragged[-1:]), 1)
+        self.assertEqual(len(ragged[3:1]), 0)
+
+        with self.assertRaises(IndexError):
+            ragged[::2]
+
+
+    def test_different_inner_shapes(self):
+        with self.assertRaises(RuntimeError):
+            RaggedArray.from_arrays([np.ones((2, 3)), np.ones((2, 4))])
+
+
+    def test_padded(self):
+        ragged = RaggedArray.from_arrays([np.ones((2, 3)), np.ones((2, 3))*2])
+
+        padded = ragged.padded()
+        self.assertEqual(padded.shape, (2, 2, 3))
+        self.assertTrue(np.shares_memory(padded, ragged.data))
+
+        ragged = RaggedArray.from_arrays([np.ones(2), np.ones(3)*2, 3.0])
+
+        padded = ragged.padded(fill_value=np.nan)
+        np.testing.assert_array_equal(
+            padded,
+            [[1, 1, np.nan], [2, 2, 2], [3, np.nan, np.nan]]
+        )
@@ -0,0 +1,158 @@
+import unittest
+import numpy as np
+
+from colabfit.tools.statistics import (
+    DistinctCounter, StreamingHistogram, StreamingStatistics,
+    ratio_standard_error
+)
+
+
+class TestStreamingStatistics(unittest.TestCase):
+    def test_matches_numpy(self):
+        values = np.random.random((1000, 3))
+
+        stats = StreamingStatistics(sample_size=100)
+        for chunk in np.array_split(values, 7):
+            stats.update(chunk)
+
+        results = stats.result(quantiles=[0.1, 0.5, 0.9])
+
+        self.assertEqual(results['count'], values.size)
+        np.testing.assert_allclose(results['average'], np.average(values))
+        np.testing.assert_allclose(results['std'], np.std(values))
+        np.testing.assert_allclose(results['min'], np.min(values))
+        np.testing.assert_allclose(results['max'], np.max(values))
+        np.testing.assert_allclose(
+            results['average_abs'], np.average(np.abs(values))
+        )
+
+        # The quantiles are estimated from a sample of 100 values
+        self.assertEqual(stats.sample.shape[0], 100)
+        np.testing.assert_allclose(
+            list(results['quantiles'].values()), [0.1, 0.5, 0.9], atol=0.2
+        )
+
+
+    def test_merge(self):
+        values = np.random.normal(size=500)
+
+        parts = []
+        for chunk in np.array_split(values, 3):
+            s = StreamingStatistics(sample_size=1000)
+            s.update(chunk)
+            parts.append(s)
+
+        merged = parts[0]
+        for s in parts[1:]:
+            merged.merge(s)
+
+        np.testing.assert_allclose(merged.mean, np.average(values))
+        np.testing.assert_allclose(np.sqrt(merged.m2/merged.n), np.std(values))
+
+        # Fewer values than the sample size, so the quantiles are exact
+        np.testing.assert_allclose(
+            merged.quantiles([0.25, 0.75]), np.quantile(values, [0.25, 0.75])
+        )
+
+
+    def test_weighted_merge(self):
+        small = np.random.normal(size=10)
+        large = np.random.normal(loc=5, size=200)
+
+        merged = StreamingStatistics(sample_size=50)
+        merged.update(large)
+
+        other = StreamingStatistics(sample_size=50)
+        other.update(small)
+
+        # Each value of the other accumulator counts three times
+        merged.merge(other, weight=3)
+
+        values = np.concatenate([large, small, small, small])
+
+        self.assertEqual(merged.n, values.size)
+        np.testing.assert_allclose(merged.mean, np.average(values))
+        np.testing.assert_allclose(np.sqrt(merged.m2/merged.n), np.std(values))
+        np.testing.assert_allclose(
+            merged.sum_abs/merged.n, np.average(np.abs(values))
+        )
+        self.assertEqual(merged.sample.shape[0], 50)
+
+
+    def test_empty(self):
+        results = StreamingStatistics().result()
+
+        self.assertEqual(results['count'], 0)
+        self.assertTrue(np.isnan(results['average']))
+
+
+class TestStreamingHistogram(unittest.TestCase):
+    def test_matches_numpy(self):
+        values = np.random.normal(size=1000)
+
+        hist = StreamingHistogram.from_range(values.min(), values.max(), 10)
+
+        other = StreamingHistogram(hist.bin_edges)
+        for chunk in np.array_split(values, 4):
+            other.update(chunk)
+
+        hist.merge(other)
+
+        counts, bin_edges = np.histogram(values, bins=10)
+
+        np.testing.assert_allclose(hist.bin_edges, bin_edges)
+        np.testing.assert_equal(hist.counts, counts)
+
+
+    def test_empty_range(self):
+        hist = StreamingHistogram.from_range(2.0, 2.0, 4)
+        hist.update([2.0, 2.0])
+
+        counts, bin_edges = np.histogram([2.0, 2.0], bins=4)
+
+        np.testing.assert_allclose(hist.bin_edges, bin_edges)
+        np.testing.assert_equal(hist.counts, counts)
+
+
+class TestDistinctCounter(unittest.TestCase):
+    def test_count(self):
+        c1 = DistinctCounter()
+        c2 = DistinctCounter()
+
+        c1.update(range(20000))
+        c2.update(range(10000, 30000))
+        c2.update(['H2O', 'H2O', ('H', 'O')])
+
+        self.assertLess(abs(c1.count() - 20000)/20000, 0.05)
+
+        c1.merge(c2)
+        self.assertLess(abs(c1.count() - 30002)/30002, 0.05)
+
+        # Small counts are (almost always) exact
+        c3 = DistinctCounter()
+        c3.update(['a', 'b', 'c', 'a'])
+        self.assertEqual(c3.count(), 3)
+
+
+class TestRatioStandardError(unittest.TestCase):
+    def test_standard_error(self):
+        totals = np.random.random(50)
+        counts = np.ones(50)
+
+        ratio = np.average(totals)
+
+        # Without clustering or strata, this is the usual standard error of
+        # the mean of a sample without replacement
+        np.testing.assert_allclose(
+            ratio_standard_error([(1000, totals, counts)], ratio),
+            np.std(totals, ddof=1)/np.sqrt(50)*np.sqrt(1 - 50/1000)
+        )
+
+        # A census has no sampling error
+        self.assertEqual(
+            ratio_standard_error([(50, totals, counts)], ratio), 0
+        )
+
+        self.assertTrue(np.isnan(
+            ratio_standard_error([(10, totals[:1], counts[:1])], ratio)
+        ))
@@ -1,6 +1,10 @@
 import numpy as np
-from hashlib import sha512
+from math import gcd
+from hashlib import blake2b, sha512
+from functools import lru_cache, reduce
 from ase import Atoms
+from ase.data import chemical_symbols
+from ase.constraints import dict2constraint
 from string import ascii_lowercase, ascii_uppercase
 
 from colabfit import (
@@ -37,6 +41,87 @@ class Configuration(Atoms):
         """
         super().__init__(*args, **kwargs)
 
+        self._init_fields(labels=labels, constraints=constraints)
+
+        # # Additional fields for querying
+
+        # atomic_symbols = self.get_chemical_symbols()
+        # processed_fields = process_species_list(atomic_symbols)
+
+        # self.info['_description'] = description
+        # self.info['_last_modified'] = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+        # self.info['_elements'] = processed_fields['elements']
+        # self.info['_nelements'] = processed_fields['nelements']
+        # self.info['_elements_ratios'] = processed_fields['elements_ratios']
+        # self.info['_chemical_formula_reduced'] = processed_fields['chemical_formula_reduced']
+        # self.info['_chemical_formula_anonymous'] = processed_fields['chemical_formula_anonymous']
+        # self.info['_chemical_formula_hill'] = self.get_chemical_formula()
+        # self.info['_natoms'] = processed_fields['natoms']
+        # # self.info['_species'] = processed_fields['species']
+        # self.info['_dimension_types'] = self.get_pbc().astype(int)
+        # self.info['_nperiodic_dimensions'] = sum(self.get_pbc())
+        # self.info['_lattice_vectors'] = np.array(self.get_cell())
+
+    @classmethod
+    def from_ase(cls, atoms):
+        """
+        Generates a :class:`Configuration` from an :code:`ase.Atoms` object.
+        """
+        # Workaround for bug in todict() fromdict() with constraints.
+        # Merge request: https://gitlab.com/ase/ase/-/merge_requests/2574
+        if atoms.constraints is not None:
+            atoms.constraints = [c.todict() for c in atoms.constraints]
+
+        return cls.fromdict(atoms.todict())
+
+
+    @classmethod
+    def adopt(cls, atoms):
+        """
+        Generates a :class:`Configuration` from an :code:`ase.Atoms` object
+        without copying its data. Unlike :meth:`from_ase`, the arrays (e.g.,
+        the positions and any per-atom properties) and the values in
+        :attr:`info` are shared with :code:`atoms`, so this should only be
+        used when :code:`atoms` won't be modified afterwards (e.g., in the
+        converters, where each Atoms object is discarded after conversion).
+
+        The calculator of :code:`atoms` is not attached, as in
+        :meth:`from_ase`.
+        """
+
+        # Atoms.__init__() is called directly, without any atoms, so that
+        # Configuration.__init__() doesn't populate the fields before the
+        # arrays are attached. It copies the cell and the PBC, and makes a
+        # shallow copy of the info.
+        configuration = cls.__new__(cls)
+
+        Atoms.__init__(
+            configuration,
+            cell=atoms.cell,
+            pbc=atoms.pbc,
+            celldisp=atoms.get_celldisp(),
+            info=atoms.info,
+            # Constraints may have been converted to dictionaries by from_ase()
+            constraint=[
+                dict2constraint(c) if isinstance(c, dict) else c
+                for c in atoms.constraints
+            ],
+        )
+
+        # Share the positions, numbers, and any per-atom properties
+        configuration.arrays = dict(atoms.arrays)
+
+        configuration._init_fields()
+
+        return configuration
+
+
+    def _init_fields(self, labels=None, constraints=None):
+        """
+        Populates the additional required fields of :attr:`info`, and checks
+        for name conflicts between :attr:`info` and :attr:`arrays`.
+        """
+
         if ATOMS_NAME_FIELD in self.info:
             v = self.info[ATOMS_NAME_FIELD]
             if not isinstance(v, list):
@@ -71,37 +156,6 @@ class Configuration(Atoms):
                 "and Configuration.arrays"
             )
 
-        # # Additional fields for querying
-
-        # atomic_symbols = self.get_chemical_symbols()
-        # processed_fields = process_species_list(atomic_symbols)
-
-        # self.info['_description'] = description
-        # self.info['_last_modified'] = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-        # self.info['_elements'] = processed_fields['elements']
-        # self.info['_nelements'] = processed_fields['nelements']
-        # self.info['_elements_ratios'] = processed_fields['elements_ratios']
-        # self.info['_chemical_formula_reduced'] = processed_fields['chemical_formula_reduced']
-        # self.info['_chemical_formula_anonymous'] = processed_fields['chemical_formula_anonymous']
-        # self.info['_chemical_formula_hill'] = self.get_chemical_formula()
-        # self.info['_natoms'] = processed_fields['natoms']
-        # # self.info['_species'] = processed_fields['species']
-        # self.info['_dimension_types'] = self.get_pbc().astype(int)
-        # self.info['_nperiodic_dimensions'] = sum(self.get_pbc())
-        # self.info['_lattice_vectors'] = np.array(self.get_cell())
-
-    @classmethod
-    def from_ase(cls, atoms):
-        """
-        Generates a :class:`Configuration` from an :code:`ase.Atoms` object.
-        """
-        # Workaround for bug in todict() fromdict() with constraints.
-        # Merge request: https://gitlab.com/ase/ase/-/merge_requests/2574
-        if atoms.constraints is not None:
-            atoms.constraints = [c.todict() for c in atoms.constraints]
-
-        return cls.fromdict(atoms.todict())
-
 
     # def colabfit_format(self):
     #     """
@@ -131,13 +185,31 @@ class Configuration(Atoms):
         #     for c in self.info[ATOMS_CONSTRAINTS_FIELD]
         # ))
 
-        _hash = sha512()
-        _hash.update(np.round_(self.arrays['positions'], decimals=16).data.tobytes()),
-        _hash.update(self.arrays['numbers'].data.tobytes()),
-        _hash.update(np.round_(np.array(self.cell), decimals=16).data.tobytes()),
-        _hash.update(np.array(self.pbc).data.tobytes()),
+        # The hash is memoized, and is only re-computed if the raw data has
+        # changed (including in-place changes to the arrays). The raw data is
+        # identified by a digest, which is much cheaper than rounding and
+        # hashing the arrays, and doesn't keep a copy of them.
+        key = _digest_arrays(
+            self.arrays['positions'],
+            self.arrays['numbers'],
+            self.cell.array,
+            self.pbc,
+        )
+
+        cached = getattr(self, '_hash_cache', None)
+        if (cached is not None) and (cached[0] == key):
+            return cached[1]
+
+        value = _hash_arrays(
+            np.round_(self.arrays['positions'], decimals=16).data,
+            self.arrays['numbers'].data,
+            np.round_(np.array(self.cell), decimals=16).data,
+            np.array(self.pbc).data,
+        )
 
-        return int(_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
+        self._hash_cache = (key, value)
+
+        return value
 
 
     def __eq__(self, other):
@@ -161,27 +233,333 @@ class Configuration(Atoms):
     #     return str(self)
 
 
+class ConfigurationView:
+    """
+    A lightweight, read-only view of a configuration, for workloads that only
+    need to read the atomic data. The arrays are stored as given (e.g., the
+    buffers decoded from the database) without being copied or validated, so
+    building a view is much cheaper than building a :class:`Configuration`.
+    A real :class:`Configuration` or :code:`ase.Atoms` can be built from the
+    view when needed, using :meth:`to_configuration` or :meth:`to_atoms`.
+
+    Views should not be modified in place, since their arrays may be shared
+    with (or be read-only views of) other buffers.
+
+    Attributes:
+
+        numbers (np.ndarray):
+            The atomic numbers. Shape :code:`(natoms,)`.
+
+        positions (np.ndarray):
+            The atomic positions. Shape :code:`(natoms, 3)`.
+
+        cell (np.ndarray):
+            The cell vectors. Shape :code:`(3, 3)`.
+
+        pbc (np.ndarray):
+            The periodic boundary conditions. Shape :code:`(3,)`.
+
+        info (dict):
+            Additional fields, copied to :attr:`Configuration.info`
+
+        arrays (dict):
+            Additional per-atom fields, copied to
+            :attr:`Configuration.arrays`
+    """
+
+    __slots__ = ('numbers', 'positions', 'cell', 'pbc', 'info', 'arrays')
+
+    def __init__(self, numbers, positions, cell, pbc, info=None, arrays=None):
+        self.numbers    = numbers
+        self.positions  = positions
+        self.cell       = cell
+        self.pbc        = pbc
+        self.info       = {} if info is None else info
+        self.arrays     = {} if arrays is None else arrays
+
+
+    def __len__(self):
+        return len(self.numbers)
+
+
+    def get_atomic_numbers(self):
+        return np.asarray(self.numbers)
+
+
+    def get_positions(self):
+        return np.asarray(self.positions)
+
+
+    def get_cell(self):
+        return np.asarray(self.cell)
+
+
+    def get_pbc(self):
+        return np.asarray(self.pbc, dtype=bool)
+
+
+    def get_chemical_symbols(self):
+        return [chemical_symbols[z] for z in self.numbers]
+
+
+    def to_atoms(self):
+        """Returns a new :code:`ase.Atoms` object with a copy of the data"""
+
+        atoms = Atoms(
+            numbers=self.numbers,
+            positions=self.positions,
+            cell=self.cell,
+            pbc=self.pbc,
+        )
+
+        atoms.info.update(self.info)
+        atoms.arrays.update(self.arrays)
+
+        return atoms
+
+
+    def to_configuration(self):
+        """Returns a new :class:`Configuration` with a copy of the data"""
+
+        configuration = Configuration(
+            numbers=self.numbers,
+            positions=self.positions,
+            cell=self.cell,
+            pbc=self.pbc,
+        )
+
+        configuration.info.update(self.info)
+        configuration.arrays.update(self.arrays)
+
+        return configuration
+
+
+    def __hash__(self):
+        """
+        Returns the same hash as :code:`hash(self.to_configuration())`, without
+        building the Configuration
+        """
+
+        return _hash_arrays(
+            np.round_(
+                np.ascontiguousarray(self.positions, dtype=float), decimals=16
+            ).data,
+            np.ascontiguousarray(self.numbers, dtype=int).data,
+            np.round_(
+                np.ascontiguousarray(self.cell, dtype=float), decimals=16
+            ).data,
+            np.ascontiguousarray(self.pbc, dtype=bool).data,
+        )
+
+
+    def __eq__(self, other):
+        return hash(self) == hash(other)
+
+
+    def __str__(self):
+        return 'ConfigurationView(natoms={}, id={})'.format(
+            len(self), self.info.get('_id')
+        )
+
+
+    def __repr__(self):
+        return str(self)
+
+
+def _digest_arrays(*arrays):
+    """
+    Returns a 128-bit BLAKE2b digest of the dtypes, shapes, and raw bytes of
+    the arrays, used to detect changes to them without keeping a copy
+    """
+
+    _hash = blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+
+        _hash.update(a.dtype.str.encode())
+        _hash.update(repr(a.shape).encode())
+        _hash.update(a.data)
+
+    return _hash.digest()
+
+
+def _hash_arrays(positions, numbers, cell, pbc):
+    """Hashes the raw bytes of the (already rounded) arrays"""
+
+    _hash = sha512()
+    _hash.update(positions)
+    _hash.update(numbers)
+    _hash.update(cell)
+    _hash.update(pbc)
+
+    return int(_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
+
+
+def hash_many(positions, numbers, cells, pbcs, natoms):
+    """
+    Computes the hashes of a batch of configurations that are stored in packed
+    arrays. The rounding is done once for the whole batch, and each
+    configuration is hashed using views of the packed data. The results are
+    identical to :code:`hash(configuration)`.
+
+    Args:
+
+        positions (np.ndarray):
+            The concatenated positions of all configurations. Shape
+            :code:`(sum(natoms), 3)`.
+
+        numbers (np.ndarray):
+            The concatenated atomic numbers. Shape :code:`(sum(natoms),)`.
+
+        cells (np.ndarray):
+            The cell vectors. Shape :code:`(nconfigurations, 3, 3)`.
+
+        pbcs (np.ndarray):
+            The periodic boundary conditions. Shape :code:`(nconfigurations, 3)`.
+
+        natoms (np.ndarray):
+            The number of atoms in each configuration.
+
+    Returns:
+
+        hashes (list):
+            The hash of each configuration
+    """
+
+    positions = np.round_(
+        np.ascontiguousarray(positions, dtype=float), decimals=16
+    )
+    numbers = np.ascontiguousarray(numbers, dtype=int)
+    cells = np.round_(np.ascontiguousarray(cells, dtype=float), decimals=16)
+    pbcs = np.ascontiguousarray(pbcs, dtype=bool)
+
+    positions_view = memoryview(positions).cast('B')
+    numbers_view = memoryview(numbers).cast('B')
+    cells_view = memoryview(cells).cast('B')
+    pbcs_view = memoryview(pbcs).cast('B')
+
+    psize = 3*positions.itemsize
+    nsize = numbers.itemsize
+    csize = 9*cells.itemsize
+    bsize = 3*pbcs.itemsize
+
+    offsets = np.concatenate([[0], np.cumsum(natoms)]).tolist()
+
+    hashes = []
+    for i, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+        hashes.append(_hash_arrays(
+            positions_view[start*psize:stop*psize],
+            numbers_view[start*nsize:stop*nsize],
+            cells_view[i*csize:(i+1)*csize],
+            pbcs_view[i*bsize:(i+1)*bsize],
+        ))
+
+    return hashes
+
+
 def process_species_list(atoms):
     """Extracts useful metadata from a list of atomic species"""
-    atomic_species = atoms.get_chemical_symbols()
 
-    natoms = len(atomic_species)
-    elements = sorted(list(set(atomic_species)))
-    nelements = len(elements)
-    elements_ratios = [
-        atomic_species.count(el)/natoms for el in elements
-    ]
+    numbers = np.asarray(atoms.get_atomic_numbers())
 
-    species_counts = [atomic_species.count(sp) for sp in elements]
+    counts = np.bincount(numbers)
+    present = np.flatnonzero(counts)
 
-    # Build per-element proportions
-    from math import gcd
-    from functools import reduce
-    def find_gcd(list):
-        x = reduce(gcd, list)
-        return x
+    return _species_metadata(
+        tuple(present.tolist()), tuple(counts[present].tolist())
+    )
 
-    count_gcd = find_gcd(species_counts)
+
+def process_species_many(numbers, natoms):
+    """
+    Computes the same metadata as :func:`process_species_list` for a batch of
+    configurations whose atomic numbers are stored in a single packed array.
+    The element counts of all configurations are computed with a single call
+    to :code:`np.bincount`.
+
+    Args:
+
+        numbers (np.ndarray):
+            The concatenated atomic numbers. Shape :code:`(sum(natoms),)`.
+
+        natoms (np.ndarray):
+            The number of atoms in each configuration.
+
+    Returns:
+
+        metadata (list):
+            A list of dictionaries, one per configuration.
+    """
+
+    numbers = np.asarray(numbers, dtype=int)
+    natoms = np.asarray(natoms, dtype=int)
+
+    nconfigs = natoms.shape[0]
+    nnumbers = (numbers.max() + 1) if numbers.size else 1
+
+    config_index = np.repeat(np.arange(nconfigs), natoms)
+
+    counts = np.bincount(
+        config_index*nnumbers + numbers, minlength=nconfigs*nnumbers
+    ).reshape(nconfigs, nnumbers)
+
+    metadata = []
+    for row in counts:
+        present = np.flatnonzero(row)
+
+        metadata.append(_species_metadata(
+            tuple(present.tolist()), tuple(row[present].tolist())
+        ))
+
+    return metadata
+
+
+def _species_metadata(numbers, counts):
+    """
+    Builds the metadata for a composition, given as the atomic numbers that
+    are present and the number of atoms of each. The formulas are memoized
+    by composition; the returned dictionary and its lists are always new
+    objects.
+    """
+
+    elements, nelements, elements_ratios, reduced, anonymous = \
+        _composition_formulas(numbers, counts)
+
+    species = []
+    for el in elements:
+        # https://github.com/Materials-Consortia/OPTIMADE/blob/develop/optimade.rst#7214species
+        species.append({
+            'name': el,
+            'chemical_symbols': [el],
+            'concentration': [1.0],
+        })
+
+    return {
+        'natoms': sum(counts),
+        'elements': list(elements),
+        'nelements': nelements,
+        'elements_ratios': list(elements_ratios),
+        'chemical_formula_anonymous': anonymous,
+        'chemical_formula_reduced': reduced,
+        'species': species,
+    }
+
+
+@lru_cache(maxsize=4096)
+def _composition_formulas(numbers, counts):
+    natoms = sum(counts)
+
+    # Elements are sorted alphabetically, not by atomic number
+    order = sorted(range(len(numbers)), key=lambda i: chemical_symbols[numbers[i]])
+
+    elements = tuple(chemical_symbols[numbers[i]] for i in order)
+    species_counts = [counts[i] for i in order]
+
+    nelements = len(elements)
+    elements_ratios = tuple(c/natoms for c in species_counts)
+
+    # Build per-element proportions
+    count_gcd = reduce(gcd, species_counts, 0)
     species_proportions = [sc//count_gcd for sc in species_counts]
 
     chemical_formula_reduced = ''
@@ -209,22 +587,7 @@ def process_species_list(atoms):
         if spec_count > 1:
             chemical_formula_anonymous += str(spec_count)
 
-    species = []
-    for el in elements:
-        # https://github.com/Materials-Consortia/OPTIMADE/blob/develop/optimade.rst#7214species
-        species.append({
-            'name': el,
-            'chemical_symbols': [el],
-            'concentration': [1.0],
-        })
-
-    return {
-        'natoms': natoms,
-        'elements': elements,
-        'nelements': nelements,
-        'elements_ratios': elements_ratios,
-        'chemical_formula_anonymous': chemical_formula_anonymous,
-        'chemical_formula_reduced': chemical_formula_reduced,
-        'species': species,
-    }
-
+    return (
+        elements, nelements, elements_ratios,
+        chemical_formula_reduced, chemical_formula_anonymous
+    )
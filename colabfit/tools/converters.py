@@ -121,7 +121,7 @@ class EXYZConverter(BaseConverter):
                     [_.strip() for _ in atoms.info[labels_field].split(',')]
                 )
 
-            yield Configuration.from_ase(atoms)
+            yield Configuration.adopt(atoms)
         #     images[ai] = Configuration.from_ase(atoms)
 
         # return images
@@ -284,7 +284,7 @@ class CFGConverter(BaseConverter):
                             [_.strip() for _ in atoms.info[labels_field].split(',')]
                         )
 
-                    yield Configuration.from_ase(atoms)
+                    yield Configuration.adopt(atoms)
                     ai += 1
 
 class FolderConverter(BaseConverter):
@@ -322,7 +322,9 @@ class FolderConverter(BaseConverter):
         changes:
 
             file_path (str):
-                The path to the parent directory containing the data files.
+                The path to the parent directory containing the data files. If
+                :code:`file_path` is a file, it is passed directly to
+                `self.reader`.
 
             glob_string (str):
                 A string to use with `Path(file_path).rglob(glob_string)` to
@@ -333,7 +335,10 @@ class FolderConverter(BaseConverter):
         """
 
         ai = 0
-        files = list(Path(file_path).rglob(glob_string))
+        if Path(file_path).is_file():
+            files = [Path(file_path)]
+        else:
+            files = list(Path(file_path).rglob(glob_string))
         nf = len(files)
         for fi, fpath in enumerate(files):
             new = self.reader(fpath, **kwargs)
@@ -377,7 +382,7 @@ class FolderConverter(BaseConverter):
                         [_.strip() for _ in atoms.info[labels_field].split(',')]
                     )
 
-                yield Configuration.from_ase(atoms)
+                yield Configuration.adopt(atoms)
                 # images.append(Configuration.from_ase(atoms))
                 ai += 1
 
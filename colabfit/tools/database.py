@@ -1,19 +1,27 @@
 import os
 import json
+import random
 import shutil
 import markdown
 import datetime
+import weakref
 import warnings
 import itertools
 import numpy as np
 from tqdm import tqdm
 import multiprocessing
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+)
 from copy import deepcopy
 from hashlib import sha512
 from getpass import getpass
 from ast import literal_eval
 from functools import partial
-from pymongo import MongoClient, UpdateOne
+from pathlib import Path
+from bson import Binary
+from pymongo import MongoClient, UpdateOne, ASCENDING
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import matplotlib.pyplot as plt
@@ -30,14 +38,22 @@ from colabfit import (
     ID_FORMAT_STRING,
     _CONFIGS_COLLECTION, _PROPS_COLLECTION, _PROPSETTINGS_COLLECTION,
     _CONFIGSETS_COLLECTION, _PROPDEFS_COLLECTION, _DATASETS_COLLECTION,
+    _CONFIGSET_LINKS_COLLECTION, _DATASET_LINKS_COLLECTION,
     ATOMS_NAME_FIELD, ATOMS_LABELS_FIELD, ATOMS_LAST_MODIFIED_FIELD
 )
-from colabfit.tools.configuration import Configuration, process_species_list
+from colabfit.tools.configuration import (
+    Configuration, ConfigurationView, process_species_list
+)
 from colabfit.tools.property import Property
 from colabfit.tools.configuration_set import ConfigurationSet
 from colabfit.tools.converters import CFGConverter, EXYZConverter, FolderConverter
 from colabfit.tools.dataset import Dataset
 from colabfit.tools.property_settings import PropertySettings
+from colabfit.tools.ragged_array import RaggedArray
+from colabfit.tools.statistics import (
+    DistinctCounter, StreamingHistogram, StreamingStatistics,
+    ratio_standard_error
+)
 from colabfit.tools.dataset_parser import (
     DatasetParser, MarkdownFormatError, BadTableFormatting
 )
@@ -104,6 +120,7 @@ class MongoDatabase(MongoClient):
         /configuration_sets
             _id
             last_modified
+            aggregated_summary
             aggregated_info
                 (from configurations)
                 nconfigurations
@@ -121,12 +138,13 @@ class MongoDatabase(MongoClient):
                 nperiodic_dimensions
                 dimension_types
             relationships
-                configurations
+                configurations (if not using link collections)
                 datasets
 
         /datasets
             _id
             last_modified
+            aggregated_summary
             aggregated_info
                 (from configuration sets)
                 nconfigurations
@@ -152,9 +170,17 @@ class MongoDatabase(MongoClient):
                 property_labels
                 property_labels_counts
             relationships
-                properties
+                properties (if not using link collections)
                 configuration_sets
 
+        /configuration_set_links (if using link collections)
+            configuration_set
+            configuration
+
+        /dataset_links (if using link collections)
+            dataset
+            property
+
     Attributes:
 
         database_name (str):
@@ -177,10 +203,19 @@ class MongoDatabase(MongoClient):
 
         datasets (Collection):
             A Mongo collection of dataset documents
+
+        configuration_set_links (Collection):
+            A Mongo collection linking configuration sets to their
+            configurations. Only used if :code:`link_collections=True`.
+
+        dataset_links (Collection):
+            A Mongo collection linking datasets to their properties. Only used
+            if :code:`link_collections=True`.
     """
     def __init__(
         self, database_name, nprocs=1, uri=None,
         drop_database=False, user=None, pwrd=None, port=27017,
+        binary_arrays=False, link_collections=False, create_indexes=True,
         *args, **kwargs
         ):
         """
@@ -207,6 +242,31 @@ class MongoDatabase(MongoClient):
             port (int, default=27017):
                 Mongo server port number
 
+            binary_arrays (bool, default=False):
+                If True, new configuration positions/cells and property arrays
+                are stored as packed binary data along with their dtype and
+                shape, instead of as nested lists. This reduces the storage
+                size and the cost of encoding/decoding, but the array values
+                can no longer be used in Mongo queries. Both formats are always
+                decoded transparently when reading. See
+                :meth:`convert_array_encoding` for converting existing data.
+
+            link_collections (bool, default=False):
+                If True, the configurations of new configuration sets and the
+                properties of new datasets are stored as one document per
+                member in the indexed :attr:`configuration_set_links` and
+                :attr:`dataset_links` collections, instead of as arrays on the
+                configuration set and dataset documents. This removes the limit
+                on the number of members imposed by Mongo's maximum document
+                size. The member IDs are then returned as lazy
+                :class:`LinkedIDs`. Both layouts can be read regardless of this
+                setting.
+
+            create_indexes (bool, default=True):
+                If True, creates the default indexes (see
+                :meth:`ensure_indexes`) if they don't exist yet. Building them
+                on a large existing database can take a while.
+
             *args, **kwargs (list, dict):
                 All additional arguments will be passed directly to the
                 MongoClient constructor.
@@ -246,7 +306,185 @@ class MongoDatabase(MongoClient):
         self.configuration_sets     = self[database_name][_CONFIGSETS_COLLECTION]
         self.datasets               = self[database_name][_DATASETS_COLLECTION]
 
+        self.configuration_set_links = self[database_name][_CONFIGSET_LINKS_COLLECTION]
+        self.dataset_links           = self[database_name][_DATASET_LINKS_COLLECTION]
+
         self.nprocs = nprocs
+        self.binary_arrays = binary_arrays
+        self.link_collections = link_collections
+
+        if create_indexes:
+            self.ensure_indexes()
+
+        # Persistent worker pool used by insert_data(); started when needed
+        self._insert_pool = None
+        self._insert_pool_size = None
+        self._insert_pool_finalizer = None
+
+
+    def _mongo_login(self):
+        """Returns the login information that can be used by other processes
+        to open their own connections to the Mongo server"""
+
+        if self.uri is not None:
+            return self.uri
+        elif self.user is None:
+            return self.port
+        else:
+            return 'mongodb://{}:{}@localhost:{}/'.format(
+                self.user, self.pwrd, self.port
+            )
+
+
+    def _get_insert_pool(self):
+        """
+        Returns the worker pool used for parallel insertion and
+        re-synchronization, starting it if it doesn't exist yet. Each worker
+        keeps its own MongoClient open for the lifetime of the pool.
+        """
+
+        # Restart the pool if nprocs was changed since it was started
+        if (self._insert_pool is not None) and \
+                (self._insert_pool_size != self.nprocs):
+            self._close_insert_pool()
+
+        if self._insert_pool is None:
+            self._insert_pool = multiprocessing.Pool(
+                self.nprocs,
+                initializer=_init_insert_worker,
+                initargs=(
+                    self._mongo_login(), self.login_args, self.login_kwargs
+                ),
+            )
+            self._insert_pool_size = self.nprocs
+
+            # Terminates the workers if the database is garbage collected (or
+            # the interpreter exits) without calling close()
+            self._insert_pool_finalizer = weakref.finalize(
+                self, self._insert_pool.terminate
+            )
+
+        return self._insert_pool
+
+
+    def _close_insert_pool(self):
+        """Shuts down the insertion worker pool, if it was started"""
+
+        if self._insert_pool is None:
+            return
+
+        self._insert_pool_finalizer.detach()
+        self._insert_pool.close()
+        self._insert_pool.join()
+
+        self._insert_pool = None
+        self._insert_pool_size = None
+        self._insert_pool_finalizer = None
+
+
+    def ensure_indexes(self, property_fields=None):
+        """
+        Creates the indexes used by the queries of this class, if they don't
+        exist yet: the links between documents (e.g.,
+        :code:`relationships.configurations`), the link collections, and the
+        fields that are commonly filtered on (e.g., :code:`elements`,
+        :code:`labels`, :code:`nsites`, :code:`chemical_formula_*`, or
+        property :code:`type`). See :data:`_DEFAULT_INDEXES` for the full list.
+
+        Args:
+
+            property_fields (list or str, default=None):
+                Property fields to also index, for filtering or sorting on their
+                values (e.g., 'energy-forces-stress.energy' creates an index on
+                'energy-forces-stress.energy.source-value'). Note that values
+                stored in binary format (see :code:`binary_arrays`) can't be
+                used in queries.
+
+        Returns:
+
+            indexes (dict):
+                A dictionary of collection name: list of index names
+        """
+
+        if isinstance(property_fields, str):
+            property_fields = [property_fields]
+
+        indexes = {
+            collection_name: list(collection_indexes)
+            for collection_name, collection_indexes in _DEFAULT_INDEXES.items()
+        }
+
+        if property_fields is not None:
+            indexes[_PROPS_COLLECTION] += [
+                (f + '.source-value', {}) for f in property_fields
+            ]
+
+        names = {}
+        for collection_name, collection_indexes in indexes.items():
+            collection = self[self.database_name][collection_name]
+
+            names[collection_name] = [
+                collection.create_index(keys, **options)
+                for keys, options in collection_indexes
+            ]
+
+        return names
+
+
+    def index_report(self, verbose=False):
+        """
+        Runs :code:`explain` on the queries made by this class (e.g., getting
+        the configurations of a configuration set, or the properties of a
+        dataset) and reports which ones would scan entire collections instead
+        of using an index. The queries aren't executed, so this is fast even
+        on large databases.
+
+        Args:
+
+            verbose (bool, default=False):
+                If True, prints the queries that scan entire collections
+
+        Returns:
+
+            report (list):
+                A list of dictionaries with the 'collection', 'query',
+                'description', and 'collection_scan' (True if the query plan
+                contains a COLLSCAN stage) of each query
+        """
+
+        report = []
+        for collection_name, query, sort, description in _REPORTED_QUERIES:
+            cursor = self[self.database_name][collection_name].find(query)
+
+            if sort is not None:
+                cursor = cursor.sort(sort, ASCENDING)
+
+            plan = cursor.explain()['queryPlanner']['winningPlan']
+
+            report.append({
+                'collection': collection_name,
+                'query': query,
+                'description': description,
+                'collection_scan': _has_plan_stage(plan, 'COLLSCAN'),
+            })
+
+            if verbose and report[-1]['collection_scan']:
+                print(
+                    'Collection scan on {}: {} ({})'.format(
+                        collection_name, query, description
+                    )
+                )
+
+        return report
+
+
+    def close(self):
+        """Shuts down the insertion worker pool (if it was started), then
+        closes the client"""
+
+        self._close_insert_pool()
+
+        super().close()
 
 
     def insert_data(
@@ -254,7 +492,11 @@ class MongoDatabase(MongoClient):
         configurations,
         property_map=None,
         transform=None,
+        skip_existing=False,
         generator=False,
+        chunk_size=1000,
+        flush_size=10000,
+        flush_bytes=2**26,
         verbose=True
         ):
         """
@@ -316,11 +558,37 @@ class MongoDatabase(MongoClient):
                 Note that this happens before anything else is done. `transform`
                 should modify the Configuration in-place.
 
+            skip_existing (bool, default=False):
+                If True, the IDs of the configurations are checked against the
+                database in batches before any other processing is done.
+                Configurations that already exist and already have at least as
+                many properties of each type as the property map would create
+                only have their names and labels updated; their properties
+                aren't re-built. In this case, the IDs of the existing
+                properties are returned.
+
             generator (bool, default=False):
                 If True, returns a generator of the results; otherwise returns
-                a list. If True, uses :code:`update_one` instead of
-                :code:`bulk_write` to avoid having to store update documents in
-                memory.
+                a list. Note that the data is only inserted as the generator is
+                consumed.
+
+            chunk_size (int, default=1000):
+                Only used if :attr:`nprocs` > 1. The number of configurations
+                sent to a worker process at a time. The workers take new chunks
+                as soon as they finish their previous ones, and at most
+                :code:`2*nprocs` chunks are held in memory at any given time,
+                so :code:`configurations` can be a generator over a dataset
+                that doesn't fit in memory.
+
+            flush_size (int, default=10000):
+                The maximum number of update documents that are held in memory
+                (per process) before being written to the database using an
+                unordered :code:`bulk_write`.
+
+            flush_bytes (int, default=2**26):
+                The approximate maximum size (in bytes) of the update documents
+                that are held in memory (per process) before being written to
+                the database.
 
             verbose (bool, default=False):
                 If True, prints a progress bar
@@ -333,15 +601,238 @@ class MongoDatabase(MongoClient):
 
         """
 
-        if self.uri is not None:
-            mongo_login = self.uri
+        property_map = self._check_property_map(property_map)
+
+        if self.nprocs > 1:
+            results = self._insert_data_parallel(
+                configurations=configurations,
+                property_map=property_map,
+                transform=transform,
+                skip_existing=skip_existing,
+                chunk_size=chunk_size,
+                flush_size=flush_size,
+                flush_bytes=flush_bytes,
+                verbose=verbose
+            )
         else:
-            if self.user is None:
-                mongo_login = self.port
-            else:
-                mongo_login = 'mongodb://{}:{}@localhost:{}/'.format(
-                    self.user, self.pwrd, self.port
-                )
+            results = self._insert_data_generator(
+                mongo_login=self._mongo_login(),
+                login_args=self.login_args,
+                login_kwargs=self.login_kwargs,
+                database_name=self.database_name,
+                configurations=configurations,
+                property_map=property_map,
+                transform=transform,
+                skip_existing=skip_existing,
+                binary_arrays=self.binary_arrays,
+                flush_size=flush_size,
+                flush_bytes=flush_bytes,
+                verbose=verbose
+            )
+
+        if generator:
+            return results
+        else:
+            return list(results)
+
+
+    def insert_data_from_files(
+        self,
+        file_path,
+        file_format,
+        name_field,
+        elements,
+        default_name='',
+        labels_field=None,
+        reader=None,
+        glob_string=None,
+        property_map=None,
+        transform=None,
+        skip_existing=False,
+        generator=False,
+        flush_size=10000,
+        flush_bytes=2**26,
+        verbose=True,
+        **kwargs,
+        ):
+        """
+        Loads configurations from files (see :meth:`load_data`) and inserts
+        them into the database, as :meth:`insert_data`. If :attr:`nprocs` > 1,
+        each file is assigned to a worker process, which parses the file and
+        writes to the database itself; no Configuration objects are sent
+        between processes.
+
+        Args:
+
+            file_path (str or list):
+                The path to a data file, a folder, or a list of paths. Folders
+                are searched using :code:`glob_string`.
+
+            file_format (str):
+                See :meth:`load_data`.
+
+            name_field (str):
+                See :meth:`load_data`.
+
+            elements (list):
+                See :meth:`load_data`.
+
+            default_name (str, default=''):
+                Configurations without a name are named
+                :code:`'<default_name>_<file index>_<index in file>'`.
+
+            labels_field (str, default=None):
+                See :meth:`load_data`.
+
+            reader (callable, default=None):
+                See :meth:`load_data`. Must be picklable (e.g., defined at the
+                top level of a module) if :attr:`nprocs` > 1.
+
+            glob_string (str, default=None):
+                A string to use with :code:`Path(path).rglob(glob_string)` to
+                find the files in any folders given in :code:`file_path`.
+                Required if :code:`file_path` contains folders.
+
+            property_map (dict, default=None):
+                See :meth:`insert_data`.
+
+            transform (callable, default=None):
+                See :meth:`insert_data`. Must be picklable if
+                :attr:`nprocs` > 1.
+
+            skip_existing (bool, default=False):
+                See :meth:`insert_data`.
+
+            generator (bool, default=False):
+                See :meth:`insert_data`.
+
+            flush_size (int, default=10000):
+                See :meth:`insert_data`.
+
+            flush_bytes (int, default=2**26):
+                See :meth:`insert_data`.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        All other keyword arguments are passed to the converter (see
+        :meth:`load_data`).
+
+        Returns:
+
+            ids (list):
+                A list of (config_id, property_id) tuples of the inserted data,
+                in the order of the files.
+
+        """
+
+        property_map = self._check_property_map(property_map)
+
+        files = _find_shards(file_path, glob_string)
+
+        load_kwargs = dict(
+            file_format=file_format,
+            name_field=name_field,
+            elements=elements,
+            default_name=default_name,
+            labels_field=labels_field,
+            reader=reader,
+            **kwargs,
+        )
+
+        if self.nprocs > 1:
+            results = self._insert_files_parallel(
+                files=files,
+                load_kwargs=load_kwargs,
+                property_map=property_map,
+                transform=transform,
+                skip_existing=skip_existing,
+                flush_size=flush_size,
+                flush_bytes=flush_bytes,
+                verbose=verbose
+            )
+        else:
+            results = self._insert_data_generator(
+                mongo_login=self._mongo_login(),
+                login_args=self.login_args,
+                login_kwargs=self.login_kwargs,
+                database_name=self.database_name,
+                configurations=itertools.chain.from_iterable(
+                    _load_shard(fi, fpath, load_kwargs)
+                    for fi, fpath in enumerate(files)
+                ),
+                property_map=property_map,
+                transform=transform,
+                skip_existing=skip_existing,
+                binary_arrays=self.binary_arrays,
+                flush_size=flush_size,
+                flush_bytes=flush_bytes,
+                verbose=verbose
+            )
+
+        if generator:
+            return results
+        else:
+            return list(results)
+
+
+    def _insert_files_parallel(
+        self,
+        files,
+        load_kwargs,
+        property_map,
+        transform,
+        skip_existing,
+        flush_size,
+        flush_bytes,
+        verbose=False
+        ):
+        """
+        Distributes the files over the persistent worker pool, and yields the
+        inserted IDs in the order of the files. Idle workers take the next
+        file as soon as they finish their previous one.
+        """
+
+        pool = self._get_insert_pool()
+
+        nmatched = {}
+
+        results = pool.imap(
+            partial(
+                _insert_files_worker,
+                database_name=self.database_name,
+                load_kwargs=load_kwargs,
+                property_map=property_map,
+                transform=transform,
+                skip_existing=skip_existing,
+                binary_arrays=self.binary_arrays,
+                flush_size=flush_size,
+                flush_bytes=flush_bytes,
+            ),
+            enumerate(files),
+        )
+
+        for ids, file_nmatched in tqdm(
+            results,
+            desc='Inserting files',
+            total=len(files),
+            disable=not verbose,
+            ):
+
+            for k, v in file_nmatched.items():
+                nmatched[k] = nmatched.get(k, 0) + v
+
+            yield from ids
+
+        _warn_duplicates(nmatched)
+
+
+    def _check_property_map(self, property_map):
+        """
+        Performs sanity checks on a property map passed to :meth:`insert_data`
+        against the property definitions that exist in the database. Returns
+        the property map, or an empty dictionary if it is None.
+        """
 
         if property_map is None:
             property_map = {}
@@ -384,42 +875,77 @@ class MongoDatabase(MongoClient):
                     'existing definition in the database.'.format(pname)
                 )
 
-        if generator:
-            return self._insert_data_generator(
-                mongo_login=mongo_login,
-                login_args=self.login_args,
-                login_kwargs=self.login_kwargs,
-                database_name=self.database_name,
-                configurations=configurations,
-                property_map=property_map,
-                transform=transform,
-                verbose=verbose
-            )
-        else:
-            configurations = list(configurations)
+        return property_map
 
-            n = len(configurations)
-            k = self.nprocs
 
-            split_configs = [
-                configurations[i*(n//k)+min(i, n%k):(i+1)*(n//k)+min(i+1, n%k)]
-                for i in range(k)
-            ]
+    def _insert_data_parallel(
+        self,
+        configurations,
+        property_map,
+        transform,
+        skip_existing,
+        chunk_size,
+        flush_size,
+        flush_bytes,
+        verbose=False
+        ):
+        """
+        Streams chunks of configurations to the persistent worker pool, and
+        yields the inserted IDs in the same order as the configurations.
 
-            pfunc = partial(
-                self._insert_data,
-                mongo_login=mongo_login,
-                database_name=self.database_name,
-                property_map=property_map,
-                transform=transform,
-                verbose=verbose
-            )
+        The chunks are placed on the pool's shared task queue, so idle workers
+        always take the next available chunk regardless of how long the other
+        chunks take. New chunks are only read from :code:`configurations` once
+        the number of pending chunks drops below :code:`2*nprocs`.
+        """
+
+        if isinstance(configurations, Configuration):
+            configurations = [configurations]
 
-            pool = multiprocessing.Pool(self.nprocs)
+        configurations = iter(configurations)
 
-            return list(itertools.chain.from_iterable(
-                pool.map(pfunc, split_configs)
-            ))
+        pool = self._get_insert_pool()
+
+        max_pending = 2*self.nprocs
+
+        pending = deque()
+        nmatched = {}
+
+        pbar = tqdm(desc='Inserting data', unit=' configurations', disable=not verbose)
+
+        while True:
+            chunk = list(itertools.islice(configurations, chunk_size))
+
+            if chunk:
+                pending.append((len(chunk), pool.apply_async(
+                    _insert_data_worker,
+                    (
+                        chunk, self.database_name, property_map, transform,
+                        skip_existing, self.binary_arrays,
+                        flush_size, flush_bytes,
+                    )
+                )))
+
+                # Keep reading until the queue is full
+                if len(pending) < max_pending:
+                    continue
+
+            if not pending:
+                break
+
+            nconfigs, result = pending.popleft()
+            ids, chunk_nmatched = result.get()
+
+            for k, v in chunk_nmatched.items():
+                nmatched[k] = nmatched.get(k, 0) + v
+
+            pbar.update(nconfigs)
+
+            yield from ids
+
+        pbar.close()
+
+        _warn_duplicates(nmatched)
 
 
     @staticmethod
@@ -428,21 +954,56 @@ class MongoDatabase(MongoClient):
         mongo_login,
         login_args,
         login_kwargs,
-        property_map=None, transform=None,
+        property_map=None, transform=None, skip_existing=False,
+        binary_arrays=False,
+        flush_size=None, flush_bytes=None,
         verbose=False
         ):
 
-        if isinstance(mongo_login, int):
-            client = MongoClient(
-                'localhost', mongo_login, *login_args, **login_kwargs
-            )
-        else:
-            client = MongoClient(mongo_login, *login_args, **login_kwargs)
+        client = _connect(mongo_login, login_args, login_kwargs)
+
+        writer = _insert_data_writer(
+            client[database_name], flush_size, flush_bytes
+        )
+
+        yield from MongoDatabase._insert_data_stream(
+            database=client[database_name],
+            configurations=configurations,
+            writer=writer,
+            property_map=property_map,
+            transform=transform,
+            skip_existing=skip_existing,
+            binary_arrays=binary_arrays,
+            verbose=verbose,
+        )
+
+        writer.flush()
+
+        _warn_duplicates(writer.nmatched)
+
+        client.close()
+
+
+    @staticmethod
+    def _insert_data_stream(
+        database, configurations, writer,
+        property_map=None, transform=None, skip_existing=False,
+        binary_arrays=False,
+        verbose=False
+        ):
+        """
+        Builds the update documents for the configurations, properties, and
+        property settings, and passes them to :code:`writer` (a
+        :class:`_InsertDataWriter` as returned by :func:`_insert_data_writer`).
+        Yields (configuration ID, property ID) pairs. Note that the writer
+        isn't flushed at the end; this is left to the caller.
+
+        Labels that are added to configurations that already belong to
+        configuration sets are passed to :meth:`_InsertDataWriter.add_labels`,
+        so that the stored summaries are updated when the writer is flushed.
+        """
 
-        coll_configurations         = client[database_name][_CONFIGS_COLLECTION]
-        coll_properties             = client[database_name][_PROPS_COLLECTION]
-        coll_property_definitions   = client[database_name][_PROPDEFS_COLLECTION]
-        coll_property_settings      = client[database_name][_PROPSETTINGS_COLLECTION]
+        coll_property_definitions   = database[_PROPDEFS_COLLECTION]
 
         if isinstance(configurations, Configuration):
             configurations = [configurations]
@@ -473,32 +1034,82 @@ class MongoDatabase(MongoClient):
             for pname in property_map
         }
 
-        config_docs     = []
-        property_docs   = []
-        settings_docs   = []
-
         # Add all of the configurations into the Mongo server
         ai = 1
-        for atoms in tqdm(
-            configurations,
+        for atoms, cid, existing, member in tqdm(
+            _find_existing(
+                database, configurations, transform, skip_existing
+            ),
             desc='Preparing to add configurations to Database',
             disable=not verbose,
             ):
 
-            if transform:
-                transform(atoms)
+            available_keys = set().union(atoms.info.keys(), atoms.arrays.keys())
 
-            cid = ID_FORMAT_STRING.format('CO', hash(atoms), 0)
+            if member is not None:
+                writer.add_labels(
+                    cid,
+                    member['relationships']['configuration_sets'],
+                    set(atoms.info[ATOMS_LABELS_FIELD]).difference(
+                        member.get('labels', [])
+                    )
+                )
 
-            processed_fields = process_species_list(atoms)
+            if existing is not None:
+                # Number of properties of each type that would be created
+                nexpected = {
+                    pname: sum(
+                        1 for ek in expected_keys[pname]
+                        if not (ek - available_keys)
+                    )
+                    for pname in property_map
+                }
 
-            # Add if doesn't exist, else update (since last-modified changed)
-            c_update_doc =  {  # update document
-                    '$setOnInsert': {
+                if all(
+                    len(existing.get(pname, [])) >= n
+                    for pname, n in nexpected.items()
+                    ):
+                    # Only merge the names and labels
+                    writer.add(_CONFIGS_COLLECTION, UpdateOne(
+                        {'_id': cid},
+                        {
+                            '$set': {
+                                'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+                            },
+                            '$addToSet': {
+                                'names': {
+                                    '$each': list(atoms.info[ATOMS_NAME_FIELD])
+                                },
+                                'labels': {
+                                    '$each': list(atoms.info[ATOMS_LABELS_FIELD])
+                                },
+                            }
+                        }
+                    ))
+
+                    pids = [
+                        pid for pname in property_map
+                        for pid in existing.get(pname, [])
+                    ]
+
+                    if pids:
+                        for pid in pids:
+                            yield (cid, pid)
+                    else:
+                        yield (cid, None)
+
+                    ai += 1
+                    continue
+
+            processed_fields = process_species_list(atoms)
+
+            # Add if doesn't exist, else update (since last-modified changed)
+            c_update_doc =  {  # update document
+                    '$setOnInsert': {
                         '_id': cid,
                         'atomic_numbers': atoms.get_atomic_numbers().tolist(),
-                        'positions': atoms.get_positions().tolist(),
-                        'cell': np.array(atoms.get_cell()).tolist(),
+                        'positions': _encode_array(atoms.get_positions(), binary_arrays),
+                        'cell': _encode_array(np.array(atoms.get_cell()), binary_arrays),
                         'pbc': atoms.get_pbc().astype(int).tolist(),
                         'elements': processed_fields['elements'],
                         'nelements': processed_fields['nelements'],
@@ -509,7 +1120,7 @@ class MongoDatabase(MongoClient):
                         'nsites': len(atoms),
                         'dimension_types': atoms.get_pbc().astype(int).tolist(),
                         'nperiodic_dimensions': int(sum(atoms.get_pbc())),
-                        'lattice_vectors': np.array(atoms.get_cell()).tolist(),
+                        'lattice_vectors': _encode_array(np.array(atoms.get_cell()), binary_arrays),
                     },
                     '$set': {
                         'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
@@ -527,8 +1138,6 @@ class MongoDatabase(MongoClient):
                     }
                 }
 
-            available_keys = set().union(atoms.info.keys(), atoms.arrays.keys())
-
             pid = None
 
             new_pids = []
@@ -648,7 +1257,7 @@ class MongoDatabase(MongoClient):
                                 }
                             }
 
-                        settings_docs.append(UpdateOne(
+                        writer.add(_PROPSETTINGS_COLLECTION, UpdateOne(
                             {'_id': ps_id},
                             ps_update_doc,
                             upsert=True,
@@ -660,6 +1269,7 @@ class MongoDatabase(MongoClient):
 
                     # Prepare the property instance EDN document
                     setOnInsert = {}
+                    p_nvalues = 0
                     # for k in property_map[pname]:
                     for k in pmap:
                         if k not in prop.keys():
@@ -674,10 +1284,11 @@ class MongoDatabase(MongoClient):
                             }
                         else:
                             # Then it's array-like and should be converted to a list
+                            v = np.atleast_1d(prop[k]['source-value'])
+                            p_nvalues += v.size
+
                             setOnInsert[k] = {
-                                'source-value': np.atleast_1d(
-                                    prop[k]['source-value']
-                                ).tolist()
+                                'source-value': _encode_array(v, binary_arrays)
                             }
 
                         if 'source-unit' in prop[k]:
@@ -703,11 +1314,11 @@ class MongoDatabase(MongoClient):
                             }
                         }
 
-                    property_docs.append(UpdateOne(
-                        {'_id': pid},
-                        p_update_doc,
-                        upsert=True,
-                    ))
+                    writer.add(
+                        _PROPS_COLLECTION,
+                        UpdateOne({'_id': pid}, p_update_doc, upsert=True),
+                        nvalues=p_nvalues,
+                    )
 
                     c_update_doc['$addToSet']['relationships.properties']['$each'].append(
                         pid
@@ -715,8 +1326,10 @@ class MongoDatabase(MongoClient):
 
                     yield (cid, pid)
 
-            config_docs.append(
-                UpdateOne({'_id': cid}, c_update_doc, upsert=True)
+            writer.add(
+                _CONFIGS_COLLECTION,
+                UpdateOne({'_id': cid}, c_update_doc, upsert=True),
+                nvalues=2*atoms.positions.size,
             )
 
             if not pid:
@@ -725,2801 +1338,5566 @@ class MongoDatabase(MongoClient):
 
             ai += 1
 
-        if config_docs:
-            res = coll_configurations.bulk_write(config_docs, ordered=False)
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate configurations detected'.format(nmatch)
-                )
-        if property_docs:
-            res = coll_properties.bulk_write(property_docs, ordered=False)
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate properties detected'.format(nmatch)
-                )
-
-        if settings_docs:
-            res = coll_property_settings.bulk_write(
-                settings_docs,
-                # [
-                #     UpdateOne(
-                #         {'_id': sid},
-                #         {'$addToSet': {'relationships.properties': {'$each': lst}}}
-                #     ) for sid, lst in settings_docs.items()
-                # ],
-                ordered=False
-            )
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate property settings detected'.format(nmatch)
-                )
-
-
-        client.close()
-
-
-
-    @staticmethod
-    def _insert_data(
-        configurations, database_name, mongo_login,
-        property_map=None, transform=None,
-        verbose=False
-        ):
-
-        if isinstance(mongo_login, int):
-            client = MongoClient('localhost', mongo_login)
-        else:
-            client = MongoClient(mongo_login)
-
-        coll_configurations         = client[database_name][_CONFIGS_COLLECTION]
-        coll_properties             = client[database_name][_PROPS_COLLECTION]
-        coll_property_definitions   = client[database_name][_PROPDEFS_COLLECTION]
-        coll_property_settings      = client[database_name][_PROPSETTINGS_COLLECTION]
 
-        if isinstance(configurations, Configuration):
-            configurations = [configurations]
+    def insert_property_definition(self, definition):
+        """
+        Inserts a new property definition into the database. Checks that
+        definition is valid, then builds all necessary groups in
+        :code:`/root/properties`. Throws an error if the property already
+        exists.
 
-        if property_map is None:
-            property_map = {}
+        Args:
 
-        # if property_settings is None:
-        #     property_settings = []
+            definition (dict or string):
+                The map defining the property. See the example below, or the
+                `OpenKIM Properties Framework <https://openkim.org/doc/schema/properties-framework/>`_
+                for more details. If a string is provided, it must be the name
+                of an existing property definition from the
+                `OpenKIM Properties List <https://openkim.org/properties>`_.
 
-        property_definitions = {
-            pname: coll_property_definitions.find_one({'_id': pname})['definition']
-            for pname in property_map
-        }
+        Example definition:
 
-        ignore_keys = {
-            'property-id', 'property-title', 'property-description',
-            'last_modified', 'definition', '_id', '_settings'
-        }
+        .. code-block:: python
 
-        expected_keys = {
-            pname: [set(
-                # property_map[pname][f]['field']
-                pmap[f]['field']
-                for f in property_definitions[pname].keys() - ignore_keys
-                if property_definitions[pname][f]['required']
-            ) for pmap in property_map[pname]]
-            for pname in property_map
-        }
+            property_definition = {
+                'property-id': 'default',
+                'property-title': 'A default property used for testing',
+                'property-description': 'A description of the property',
+                'energy': {'type': 'float', 'has-unit': True, 'extent': [], 'required': True, 'description': 'empty'},
+                'stress': {'type': 'float', 'has-unit': True, 'extent': [6], 'required': True, 'description': 'empty'},
+                'name': {'type': 'string', 'has-unit': False, 'extent': [], 'required': True, 'description': 'empty'},
+                'nd-same-shape': {'type': 'float', 'has-unit': True, 'extent': [2,3,5], 'required': True, 'description': 'empty'},
+                'nd-diff-shape': {'type': 'float', 'has-unit': True, 'extent': [":", ":", ":"], 'required': True, 'description': 'empty'},
+                'forces': {'type': 'float', 'has-unit': True, 'extent': [":", 3], 'required': True, 'description': 'empty'},
+                'nd-same-shape-arr': {'type': 'float', 'has-unit': True, 'extent': [':', 2, 3], 'required': True, 'description': 'empty'},
+                'nd-diff-shape-arr': {'type': 'float', 'has-unit': True, 'extent': [':', ':', ':'], 'required': True, 'description': 'empty'},
+            }
 
-        insertions = []
+        """
 
-        config_docs     = []
-        property_docs   = []
-        settings_docs   = []
+        if isinstance(definition, str):
+            definition = KIM_PROPERTIES[definition]
 
-        # Add all of the configurations into the Mongo server
-        ai = 1
-        for atoms in tqdm(
-            configurations,
-            desc='Preparing to add configurations to Database',
-            disable=not verbose,
+        if self.property_definitions.count_documents(
+            {'_id': definition['property-id']}
             ):
+            warnings.warn(
+                "Property definition with name '{}' already exists. "\
+                "Using existing definition.".format(
+                    definition['property-id']
+                )
+            )
 
-            if transform:
-                transform(atoms)
+        dummy_dict = deepcopy(definition)
 
-            cid = ID_FORMAT_STRING.format('CO', hash(atoms), 0)
+        # Spoof if necessary
+        if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
+            # Invalid ID. Try spoofing it
+            dummy_dict['property-id'] = 'tag:@,0000-00-00:property/'
+            dummy_dict['property-id'] += definition['property-id']
+            warnings.warn(
+                "Invalid KIM property-id; "\
+                "Temporarily renaming to {}. "\
+                "See https://openkim.org/doc/schema/properties-framework/ "\
+                "for more details.".format(dummy_dict['property-id'])
+            )
 
-            processed_fields = process_species_list(atoms)
+        check_property_definition(dummy_dict)
 
-            # Add if doesn't exist, else update (since last-modified changed)
-            c_update_doc =  {  # update document
-                    '$setOnInsert': {
-                        '_id': cid,
-                        'atomic_numbers': atoms.get_atomic_numbers().tolist(),
-                        'positions': atoms.get_positions().tolist(),
-                        'cell': np.array(atoms.get_cell()).tolist(),
-                        'pbc': atoms.get_pbc().astype(int).tolist(),
-                        'elements': processed_fields['elements'],
-                        'nelements': processed_fields['nelements'],
-                        'elements_ratios': processed_fields['elements_ratios'],
-                        'chemical_formula_reduced': processed_fields['chemical_formula_reduced'],
-                        'chemical_formula_anonymous': processed_fields['chemical_formula_anonymous'],
-                        'chemical_formula_hill': atoms.get_chemical_formula(),
-                        'nsites': len(atoms),
-                        'dimension_types': atoms.get_pbc().astype(int).tolist(),
-                        'nperiodic_dimensions': int(sum(atoms.get_pbc())),
-                        'lattice_vectors': np.array(atoms.get_cell()).tolist(),
-                    },
-                    '$set': {
-                        'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-                    },
-                    '$addToSet': {
-                        'names': {
-                            '$each': list(atoms.info[ATOMS_NAME_FIELD])
-                        },
-                        'labels': {
-                            '$each': list(atoms.info[ATOMS_LABELS_FIELD])
-                        },
-                        'relationships.properties': {
-                            '$each': []
-                        }
-                    }
+        self.property_definitions.update_one(
+            {'_id': definition['property-id']},
+            {
+                '$setOnInsert': {
+                    '_id': definition['property-id'],
+                    'definition': dummy_dict
                 }
+            },
+            upsert=True
+        )
 
-            available_keys = set().union(atoms.info.keys(), atoms.arrays.keys())
-
-            pid = None
 
-            new_pids = []
-            for pname, pmap_list in property_map.items():
-                for pmap_i, pmap in enumerate(pmap_list):
-                    pmap_copy = dict(pmap)
-                    if '_settings' in pmap_copy:
-                        del pmap_copy['_settings']
+    def get_property_definition(self, name):
+        return self.property_definitions.find_one({'_id': name})
 
-                    # Pre-check to avoid having to delete partially-added properties
-                    missing_keys = expected_keys[pname][pmap_i] - available_keys
-                    if missing_keys:
-                        # warnings.warn(
-                        #     "Configuration is missing keys {} for Property"\
-                        #     "Instance construction. Available keys: {}. "\
-                        #     "Skipping".format(
-                        #         missing_keys, available_keys
-                        #     )
-                        # )
-                        continue
 
-                    prop = Property.from_definition(
-                        definition=property_definitions[pname],
-                        configuration=atoms,
-                        property_map=pmap_copy
-                    )
+    def insert_property_settings(self, ps_object):
+        """
+        Inserts a new property settings object into the database by creating
+        and populating the necessary groups in :code:`/root/property_settings`.
 
-                    pid = ID_FORMAT_STRING.format('PI', hash(prop), 0)
+        Args:
 
-                    new_pids.append(pid)
+            ps_object (PropertySettings)
+                The :class:`~colabfit.tools.property_settings.PropertySettings`
+                object to insert into the database.
 
-                    labels = []
-                    methods = []
-                    settings_ids = []
 
-                    # Attach property settings, if any were given
-                    if '_settings' in pmap:
-                        pso_map = pmap['_settings']
+        Returns:
 
-                        all_ps_fields = set(pso_map.keys()) - {
-                            '_method', '_description', '_files', '_labels'
-                        }
+            ps_id (str):
+                The ID of the inserted property settings object. Equals the hash
+                of the object.
+        """
 
-                        # ps_not_required = {
-                        #     psk for psk in all_ps_fields if not pso_map[psk]['required']
-                        # }
+        ps_id = ID_FORMAT_STRING.format('PS', hash(ps_object), 0)
 
-                        # ps_missing_keys = all_ps_fields  - available_keys - ps_not_required
+        self.property_settings.update_one(
+            {'_id': ps_id},
+            {
+                '$addToSet': {
+                    'labels': {'$each': list(ps_object.labels)}
+                },
+                '$setOnInsert': {
+                    '_id': ps_id,
+                    'method': ps_object.method,
+                    'description': ps_object.description,
+                    'files': [
+                        {
+                            'file_name': ftup[0],
+                            'file_contents': ftup[1],
+                        } for ftup in ps_object.files
+                    ],
+                }
+            },
+            upsert=True
+        )
 
-                        # if not ps_missing_keys:
-                        #     # Has all of the required PS keys
+        return ps_id
 
-                        gathered_fields = {}
-                        for ps_field in all_ps_fields:
-                            psf_key = pso_map[ps_field]['field']
 
-                            if ps_field in atoms.info:
-                                v = atoms.info[psf_key]
-                            elif ps_field in atoms.arrays:
-                                v = atoms.arrays[psf_key]
-                            else:
-                                # No keys are required; ignored if missing
-                                continue
+    def get_property_settings(self, pso_id):
+        pso_doc = self.property_settings.find_one({'_id': pso_id})
 
-                            gathered_fields[ps_field] = {
-                                # 'required': pso_map[ps_field]['required'],
-                                'source-value': v,
-                                'source-unit':  pso_map[ps_field]['units'],
-                            }
+        return PropertySettings(
+                method=pso_doc['method'],
+                description=pso_doc['description'],
+                labels=set(pso_doc['labels']),
+                files=[
+                    (d['file_name'], d['file_contents'])
+                    for d in pso_doc['files']
+                ]
+            )
+
+
+    # @staticmethod
+    def get_data(
+        self, collection_name,
+        fields,
+        query=None,
+        ids=None,
+        keep_ids=False,
+        concatenate=False,
+        vstack=False,
+        ravel=False,
+        unpack_properties=True,
+        columnar=False,
+        batch_size=None,
+        verbose=False,
+        ):
+        """
+        Queries the database and returns the fields specified by `keys` as a
+        list or an array of values. Returns the results in memory.
+
+        Example:
+
+        .. code-block:: python
+
+            data = database.get_data(
+                collection_name='properties',
+                query={'_id': {'$in': <list_of_property_IDs>}},
+                fields=['property_name_1.energy', 'property_name_1.forces'],
+                cache=True
+            )
+
+        Args:
+
+            collection_name (str):
+                The name of a collection in the database.
+
+            fields (list or str):
+                The fields to return from the documents. Sub-fields can be
+                returned by providing names separated by periods ('.')
+
+            query (dict, default=None):
+                A Mongo query dictionary. If None, returns the data for all of
+                the documents in the collection.
+
+            ids (list):
+                The list of IDs to return the data for. If None, returns the
+                data for the entire collection. Note that this information can
+                also be provided using the :code:`query` argument. Long lists
+                of IDs are queried in concurrent batches, and the data is
+                returned sorted by ID.
+
+            keep_ids (bool, default=False):
+                If True, includes the '_id' field as one of the returned values.
+
+            concatenate (bool, default=False):
+                If True, concatenates the data before returning.
+
+            vstack (bool, default=False):
+                If True, calls np.vstack on data before returning.
+
+            ravel (bool, default=False):
+                If True, concatenates and ravels the data before returning.
+
+            unpack_properties (bool, default=True):
+                If True, returns only the contents of the :code:`'source-value'`
+                key for each field in :attr:`fields` (assuming
+                :code:`'source-value'` exists). Users who wish to return the
+                full dictionaries for fields should set
+                :code:`unpack_properties=False`.
+
+            columnar (bool, default=False):
+                If True, returns each field as a
+                :class:`~colabfit.tools.ragged_array.RaggedArray`: a flat
+                buffer of the values of all of the documents, concatenated
+                along their first dimension, with the offsets of each document
+                and the IDs of the documents. Per-atom fields keep the
+                boundaries between configurations, and scalars have one value
+                per document. The buffers are allocated once, using sizes
+                computed by the Mongo server. The values of each field must
+                have the same shape after their first dimension; otherwise a
+                RuntimeError is raised. :code:`keep_ids`,
+                :code:`concatenate`, :code:`vstack`, and :code:`ravel` are
+                ignored.
+
+            batch_size (int, default=None):
+                If not None, returns an iterator over chunks of at most
+                :code:`batch_size` documents instead of loading all of the
+                data at once. Each chunk has the same format as the output of
+                :code:`columnar=True`, so the data can be processed out of
+                core. :code:`keep_ids`, :code:`concatenate`, :code:`vstack`,
+                and :code:`ravel` are ignored.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            data (dict):
+                key = k for k in keys. val = in-memory data
+        """
+
+        if query is None:
+            query = {}
+
+        if isinstance(fields, str):
+            fields = [fields]
+
+        retfields = {k: 1 for k in fields}
+
+        if keep_ids:
+            retfields['_id'] = 1
+
+        collection = self[self.database_name][collection_name]
+
+        if ids is not None:
+            if isinstance(ids, str):
+                ids = [ids]
+            elif isinstance(ids, np.ndarray):
+                ids = ids.tolist()
+
+        if batch_size is not None:
+            chunks = _iter_columnar_data(
+                collection, fields, query, ids, unpack_properties, batch_size,
+                verbose=verbose
+            )
+
+            if len(fields) == 1:
+                return (chunk[fields[0]] for chunk in chunks)
+            else:
+                return chunks
+
+        if columnar:
+            data = _get_columnar_data(
+                collection, fields, query, ids, unpack_properties, verbose
+            )
+
+            if len(fields) == 1:
+                return data[fields[0]]
+            else:
+                return data
+
+        if ids is not None:
+            cursor = _find_in(collection, ids, query, retfields)
+        else:
+            cursor = collection.find(query, retfields)
+
+        data = {
+            k: [] for k in retfields
+        }
+
+        for doc in tqdm(cursor, desc='Getting data', disable=not verbose):
+            for k in retfields:
+                # For figuring out if document has the data
+
+                # Handle keys like "property-name.property-field"
+                missing = False
+                v = doc
+                for kk in k.split('.'):
+                    if kk in v:
+                        v = v[kk]
+                    else:
+                        # Missing something
+                        missing = True
+
+                if not missing:
+                    if isinstance(v, dict):
+                        if unpack_properties and ('source-value' in v):
+                            v = v['source-value']
+
+                    data[k].append(_decode_arrays(v))
+
+        for k,v in data.items():
+            # data[k] = np.array(data[k])
+
+            if concatenate or ravel:
+                try:
+                    data[k] = np.concatenate(v)
+                except:
+                    data[k] = np.array(v)
+
+            if vstack:
+                data[k] = np.vstack(v)
+
+        if ravel:
+            for k,v in data.items():
+                data[k] = v.ravel()
+
+        if len(retfields) == 1:
+            return data[list(retfields.keys())[0]]
+        else:
+            return data
+
+
+    def convert_array_encoding(self, binary=True, flush_size=10000, verbose=False):
+        """
+        Converts the arrays of the existing configurations (positions, cell,
+        lattice_vectors) and properties (all array-valued fields) to the binary
+        format (see :code:`binary_arrays` in the constructor), or back to nested
+        lists. Arrays that are already in the requested format, scalars, and
+        non-numeric arrays are left unchanged. Note that this doesn't change
+        :attr:`binary_arrays`.
+
+        Args:
+
+            binary (bool, default=True):
+                If True, converts to the binary format. If False, converts to
+                nested lists.
+
+            flush_size (int, default=10000):
+                The number of updates that are sent to the database at a time.
+
+            verbose (bool, default=False):
+                If True, prints progress bars
+
+        Returns:
+
+            nconfigurations (int):
+                The number of updated configurations
+
+            nproperties (int):
+                The number of updated properties
+        """
+
+        writer = _BulkWriter(
+            {
+                _CONFIGS_COLLECTION: self.configurations,
+                _PROPS_COLLECTION: self.properties,
+            },
+            flush_size=flush_size,
+        )
+
+        nconfigurations = 0
+        for doc in tqdm(
+            self.configurations.find(
+                {}, {'positions': 1, 'cell': 1, 'lattice_vectors': 1}
+            ),
+            desc='Converting configurations',
+            disable=not verbose
+            ):
+
+            update = {}
+            for k in ['positions', 'cell', 'lattice_vectors']:
+                if k in doc:
+                    v = _convert_array(doc[k], binary)
+
+                    if v is not None:
+                        update[k] = v
+
+            if update:
+                writer.add(
+                    _CONFIGS_COLLECTION,
+                    UpdateOne({'_id': doc['_id']}, {'$set': update})
+                )
+
+                nconfigurations += 1
+
+        nproperties = 0
+        for doc in tqdm(
+            self.properties.find({}),
+            desc='Converting properties',
+            disable=not verbose
+            ):
+
+            ptype = doc['type']
+
+            update = {}
+            for k, field in doc[ptype].items():
+                if not isinstance(field, dict) or ('source-value' not in field):
+                    continue
+
+                v = _convert_array(field['source-value'], binary)
+
+                if v is not None:
+                    update['{}.{}.source-value'.format(ptype, k)] = v
+
+            if update:
+                writer.add(
+                    _PROPS_COLLECTION,
+                    UpdateOne({'_id': doc['_id']}, {'$set': update})
+                )
+
+                nproperties += 1
+
+        writer.flush()
+
+        return nconfigurations, nproperties
+
+
+    def get_configuration(self, i, property_ids=None, attach_properties=False):
+        """
+        Returns a single configuration by calling :meth:`get_configurations`
+        """
+        return self.get_configurations(
+            [i], property_ids=property_ids, attach_properties=attach_properties
+        )[0]
+
+
+    def get_configurations(
+        self, configuration_ids,
+        property_ids=None,
+        attach_properties=False,
+        attach_settings=False,
+        generator=False,
+        property_fields=None,
+        join='lookup',
+        parallel=None,
+        ordered=True,
+        views=False,
+        verbose=False
+        ):
+        """
+        A generator that returns in-memory Configuration objects one at a time
+        by loading the atomic numbers, positions, cells, and PBCs.
+
+        Args:
+
+            configuration_ids (list or 'all'):
+                A list of string IDs specifying which Configurations to return.
+                If 'all', returns all of the configurations in the database.
+                Long lists of IDs are queried in concurrent batches, and the
+                configurations are returned sorted by ID.
+
+            property_ids (list, default=None):
+                A list of Property IDs. Used for limiting searches when
+                :code:`attach_properties==True`.  If None,
+                :code:`attach_properties` will attach all linked Properties.
+                Note that this only attaches one property per Configuration, so
+                if multiple properties point to the same Configuration, that
+                Configuration will be returned multiple times.
+
+            attach_properties (bool, default=False):
+                If True, attaches all the data of any linked properties from
+                :code:`property_ids`. The property data will either be added to
+                the :code:`arrays` dictionary on a Configuration (if it can be
+                converted to a matrix where the first dimension is the same
+                as the number of atoms in the Configuration) or the :code:`info`
+                dictionary (if it wasn't added to :code:`arrays`). Property
+                fields in a list to accomodate the possibility of multiple
+                properties of the same type pointing to the same configuration.
+                WARNING: don't use this option if multiple properties of the
+                same type point to the same Configuration, but the properties
+                don't have values for all of their fields.
+
+            attach_settings (bool, default=False):
+                If True, attaches all of the fields of the property settings
+                that are linked to the attached property instances. If
+                :code:`attach_settings=True`, must also have
+                :code:`attach_properties=True`.
+
+            generator (bool, default=False):
+                If True, this function returns a generator of the
+                configurations. This is useful if the configurations can't all
+                fit in memory at the same time.
+
+            property_fields (list or str, default=None):
+                The properties (e.g., 'energy-forces') or property fields (e.g.,
+                'energy-forces.energy') to attach when
+                :code:`attach_properties=True`. Only these fields are sent by
+                the server, and properties of other types aren't attached. If
+                None, attaches all of the fields of all of the linked
+                properties.
+
+            join (str, default='lookup'):
+                How properties and settings are joined to the configurations
+                when :code:`attach_properties=True`. If 'lookup', the server
+                joins them using :code:`$lookup` (when
+                :code:`property_fields` is provided, this uses the pipeline
+                form of :code:`$lookup` on indexed fields, which requires
+                MongoDB 5.0 or newer). If 'client', the configurations are
+                loaded in batches, and the properties and settings of each
+                batch are then loaded using separate indexed queries, which can
+                be faster on servers where :code:`$lookup` is slow.
+
+            parallel (str, default=None):
+                If 'processes' or 'threads', the configurations are split into
+                ranges of IDs that are fetched and decoded in parallel by
+                :attr:`nprocs` worker processes (the same pool as
+                :meth:`insert_data`) or threads. Processes are faster when
+                decoding dominates, and threads when most of the time is spent
+                waiting for the server. If None, uses a single cursor.
+
+            ordered (bool, default=True):
+                If True, parallel results are returned sorted by ID. If False,
+                the configurations of each range of IDs are returned as soon as
+                they are ready. Ignored if :code:`parallel` is None.
+
+            views (bool, default=False):
+                If True, returns lightweight, read-only
+                :class:`~colabfit.tools.configuration.ConfigurationView`
+                objects that wrap the decoded arrays, instead of building full
+                Configurations. Use :meth:`ConfigurationView.to_configuration`
+                to build a Configuration when needed.
+
+            verbose (bool):
+                If True, prints progress bar
+
+        Returns:
+
+            configurations (iterable):
+                A list or generator of the re-constructed configurations
+        """
+
+        if join not in ['lookup', 'client']:
+            raise RuntimeError(
+                "Unsupported join method '{}'. Must be 'lookup' or "
+                "'client'".format(join)
+            )
+
+        if parallel not in [None, 'processes', 'threads']:
+            raise RuntimeError(
+                "Unsupported parallel mode '{}'. Must be 'processes', "
+                "'threads', or None".format(parallel)
+            )
+
+        if isinstance(property_fields, str):
+            property_fields = [property_fields]
+
+        if configuration_ids == 'all':
+            ids = None
+        elif isinstance(configuration_ids, str):
+            ids = [configuration_ids]
+        else:
+            ids = configuration_ids
+
+        configurations = self._get_configurations(
+            ids=ids,
+            property_ids=property_ids,
+            attach_properties=attach_properties,
+            attach_settings=attach_settings,
+            property_fields=property_fields,
+            join=join,
+            parallel=parallel,
+            ordered=ordered,
+            views=views,
+            verbose=verbose
+        )
+
+        if generator:
+            return configurations
+        else:
+            return list(configurations)
+
+
+    def _get_configurations(
+        self,
+        ids,
+        property_ids,
+        attach_properties,
+        attach_settings,
+        property_fields=None,
+        join='lookup',
+        parallel=None,
+        ordered=True,
+        views=False,
+        verbose=False
+        ):
+        kwargs = {
+            'property_ids': property_ids,
+            'attach_properties': attach_properties,
+            'attach_settings': attach_settings,
+            'property_fields': property_fields,
+            'join': join,
+            'views': views,
+        }
+
+        if parallel is None:
+            configurations = _fetch_configurations(
+                self[self.database_name], ids, {}, **kwargs
+            )
+        else:
+            configurations = self._fetch_configurations_parallel(
+                ids, parallel, ordered, kwargs
+            )
+
+        yield from tqdm(
+            configurations,
+            desc='Getting configurations',
+            disable=not verbose
+        )
+
+
+    def _fetch_configurations_parallel(self, ids, parallel, ordered, kwargs):
+        """
+        Splits the configurations into partitions of at most
+        :data:`_PARTITION_SIZE` IDs, which are fetched and decoded by a pool of
+        :attr:`nprocs` workers, with at most :code:`2*nprocs` partitions in
+        flight at a time. Yields the configurations in order of ID if
+        :code:`ordered` is True, or as soon as each partition is done
+        otherwise.
+        """
+
+        if ids is None:
+            # The ranges are generated while the first ones are being fetched
+            partitions = (
+                (None, q) for q in _iter_id_ranges(
+                    self.configurations, {}, _PARTITION_SIZE
+                )
+            )
+        else:
+            ids = sorted(set(ids))
+            partitions = (
+                (ids[i:i+_PARTITION_SIZE], {})
+                for i in range(0, len(ids), _PARTITION_SIZE)
+            )
+
+        if parallel == 'processes':
+            pool = self._get_insert_pool()
+
+            def submit(partition):
+                future = Future()
+
+                pool.apply_async(
+                    _fetch_configurations_worker,
+                    (self.database_name,) + partition + (kwargs,),
+                    callback=future.set_result,
+                    error_callback=future.set_exception,
+                )
+
+                return future
+
+            yield from _stream_tasks(
+                submit, partitions, 2*self.nprocs, ordered
+            )
+        else:
+            database = self[self.database_name]
+
+            with ThreadPoolExecutor(self.nprocs) as executor:
+                def submit(partition):
+                    return executor.submit(
+                        lambda ids, query: sorted(
+                            _fetch_configurations(
+                                database, ids, query, **kwargs
+                            ),
+                            key=lambda c: c.info['_id']
+                        ),
+                        *partition
+                    )
+
+                yield from _stream_tasks(
+                    submit, partitions, 2*self.nprocs, ordered
+                )
+
+
+    def concatenate_configurations(self):
+        """
+        Concatenates the atomic_numbers, positions, cells, and pbcs groups in
+        /configurations.
+        """
+        self.database.concatenate_configurations()
+
+
+    def insert_configuration_set(self, ids, description='', verbose=False):
+        """
+        Inserts the configuration set of IDs to the database.
+
+        Args:
+
+            ids (list or str):
+                The IDs of the configurations to include in the configuartion
+                set.
+
+            description (str, optional):
+                A human-readable description of the configuration set.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+        """
+
+        if isinstance(ids, str):
+            ids = [ids]
+
+        ids = list(set(ids))
+
+        cs_hash = sha512()
+        cs_hash.update(description.encode('utf-8'))
+        for i in sorted(ids):
+            cs_hash.update(str(i).encode('utf-8'))
+
+        cs_hash = int(cs_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
+        cs_id = ID_FORMAT_STRING.format('CS', cs_hash, 0)
+
+        # Check for duplicates
+        if self.configuration_sets.count_documents({'_id': cs_id}):
+            return cs_id
+
+        # Make sure all of the configurations exist
+        nexisting = sum(_in_batches(
+            lambda batch: self.configurations.count_documents(
+                {'_id': {'$in': batch}}
+            ),
+            ids
+        ))
+
+        if nexisting != len(ids):
+            raise MissingEntryError(
+                "Not all of the IDs provided to insert_configuration_set exist"\
+                " in the database."
+            )
+
+        summary = self.summarize_configurations(ids)
+
+        cs_update = {
+            '$setOnInsert': {
+                '_id': cs_id,
+                'description': description,
+            },
+            '$set': {
+                'aggregated_info': _configuration_info(summary),
+                'aggregated_summary': summary,
+                'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+            },
+        }
+
+        if self.link_collections:
+            cs_update['$setOnInsert']['relationships.datasets'] = []
+
+            _insert_links(
+                self.configuration_set_links,
+                'configuration_set', cs_id, 'configuration', ids
+            )
+        else:
+            cs_update['$addToSet'] = {
+                'relationships.configurations': {'$each': ids}
+            }
+
+        self.configuration_sets.update_one({'_id': cs_id}, cs_update, upsert=True)
+
+        # Add the backwards relationships CO->CS
+        _update_in_batches(
+            self.configurations, ids,
+            {'$addToSet': {'relationships.configuration_sets': cs_id}},
+            desc='Updating CO->CS relationships',
+            verbose=verbose
+        )
+
+        return cs_id
+
+
+    def get_configuration_set(self, cs_id, resync=False):
+        """
+        Returns the configuration set with the given ID.
+
+        Args:
+
+            cs_ids (str):
+                The ID of the configuration set to return
+
+            resync (bool):
+                If True, re-aggregates the configuration set information before
+                returning. Default is False.
+
+        Returns:
+
+            A dictionary with two keys:
+                'last_modified': a datetime string
+                'configuration_set': the configuration set object. If the
+                configuration set uses the link collections, its
+                :attr:`configuration_ids` are lazy :class:`LinkedIDs`.
+        """
+
+
+        if resync:
+            self.resync_configuration_set(cs_id)
+
+        cs_doc = self.configuration_sets.find_one({'_id': cs_id})
+
+        return {
+            'last_modified': cs_doc['last_modified'],
+            'configuration_set': ConfigurationSet(
+                configuration_ids=self._configuration_set_ids(cs_doc),
+                description=cs_doc['description'],
+                aggregated_info=cs_doc['aggregated_info']
+            )
+        }
+
+
+    def resync_configuration_set(self, cs_id, verbose=False):
+        """
+        Re-synchronizes the configuration set by re-aggregating the information
+        from the configurations. The aggregated information is otherwise kept
+        up to date incrementally (see :meth:`apply_labels`), so this is only
+        needed to repair configuration sets, or to add summaries to
+        configuration sets inserted by older versions.
+
+        Args:
+
+            cs_id (str):
+                The ID of the configuration set to update
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            None; updates the configuration set document in-place
+
+        """
+
+        cs_doc = self.configuration_sets.find_one({'_id': cs_id})
+
+        if 'configurations' in cs_doc['relationships']:
+            summary = self.summarize_configurations(
+                cs_doc['relationships']['configurations']
+            )
+        else:
+            summary = _summarize_configurations(
+                self.configurations, {'relationships.configuration_sets': cs_id}
+            )[None]
+
+        self.configuration_sets.update_one(
+            {'_id': cs_id},
+            {'$set': {
+                'aggregated_info': _configuration_info(summary),
+                'aggregated_summary': summary,
+            }},
+            upsert=True,
+        )
+
+
+    def resync_dataset(self, ds_id, verbose=False):
+        """
+        Re-synchronizes the dataset by aggregating all necessary data from
+        properties and configuration sets. Note that this also re-synchronizes
+        all of the configuration sets of the dataset. Each configuration is
+        only read once, even if it belongs to multiple configuration sets (see
+        :meth:`resync_configuration_sets`).
+
+        Args:
+
+            ds_id (str):
+                The ID of the dataset to update
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            None; updates the dataset document in-place
+        """
+
+        ds_doc = self.datasets.find_one({'_id': ds_id})
+
+        cs_ids = ds_doc['relationships']['configuration_sets']
+
+        if 'properties' in ds_doc['relationships']:
+            pr_summary = self.summarize_properties(
+                ds_doc['relationships']['properties']
+            )
+        else:
+            pr_summary = self._summarize_properties(
+                {'relationships.datasets': ds_id}
+            )
+
+        summary = {
+            'configurations': self.resync_configuration_sets(cs_ids),
+            'properties': pr_summary,
+        }
+
+        self.datasets.update_one(
+            {'_id': ds_id},
+            {'$set': {
+                'aggregated_info': _dataset_info(summary),
+                'aggregated_summary': summary,
+            }},
+            upsert=True
+        )
+
+
+    def aggregate_configuration_info(self, ids, verbose=False):
+        """
+        Gathers the following information from a collection of configurations:
+
+        * :code:`nconfigurations`: the total number of configurations
+        * :code:`nsites`: the total number of sites
+        * :code:`nelements`: the total number of unique element types
+        * :code:`elements`: the element types
+        * :code:`individual_elements_ratios`: a set of elements ratios generated
+          by looping over each configuration, extracting its concentration of
+          each element, and adding the tuple of concentrations to the set
+        * :code:`total_elements_ratios`: the ratio of the total count of atoms
+            of each element type over :code:`nsites`
+        * :code:`labels`: the union of all configuration labels
+        * :code:`labels_counts`: the total count of each label
+        * :code:`chemical_formula_reduced`: the set of all reduced chemical
+            formulae
+        * :code:`chemical_formula_anonymous`: the set of all anonymous chemical
+            formulae
+        * :code:`chemical_formula_hill`: the set of all hill chemical formulae
+        * :code:`nperiodic_dimensions`: the set of all numbers of periodic
+            dimensions
+        * :code:`dimension_types`: the set of all periodic boundary choices
+
+        Returns:
+
+            aggregated_info (dict):
+                All of the aggregated info
+
+            verbose (bool, default=False):
+                Unused; the aggregation is done by the Mongo server.
+        """
+
+        aggregated_info = _configuration_info(
+            self.summarize_configurations(ids)
+        )
+
+        aggregated_info['nconfigurations'] = len(ids)
+
+        return aggregated_info
+
+
+    def summarize_configurations(self, ids):
+        """
+        Computes a mergeable summary of a collection of configurations, from
+        which the output of :meth:`aggregate_configuration_info` can be
+        derived. Summaries of disjoint collections can be combined using
+        :func:`merge_summaries` without re-reading the configurations.
+
+        The summary is a dictionary with the total :code:`nconfigurations` and
+        :code:`nsites`, and with counters for :code:`elements` (the total
+        number of atoms of each element), :code:`individual_elements_ratios`
+        (the number of configurations with each ([element, rounded ratio])),
+        :code:`chemical_systems`, :code:`labels`,
+        :code:`chemical_formula_reduced`, :code:`chemical_formula_anonymous`,
+        :code:`chemical_formula_hill`, :code:`nperiodic_dimensions`, and
+        :code:`dimension_types`. Counters are stored as lists of
+        [value, count] pairs, ordered by first appearance, so that they can be
+        stored in Mongo documents regardless of the values.
+
+        The aggregation is done by the Mongo server, and positions are never
+        sent.
+
+        Args:
+
+            ids (list or str):
+                The IDs of the configurations
+
+        Returns:
+
+            summary (dict):
+                The mergeable summary
+        """
+
+        if isinstance(ids, str):
+            ids = [ids]
+
+        # The batches are sorted by ID, so merging them keeps the order of
+        # first appearance
+        summaries = list(_in_batches(
+            lambda batch: _summarize_configurations(
+                self.configurations, {'_id': {'$in': batch}}
+            )[None],
+            ids
+        ))
+
+        if not summaries:
+            return _summarize_configurations(
+                self.configurations, {'_id': {'$in': []}}
+            )[None]
+
+        return merge_summaries(summaries)
+
+
+    def aggregate_property_info(self, pr_ids, verbose=False):
+        """
+        Aggregates the following information from a list of properties:
+
+            * types
+            * labels
+            * labels_counts
+
+        Args:
+
+            pr_ids (list or str):
+                The IDs of the configurations to aggregate information from
+
+            verbose (bool, default=False):
+                Unused; the aggregation is done by the Mongo server.
+
+        Returns:
+
+            aggregated_info (dict):
+                All of the aggregated info
+        """
+
+        return _property_info(self.summarize_properties(pr_ids))
+
+
+    def summarize_properties(self, pr_ids):
+        """
+        Computes a mergeable summary of a collection of properties, from which
+        the output of :meth:`aggregate_property_info` can be derived.
+
+        The summary is a dictionary of counters for :code:`types`,
+        :code:`fields`, :code:`methods`, and :code:`labels`, stored as lists of
+        [value, count] pairs ordered by first appearance.
+
+        Args:
+
+            pr_ids (list or str):
+                The IDs of the properties
+
+        Returns:
+
+            summary (dict):
+                The mergeable summary
+        """
+
+        if isinstance(pr_ids, str):
+            pr_ids = [pr_ids]
+
+        summaries = list(_in_batches(
+            lambda batch: self._summarize_properties({'_id': {'$in': batch}}),
+            pr_ids
+        ))
+
+        if not summaries:
+            return self._summarize_properties({'_id': {'$in': []}})
+
+        return merge_summaries(summaries)
+
+
+    def _summarize_properties(self, query):
+        """Computes the summary of the properties matching :code:`query` (see
+        :meth:`summarize_properties`)"""
+
+        ignore_keys = [
+            'property-id', 'property-title', 'property-description', '_id',
+        ]
+
+        # The names of the fields of each property are extracted by the server
+        # so that no property values are sent. Values are returned in the
+        # order in which they first appear when sorted by ID.
+        pipeline = [
+            {'$match': query},
+            {'$sort': {'_id': 1}},
+            {'$project': {
+                'type': 1,
+                'labels': 1,
+                'methods': 1,
+                'fields': {'$map': {
+                    'input': {'$objectToArray': {'$let': {
+                        'vars': {'kv': {'$arrayElemAt': [
+                            {'$filter': {
+                                'input': {'$objectToArray': '$$ROOT'},
+                                'as': 'kv',
+                                'cond': {'$eq': ['$$kv.k', '$type']},
+                            }},
+                            0
+                        ]}},
+                        'in': '$$kv.v',
+                    }}},
+                    'as': 'field',
+                    'in': '$$field.k',
+                }},
+            }},
+            {'$facet': {
+                'types': _first_appearance_counts('type', unwind=False),
+                'fields': [
+                    {'$unwind': {'path': '$fields', 'includeArrayIndex': 'idx'}},
+                    {'$match': {'fields': {'$nin': ignore_keys}}},
+                    {'$project': {
+                        'idx': 1,
+                        'fields': {'$concat': ['$type', '.', '$fields']},
+                    }},
+                ] + _first_appearance_counts('fields', unwind=False),
+                'methods': _first_appearance_counts('methods'),
+                'labels': _first_appearance_counts('labels'),
+            }},
+        ]
+
+        result = next(self.properties.aggregate(pipeline, allowDiskUse=True))
+
+        return {
+            k: [[doc['_id'], doc['count']] for doc in result[k]]
+            for k in ['types', 'fields', 'methods', 'labels']
+        }
+
+
+    def aggregate_configuration_set_info(self, cs_ids, resync=False, verbose=False):
+        """
+        Aggregates the following information from a list of configuration sets:
+
+            * nconfigurations
+            * nsites
+            * chemical_systems
+            * nelements
+            * elements
+            * individual_elements_ratios
+            * total_elements_ratios
+            * labels
+            * labels_counts
+            * chemical_formula_reduced
+            * chemical_formula_anonymous
+            * chemical_formula_hill
+            * nperiodic_dimensions
+            * dimension_types
+
+        Args:
+
+            cs_ids (list or str):
+                The IDs of the configurations to aggregate information from
+
+            resync (bool, default=False):
+                If True, re-synchronizes each configuration set before
+                aggregating the information.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            aggregated_info (dict):
+                All of the aggregated info
+        """
+
+        if isinstance(cs_ids, str):
+            cs_ids = [cs_ids]
+
+        if resync:
+            return _configuration_info(self.resync_configuration_sets(cs_ids))
+
+        return _configuration_info(self.summarize_configuration_sets(cs_ids))
+
+
+    def resync_configuration_sets(self, cs_ids):
+        """
+        Re-synchronizes multiple configuration sets at once, like
+        :meth:`resync_configuration_set`, but reading each configuration only
+        once. The summaries of all of the configuration sets and of their union
+        are built during the same pass. Membership is taken from the
+        configurations' links to their configuration sets.
+
+        If :attr:`nprocs` > 1, the configurations are split into
+        :attr:`nprocs` ranges of IDs which are aggregated in parallel, then
+        merged.
+
+        Args:
+
+            cs_ids (list or str):
+                The IDs of the configuration sets to update
+
+        Returns:
+
+            summary (dict):
+                The summary of the union of the configuration sets (see
+                :meth:`summarize_configurations`)
+        """
+
+        if isinstance(cs_ids, str):
+            cs_ids = [cs_ids]
+
+        cs_ids = list(set(cs_ids))
+
+        query = {'relationships.configuration_sets': {'$in': cs_ids}}
+
+        if self.nprocs > 1:
+            partials = self._get_insert_pool().starmap(
+                _summarize_configurations_worker,
+                [
+                    (self.database_name, q, cs_ids) for q in _id_ranges(
+                        self.configurations, query, self.nprocs
+                    )
+                ]
+            )
+
+            # The ranges are in order of ID, so the merged counters keep the
+            # order of first appearance
+            summaries = {
+                p: merge_summaries([partial[p] for partial in partials])
+                for p in [None] + cs_ids
+            }
+        else:
+            summaries = _summarize_configurations(
+                self.configurations, query, cs_ids
+            )
+
+        if not cs_ids:
+            return summaries[None]
+
+        self.configuration_sets.bulk_write([
+            UpdateOne(
+                {'_id': csid},
+                {'$set': {
+                    'aggregated_info': _configuration_info(summaries[csid]),
+                    'aggregated_summary': summaries[csid],
+                }}
+            )
+            for csid in cs_ids
+        ])
+
+        return summaries[None]
+
+
+    def summarize_configuration_sets(self, cs_ids):
+        """
+        Merges the summaries stored on the configuration sets (see
+        :meth:`summarize_configurations`) without re-reading all of their
+        configurations. Configurations that are shared by multiple
+        configuration sets are only counted once. Configuration sets that
+        don't have a stored summary yet are re-synchronized first.
+
+        Args:
+
+            cs_ids (list or str):
+                The IDs of the configuration sets
+
+        Returns:
+
+            summary (dict):
+                The mergeable summary of the union of the configuration sets
+        """
+
+        if isinstance(cs_ids, str):
+            cs_ids = [cs_ids]
+
+        cs_ids = list(set(cs_ids))
+
+        summaries = {
+            cs_doc['_id']: cs_doc.get('aggregated_summary')
+            for cs_doc in self.configuration_sets.find(
+                {'_id': {'$in': cs_ids}}, {'aggregated_summary': 1}
+            )
+        }
+
+        missing = [csid for csid, summary in summaries.items() if summary is None]
+
+        if missing:
+            self.resync_configuration_sets(missing)
+
+            for cs_doc in self.configuration_sets.find(
+                {'_id': {'$in': missing}}, {'aggregated_summary': 1}
+                ):
+                summaries[cs_doc['_id']] = cs_doc['aggregated_summary']
+
+        summaries = [summaries[csid] for csid in sorted(summaries)]
+        weights = [1]*len(summaries)
+
+        if len(cs_ids) > 1:
+            # A configuration contained by n of the configuration sets is
+            # counted n times, so the summary of those configurations is
+            # subtracted n-1 times. The correction is computed on the server,
+            # in a single pass, weighting each configuration by n-1.
+            summaries.append(_summarize_configurations(
+                self.configurations,
+                {'relationships.configuration_sets': {'$in': cs_ids}},
+                weight={'$subtract': [
+                    {'$size': {'$filter': {
+                        'input': '$relationships.configuration_sets',
+                        'as': 'csid',
+                        'cond': {'$in': ['$$csid', cs_ids]},
+                    }}},
+                    1
+                ]},
+            )[None])
+            weights.append(-1)
+
+        if not summaries:
+            return self.summarize_configurations([])
+
+        return merge_summaries(summaries, weights)
+
+
+    def insert_dataset(
+        self, cs_ids, pr_ids, name,
+        authors=None,
+        links=None,
+        description='',
+        resync=False,
+        verbose=False,
+        ):
+        """
+        Inserts a dataset into the database.
+
+        Args:
+
+            cs_ids (list or str):
+                The IDs of the configuration sets to link to the dataset.
+
+            pr_ids (list or str):
+                The IDs of the properties to link to the dataset
+
+            name (str):
+                The name of the dataset
+
+            authors (list or str or None):
+                The names of the authors of the dataset. If None, then no
+                authors are added.
+
+            links (list or str or None):
+                External links (e.g., journal articles, Git repositories, ...)
+                to be associated with the dataset. If None, then no links are
+                added.
+
+            description (str or None):
+                A human-readable description of the dataset. If None, then not
+                description is added.
+
+            resync (bool):
+                If True, re-synchronizes the configuration sets and properties
+                before adding to the dataset. Default is False.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            ds_id (str):
+                The ID of the inserted dataset
+        """
+
+        if isinstance(cs_ids, str):
+            cs_ids = [cs_ids]
+
+        if isinstance(pr_ids, str):
+            pr_ids = [pr_ids]
+
+        # Remove possible duplicates
+        cs_ids = list(set(cs_ids))
+        pr_ids = list(set(pr_ids))
+
+        # Make sure to only include PRs with COs contained by the given CSs.
+        # Membership is checked using the links from the COs to their CSs, so
+        # that the CS members never have to be loaded.
+        pr_docs = list(_find_in(
+            self.properties, pr_ids,
+            projection={'relationships.configurations': 1}
+        ))
+
+        contained_co_ids = set(_['_id'] for _ in _find_in(
+            self.configurations,
+            list(set(itertools.chain.from_iterable(
+                pr_doc['relationships']['configurations'] for pr_doc in pr_docs
+            ))),
+            query={'relationships.configuration_sets': {'$in': cs_ids}},
+            projection={'_id': 1}
+        ))
+
+        clean_pr_ids = [
+            pr_doc['_id'] for pr_doc in pr_docs
+            if contained_co_ids.intersection(
+                pr_doc['relationships']['configurations']
+            )
+        ]
+
+        if len(pr_ids) != len(clean_pr_ids):
+            warnings.warn(
+                "{} PR IDs passed to insert_dataset, but only {} point to COs "\
+                "contained by the given CSs".format(
+                    len(pr_ids), len(clean_pr_ids)
+                )
+            )
+
+        if isinstance(authors, str):
+            authors = [authors]
+
+        if isinstance(links, str):
+            links = [links]
+
+        ds_hash = sha512()
+        for ci in sorted(cs_ids):
+            ds_hash.update(str(ci).encode('utf-8'))
+        for pi in sorted(clean_pr_ids):
+            ds_hash.update(str(pi).encode('utf-8'))
+
+        ds_hash = int(ds_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
+        ds_id = ID_FORMAT_STRING.format('DS', ds_hash, 0)
+
+        # Check for duplicates
+        if self.datasets.count_documents({'_id': ds_id}):
+            if resync:
+                self.resync_dataset(ds_id)
+
+            return ds_id
+
+        summary = {
+            'configurations': self.summarize_configuration_sets(cs_ids),
+            'properties': self.summarize_properties(clean_pr_ids),
+        }
+
+        ds_update = {
+            '$addToSet': {
+                'relationships.configuration_sets': {'$each': cs_ids},
+            },
+            '$setOnInsert': {
+                '_id': ds_id,
+                'name': name,
+                'authors': authors,
+                'links': links,
+                'description': description,
+            },
+            '$set': {
+                'aggregated_info': _dataset_info(summary),
+                'aggregated_summary': summary,
+                'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
+            },
+        }
+
+        if self.link_collections:
+            _insert_links(
+                self.dataset_links, 'dataset', ds_id, 'property', clean_pr_ids
+            )
+        else:
+            ds_update['$addToSet']['relationships.properties'] = {
+                '$each': clean_pr_ids
+            }
+
+        self.datasets.update_one({'_id': ds_id}, ds_update, upsert=True)
+
+        # Add the backwards relationships CS->DS
+        _update_in_batches(
+            self.configuration_sets, cs_ids,
+            {'$addToSet': {'relationships.datasets': ds_id}},
+            desc='Updating CS->DS relationships',
+            verbose=verbose
+        )
+
+        # Add the backwards relationships PR->DS
+        _update_in_batches(
+            self.properties, clean_pr_ids,
+            {'$addToSet': {'relationships.datasets': ds_id}},
+            desc='Updating PR->DS relationships',
+            verbose=verbose
+        )
+
+        return ds_id
+
+
+    def get_dataset(self, ds_id, resync=False, verbose=False):
+        """
+        Returns the dataset with the given ID.
+
+        Args:
+
+            ds_ids (str):
+                The ID of the dataset to return
+
+            resync (bool):
+                If True, re-aggregates the configuration set and property
+                information before returning. Default is False.
+
+            verbose (bool, default=True):
+                If True, prints a progress bar. Only used if
+                :code:`resync=False`.
+
+        Returns:
+
+            A dictionary with two keys:
+                'last_modified': a datetime string
+                'dataset': the dataset object. If the dataset uses the link
+                collections, its :attr:`property_ids` are lazy
+                :class:`LinkedIDs`.
+        """
+
+
+        if resync:
+            self.resync_dataset(ds_id, verbose=verbose)
+
+        ds_doc = self.datasets.find_one({'_id': ds_id})
+
+        return {
+            '_id': ds_id,
+            'last_modified': ds_doc['last_modified'],
+            'dataset': Dataset(
+                configuration_set_ids=ds_doc['relationships']['configuration_sets'],
+                property_ids=self._dataset_property_ids(ds_doc),
+                name=ds_doc['name'],
+                authors=ds_doc['authors'],
+                links=ds_doc['links'],
+                description=ds_doc['description'],
+                aggregated_info=ds_doc['aggregated_info']
+            )
+        }
+
+
+
+    def _configuration_set_ids(self, cs_doc):
+        """Returns the IDs of the configurations of a configuration set, from
+        either of the two layouts"""
+
+        if 'configurations' in cs_doc['relationships']:
+            return cs_doc['relationships']['configurations']
+
+        return LinkedIDs(
+            self.configuration_set_links,
+            'configuration_set', cs_doc['_id'], 'configuration'
+        )
+
+
+    def _dataset_property_ids(self, ds_doc):
+        """Returns the IDs of the properties of a dataset, from either of the
+        two layouts"""
+
+        if 'properties' in ds_doc['relationships']:
+            return ds_doc['relationships']['properties']
+
+        return LinkedIDs(self.dataset_links, 'dataset', ds_doc['_id'], 'property')
+
+
+    def aggregate_dataset_info(self, ds_ids):
+        """
+        Aggregates information from a list of datasets.
+
+        NOTE: this will face all of the same challenges as
+        aggregate_configuration_set_info()
+
+            * you need to find the overlap of COs and PRs.
+        """
+        pass
+
+
+    def apply_labels(
+        self, dataset_id, collection_name, query, labels, verbose=False
+        ):
+        """
+        Applies the given labels to all objects in the specified collection that
+        match the query and are linked to the given dataset. The aggregated
+        information of the affected configuration sets and datasets is updated
+        incrementally, without re-aggregating their configurations or
+        properties.
+
+        Args:
+
+            dataset_id (str):
+                The ID of the dataset. Used as a safety measure to only update
+                entries for the given dataset.
+
+            collection_name (str):
+                One of 'configurations' or 'properties'.
+
+            query (dict):
+                A Mongo-style query for filtering the collection. For
+                example: :code:`query = {'nsites': {'$lt': 100}}`.
+
+            labels (set or str):
+                A set of labels to apply to the matching entries.
+
+            verbose (bool):
+                Unused; the labels are applied by a single update on the
+                Mongo server.
+
+        Returns:
+
+            nmodified (int):
+                The number of entries that didn't already have all of the
+                labels
+        """
+
+        ds_doc = self.datasets.find_one({'_id': dataset_id})
+
+        # Entries are matched using their links back to the configuration sets
+        # and datasets, so the members never have to be loaded
+        if collection_name == 'configurations':
+            collection = self.configurations
+
+            cs_ids = ds_doc['relationships']['configuration_sets']
+
+            query = {'$and': [
+                query, {'relationships.configuration_sets': {'$in': cs_ids}}
+            ]}
+        elif collection_name == 'properties':
+            collection = self.properties
+
+            query = {'$and': [query, {'relationships.datasets': dataset_id}]}
+        else:
+            raise RuntimeError(
+                "collection_name must be 'configurations' or 'properties'"
+            )
+
+        if isinstance(labels, str):
+            labels = {labels}
+
+        # The stored summaries are updated by the number of entries that don't
+        # have each label yet, which has to be counted before the update
+        self._update_label_summaries(collection_name, query, labels)
+
+        # A single set-based update; the matching entries never have to be
+        # sent to the client
+        return collection.update_many(
+            query, {'$addToSet': {'labels': {'$each': list(labels)}}}
+        ).modified_count
+
+
+    def _update_label_summaries(self, collection_name, query, labels):
+        """
+        Updates the summaries and aggregated information of the configuration
+        sets and datasets affected by applying :code:`labels` to the entries of
+        :code:`collection_name` matching :code:`query`. Only the number of
+        newly-labeled entries is counted, grouped by the configuration sets (or
+        datasets) that they belong to. Configuration sets and datasets without
+        a stored summary are left to be re-synchronized.
+        """
+
+        if collection_name == 'configurations':
+            collection = self.configurations
+            parents = 'relationships.configuration_sets'
+        else:
+            collection = self.properties
+            parents = 'relationships.datasets'
+
+        new_counts = collection.aggregate([
+            {'$match': query},
+            {'$project': {
+                'parents': {'$ifNull': ['$'+parents, []]},
+                'new_labels': {'$filter': {
+                    'input': {'$literal': list(labels)},
+                    'as': 'label',
+                    'cond': {'$eq': [
+                        {'$in': ['$$label', {'$ifNull': ['$labels', []]}]},
+                        False
+                    ]},
+                }},
+            }},
+            {'$unwind': '$new_labels'},
+            {'$group': {
+                '_id': {'parents': '$parents', 'label': '$new_labels'},
+                'count': {'$sum': 1},
+            }},
+        ])
+
+        # Entries are grouped by the set of parents that they belong to, so
+        # that an entry is only counted once for a dataset even if it is in
+        # multiple of the dataset's configuration sets
+        new_counts = [
+            (doc['_id']['parents'], doc['_id']['label'], doc['count'])
+            for doc in new_counts
+        ]
+
+        _apply_label_counts(self[self.database_name], collection_name, new_counts)
+
+
+    def get_histograms(
+        self,
+        fields,
+        query=None,
+        ids=None,
+        nbins=100,
+        batch_size=10000,
+        sample=None,
+        stratify=None,
+        verbose=False,
+        ):
+        """
+        Computes histograms of property fields with fixed, equal bins, without
+        loading all of the data into memory (see
+        :class:`~colabfit.tools.statistics.StreamingHistogram`).
+
+        Fields where every value is a scalar number are binned by the server,
+        using :code:`$min`/:code:`$max` to get the range and :code:`$bucket` to
+        get the counts. The other fields (e.g., forces, or arrays stored in
+        binary format) are streamed twice: once to get the ranges of all of
+        the fields, and once to accumulate all of their counts.
+
+        Args:
+
+            fields (list or str):
+                The property fields to compute the histograms of
+
+            query (dict, default=None):
+                A Mongo query dictionary. If None, uses all of the properties
+                in the database.
+
+            ids (list):
+                The list of property IDs to use. If None, uses the entire
+                collection.
+
+            nbins (int, default=100):
+                The number of bins per histogram
+
+            batch_size (int, default=10000):
+                The number of documents loaded at a time when streaming
+
+            sample (int, default=None):
+                If not None, the histograms are estimated from a random sample
+                of this many documents instead (see :meth:`get_statistics`).
+                The bins span the range of the sampled values, and the counts
+                are scaled up to estimate the counts of all of the documents.
+
+            stratify (str, default=None):
+                A configuration field used to stratify the sample (see
+                :meth:`get_statistics`)
+
+            verbose (bool, default=False):
+                If True, prints progress bars while streaming
+
+        Returns:
+
+            histograms (dict):
+                A dictionary of field: :code:`(counts, bin_edges)`, like the
+                output of :code:`np.histogram`. If only one field is provided,
+                the tuple is returned.
+        """
+
+        if isinstance(fields, str):
+            fields = [fields]
+
+        if query is None:
+            query = {}
+
+        if ids is not None:
+            if isinstance(ids, str):
+                ids = [ids]
+            elif isinstance(ids, np.ndarray):
+                ids = ids.tolist()
+
+        if sample is not None:
+            strata = _sample_strata(
+                self.properties, query, ids, sample, stratify
+            )
+
+            retdict = _sampled_histograms(
+                self.properties, fields, strata, nbins, batch_size, verbose
+            )
+
+            if len(fields) == 1:
+                return retdict[fields[0]]
+            else:
+                return retdict
+
+        ranges = _scalar_field_ranges(self.properties, fields, query, ids)
+
+        array_fields = [f for f in fields if f not in ranges]
+
+        if array_fields:
+            accumulators = _accumulate_statistics(
+                self.properties, array_fields, query, ids, batch_size, 0,
+                verbose
+            )
+
+            for f, acc in accumulators.items():
+                ranges[f] = (acc.min, acc.max) if acc.n else (None, None)
+
+        histograms = {
+            f: StreamingHistogram.from_range(*ranges[f], nbins) for f in fields
+        }
+
+        scalar_fields = [f for f in fields if f not in array_fields]
+
+        if scalar_fields:
+            _bucket_counts(
+                self.properties,
+                {f: histograms[f] for f in scalar_fields},
+                query, ids
+            )
+
+        if array_fields:
+            for chunk in _iter_columnar_data(
+                self.properties, array_fields, query, ids=ids,
+                batch_size=batch_size, flatten=True, verbose=verbose
+                ):
+                for f in array_fields:
+                    histograms[f].update(chunk[f].data)
+
+        retdict = {f: histograms[f].result() for f in fields}
+
+        if len(fields) == 1:
+            return retdict[fields[0]]
+        else:
+            return retdict
+
+
+    def plot_histograms(
+        self,
+        fields=None,
+        query=None,
+        ids=None,
+        verbose=False,
+        nbins=100,
+        xscale='linear',
+        yscale='linear',
+        method='matplotlib',
+        histograms=None,
+        sample=None,
+        stratify=None,
+        ):
+        """
+        Generates histograms of the given fields. The bin counts are computed
+        using :meth:`get_histograms`, unless they are provided using
+        :code:`histograms`.
+
+        Args:
+
+            fields (list or str):
+                The names of the fields to plot
+
+            query (dict, default=None):
+                A Mongo query dictionary. If None, returns the data for all of
+                the documents in the collection.
+
+            ids (list or str):
+                The IDs of the objects to plot the data for
+
+            verbose (bool, default=False):
+                If True, prints progress bar
+
+            nbins (int):
+                Number of bins per histogram
+
+            xscale (str):
+                Scaling for x-axes. One of ['linear', 'log'].
+
+            yscale (str):
+                Scaling for y-axes. One of ['linear', 'log'].
+
+            method (str, default='plotly')
+                Package to use for plotting. 'plotly' or 'matplotlib'.
+
+            histograms (dict, default=None):
+                Precomputed histograms, as returned by :meth:`get_histograms`
+                (a dictionary of field: :code:`(counts, bin_edges)`). If
+                provided, no data is loaded, and :code:`fields` defaults to
+                the keys of :code:`histograms`.
+
+            sample (int, default=None):
+                If not None, plots histograms estimated from a random sample of
+                this many documents (see :meth:`get_histograms`)
+
+            stratify (str, default=None):
+                A configuration field used to stratify the sample (see
+                :meth:`get_statistics`)
+
+        Returns:
+            Returns the figure object.
+        """
+        if fields is None:
+            if histograms is not None:
+                fields = list(histograms.keys())
+            else:
+                fields = self.property_fields
+        elif isinstance(fields, str):
+            fields = [fields]
+
+        if histograms is None:
+            histograms = self.get_histograms(
+                fields, query=query, ids=ids, nbins=nbins, sample=sample,
+                stratify=stratify, verbose=verbose
+            )
+
+            if len(fields) == 1:
+                histograms = {fields[0]: histograms}
+
+        nfields = len(fields)
+
+        nrows = max(1, int(np.ceil(nfields/3)))
+        if (nrows > 1) or (nfields%3 == 0):
+            ncols = 3
+        else:
+            ncols = nfields%3
+
+        if method == 'plotly':
+            fig = make_subplots(rows=nrows, cols=ncols, subplot_titles=fields)
+        elif method == 'matplotlib':
+            fig, axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(4*ncols, 2*nrows))
+            axes = np.atleast_2d(axes)
+        else:
+            raise RuntimeError('Unsupported plotting method')
+
+        for i, prop in enumerate(fields):
+            counts, bin_edges = histograms[prop]
+
+            c = i % 3
+            r = i // 3
+
+            if method == 'plotly':
+                fig.add_trace(
+                    go.Bar(
+                        x=(bin_edges[:-1] + bin_edges[1:])/2,
+                        y=counts,
+                        width=np.diff(bin_edges),
+                        name=prop
+                    ),
+                    row=r+1, col=c+1,
+                )
+            else:
+                # Each bin is drawn as a single value weighted by its count
+                _ = axes[r][c].hist(
+                    bin_edges[:-1], bins=bin_edges, weights=counts
+                )
+                axes[r][c].set_title(prop)
+                axes[r][c].set_xscale(xscale)
+                axes[r][c].set_yscale(yscale)
+
+        c += 1
+        while c < ncols:
+            if method == 'matplotlib':
+                axes[r][c].axis('off')
+            c += 1
+
+        if method == 'plotly':
+            fig.update_layout(
+                showlegend=True,
+            )
+            fig.update_xaxes(type=xscale)
+            fig.update_yaxes(type=yscale)
+            fig.for_each_annotation(lambda a: a.update(text=""))
+        else:
+            plt.tight_layout()
+
+        return fig
+
+
+    def get_statistics(
+        self,
+        fields,
+        query=None,
+        ids=None,
+        batch_size=10000,
+        quantiles=None,
+        quantile_sample_size=100000,
+        sample=None,
+        stratify=None,
+        verbose=False,
+        ):
+        """
+        Computes the statistics of the values of property fields in a single
+        pass over the matching documents, without loading all of the data into
+        memory (see :class:`~colabfit.tools.statistics.StreamingStatistics`).
+        All of the fields are accumulated during the same pass.
+
+        If :attr:`nprocs` > 1, the documents are split into :attr:`nprocs`
+        ranges of IDs which are processed in parallel, then merged.
+
+        Example:
+
+        .. code-block:: python
+
+            statistics = database.get_statistics(
+                ['property_name_1.energy', 'property_name_1.forces'],
+                query={'_id': {'$in': <list_of_property_IDs>}},
+                quantiles=[0.05, 0.5, 0.95],
+            )
+
+        Args:
+
+            fields (list or str):
+                The property fields to compute the statistics of. Sub-fields
+                can be specified by providing names separated by periods ('.')
+
+            query (dict, default=None):
+                A Mongo query dictionary. If None, uses all of the properties
+                in the database.
+
+            ids (list):
+                The list of property IDs to use. If None, uses the entire
+                collection. Note that this information can also be provided
+                using the :code:`query` argument.
+
+            batch_size (int, default=10000):
+                The number of documents loaded at a time.
+
+            quantiles (list, default=None):
+                A list of quantiles (between 0 and 1) to approximate. If None,
+                no quantiles are computed.
+
+            quantile_sample_size (int, default=100000):
+                The size of the uniform random sample of values used to
+                approximate the quantiles of each field. The quantiles are
+                exact if a field has fewer values than this.
+
+            sample (int, default=None):
+                If not None, the statistics are estimated from a random sample
+                of this many documents, drawn by the server using
+                :code:`$sample`, instead of reading every matching document.
+                The results then also include a 'sample' entry with the number
+                of sampled documents, the number of matching documents, and the
+                standard error of the average.
+
+            stratify (str, default=None):
+                The name of a configuration field (e.g.,
+                'chemical_formula_reduced') used to stratify the sample. Each
+                property is assigned the value of its first configuration, and
+                each value is sampled in proportion to its number of
+                properties, but with at least two properties per value, so
+                that every composition is represented. The estimates weight
+                each value by its number of properties. If None, the documents
+                are sampled uniformly. Ignored if :code:`sample` is None.
+
+            verbose (bool, default=False):
+                If True, prints a progress bar during data extraction
+
+        Returns:
+            results (dict)::
+                .. code-block:: python
+
+                    {
+                        f:  {
+                            'average': np.average(data),
+                            'std': np.std(data),
+                            'min': np.min(data),
+                            'max': np.max(data),
+                            'average_abs': np.average(np.abs(data)),
+                            'count': data.size,
+                            'quantiles': {
+                                q: np.quantile(data, q) for q in quantiles
+                            },  # only if quantiles is not None
+                            'sample': {
+                                'ndocuments': ...,
+                                'population': ...,
+                                'average_stderr': ...,
+                            },  # only if sample is not None
+                        } for f in fields
+                    }
+
+            If only one field is provided, the inner dictionary is returned.
+        """
+
+        if isinstance(fields, str):
+            fields = [fields]
+
+        if query is None:
+            query = {}
+
+        if ids is not None:
+            if isinstance(ids, str):
+                ids = [ids]
+            elif isinstance(ids, np.ndarray):
+                ids = ids.tolist()
+
+        sample_size = 0 if quantiles is None else quantile_sample_size
+
+        if sample is not None:
+            strata = _sample_strata(
+                self.properties, query, ids, sample, stratify
+            )
+
+            retdict = _sampled_statistics(
+                self.properties, fields, strata, batch_size, sample_size,
+                quantiles, verbose
+            )
+
+            if len(fields) == 1:
+                return retdict[fields[0]]
+            else:
+                return retdict
+
+        if self.nprocs > 1:
+            if ids is None:
+                partitions = [
+                    (q, None) for q in _id_ranges(
+                        self.properties, query, self.nprocs
+                    )
+                ]
+            else:
+                ids = sorted(set(ids))
+                step = -(-len(ids)//self.nprocs)
+                partitions = [
+                    (query, ids[i:i+step])
+                    for i in range(0, max(len(ids), 1), max(step, 1))
+                ]
+
+            partials = self._get_insert_pool().starmap(
+                _statistics_worker,
+                [
+                    (
+                        self.database_name, fields, q, part_ids, batch_size,
+                        sample_size
+                    )
+                    for q, part_ids in partitions
+                ]
+            )
+
+            accumulators = partials[0]
+            for partial in partials[1:]:
+                for f in fields:
+                    accumulators[f].merge(partial[f])
+        else:
+            accumulators = _accumulate_statistics(
+                self.properties, fields, query, ids, batch_size, sample_size,
+                verbose
+            )
+
+        retdict = {
+            f: accumulators[f].result(quantiles) for f in fields
+        }
+
+        if len(fields) == 1:
+            return retdict[fields[0]]
+        else:
+            return retdict
+
+
+    def count_distinct(
+        self,
+        collection_name,
+        field,
+        query=None,
+        ids=None,
+        precision=14,
+        batch_size=10000,
+        verbose=False,
+        ):
+        """
+        Approximates the number of distinct values of a field (e.g.,
+        'chemical_formula_reduced' in the configurations collection) using a
+        HyperLogLog sketch (see
+        :class:`~colabfit.tools.statistics.DistinctCounter`), so memory use
+        doesn't grow with the number of distinct values. List values are
+        treated as a single value.
+
+        If :attr:`nprocs` > 1, the documents are split into :attr:`nprocs`
+        ranges of IDs which are processed in parallel, then merged.
+
+        Args:
+
+            collection_name (str):
+                The name of a collection in the database
+
+            field (str):
+                The field to count the distinct values of. Sub-fields can be
+                specified by providing names separated by periods ('.')
+
+            query (dict, default=None):
+                A Mongo query dictionary. If None, uses all of the documents
+                in the collection.
+
+            ids (list):
+                The list of IDs to use. If None, uses the entire collection.
+
+            precision (int, default=14):
+                The sketch uses :code:`2**precision` registers. The relative
+                standard error is about :code:`1.04/sqrt(2**precision)`.
+
+            batch_size (int, default=10000):
+                The number of documents loaded at a time
+
+            verbose (bool, default=False):
+                If True, prints a progress bar
+
+        Returns:
+
+            count (int):
+                The estimated number of distinct values
+        """
+
+        if query is None:
+            query = {}
+
+        if ids is not None:
+            if isinstance(ids, str):
+                ids = [ids]
+            elif isinstance(ids, np.ndarray):
+                ids = ids.tolist()
+
+        if self.nprocs > 1 and ids is None:
+            partials = self._get_insert_pool().starmap(
+                _distinct_counter_worker,
+                [
+                    (
+                        self.database_name, collection_name, field, q,
+                        precision, batch_size
+                    )
+                    for q in _id_ranges(
+                        self[self.database_name][collection_name], query,
+                        self.nprocs
+                    )
+                ]
+            )
+
+            counter = partials[0]
+            for partial in partials[1:]:
+                counter.merge(partial)
+        else:
+            counter = _accumulate_distinct(
+                self[self.database_name][collection_name], field, query, ids,
+                precision, batch_size, verbose
+            )
+
+        return counter.count()
+
+
+    def filter_on_configurations(self, ds_id, query, verbose=False):
+        """
+        Searches the configuration sets of a given dataset, and
+        returns configuration sets and properties that have been filtered based
+        on the given criterion.
+
+            * The returned configuration sets will only include configurations that return True for the filter
+            * The returned property IDs will only include properties that point to a configuration that returned True for the filter.
+
+        Args:
+
+            ds_id (str):
+                The ID of the dataset to filter
+
+            query (dict):
+                A Mongo query that will return the desired objects. It is
+                combined automatically with a filter on the links from the
+                configurations to the configuration sets, to only match the
+                objects that are already linked to the given dataset.
+
+            verbose (bool, default=False):
+                If True, prints progress bars
+
+        Returns:
+
+            configuration_sets (list):
+                A list of configuration sets that have been pruned to only
+                include configurations that satisfy the filter
+
+            property_ids (list):
+                A list of property IDs that satisfy the filter
+        """
+
+        ds_doc = self.datasets.find_one({'_id': ds_id})
+
+        configuration_sets = []
+        property_ids = []
+
+        # Loop over configuration sets
+        cursor = self.configuration_sets.find({
+            '_id': {'$in': ds_doc['relationships']['configuration_sets']}
+            }
+        )
+
+        for cs_doc in tqdm(
+            cursor,
+            desc='Filtering on configuration sets',
+            disable=not verbose
+            ):
+
+            co_ids = self.get_data(
+                'configurations', fields='_id',
+                query={'$and': [
+                    query, {'relationships.configuration_sets': cs_doc['_id']}
+                ]}
+            )
+
+            # Build the filtered configuration sets
+            configuration_sets.append(
+                ConfigurationSet(
+                    configuration_ids=co_ids,
+                    description=cs_doc['description'],
+                    aggregated_info=self.aggregate_configuration_info(
+                        co_ids,
+                        verbose=verbose
+                    )
+                )
+            )
+
+        # Now get the corresponding properties
+        property_ids = [_['_id'] for _ in _find_in(
+            self.properties,
+            list(set(itertools.chain.from_iterable(
+                cs.configuration_ids for cs in configuration_sets
+            ))),
+            query={'relationships.datasets': ds_id},
+            projection={'_id': 1},
+            field='relationships.configurations'
+        )]
+
+        return configuration_sets, property_ids
+
+
+    def filter_on_properties(
+        self, ds_id, filter_fxn=None, query=None, fields=None, verbose=False
+        ):
+        """
+        Searches the properties of a given dataset, and returns configuration
+        sets and properties that have been filtered based on the given
+        criterion.
+
+            * The returned configuration sets will only include configurations that are pointed to by a property that returned True for the filter
+            * The returned property IDs will only include properties that returned True for the filter function.
+
+        Example:
+
+        .. code-block:: python
+
+            configuration_sets, property_ids = database.filter_on_properties(
+                ds_id=...,
+                filter_fxn=lambda x: np.max(np.abs(x[']))
+            )
+
+        Args:
+
+            ds_id (str):
+                The ID of the dataset to filter
+
+            filter_fxn (callable, default=None):
+                A callable function to use as :code:`filter(filter_fxn, cursor)`
+                where :code:`cursor` is a Mongo cursor over all of the
+                property documents in the given dataset. If
+                :code:`filter_fxn` is None, must specify :code:`query`. Any
+                binary-encoded arrays are decoded before being passed to
+                :code:`filter_fxn`.
+
+            query (dict, default=None):
+                A Mongo query that will return the desired objects. It is
+                combined automatically with a filter on the links from the
+                properties to the datasets, to only match the objects that are
+                already linked to the given dataset.
+
+            fields (str or list, default=None):
+                The fields required by :code:`filter_fxn`. Providing the minimum
+                number of necessary fields can improve query performance.
+
+            verbose (bool, default=False):
+                If True, prints progress bars
+
+        Returns:
+
+            configuration_sets (list):
+                A list of configuration sets that have been pruned to only
+                include configurations that satisfy the filter
+
+            property_ids (list):
+                A list of property IDs that satisfy the filter
+        """
+
+        if filter_fxn is None:
+            if query is None:
+                raise RuntimeError(
+                    'filter_fxn and query cannot both be None'
+                )
+            else:
+                filter_fxn = lambda x: True
 
-                        ps = PropertySettings(
-                            method=pso_map['_method'] if '_method' in pso_map else None,
-                            description=pso_map['_description'] if '_description' in pso_map else None,
-                            files=pso_map['_files'] if '_files' in pso_map else None,
-                            labels=pso_map['_labels'] if '_labels' in pso_map else None,
-                            fields=gathered_fields,
-                        )
+        ds_doc = self.datasets.find_one({'_id': ds_id})
 
-                        ps_id = ID_FORMAT_STRING.format('PS', hash(ps), 0)
+        configuration_sets = []
+        property_ids = []
 
-                        ps_set_on_insert = {
-                            '_id': ps_id,
-                            '_method':       ps.method,
-                            '_description': ps.description,
-                            '_files':       ps.files,
-                        }
+        # Filter the properties
+        retfields = {'_id': 1, 'relationships.configurations': 1}
+        if fields is not None:
+            if isinstance(fields, str):
+                fields = [fields]
 
-                        for gf, gf_dict in gathered_fields.items():
-                            if isinstance(gf_dict['source-value'], (int, float, str)):
-                                # Add directly
-                                ps_set_on_insert[gf] = {
-                                    'source-value': gf_dict['source-value']
-                                }
-                            else:
-                                # Then it's array-like and should be converted to a list
-                                ps_set_on_insert[gf] = {
-                                    'source-value': np.atleast_1d(
-                                        gf_dict['source-value']
-                                    ).tolist()
-                                }
+            for f in fields:
+                retfields[f] = 1
 
-                            if 'source-unit' in gf_dict:
-                                ps_set_on_insert[gf]['source-unit'] = gf_dict['source-unit']
+        if query is None:
+            query = {}
 
-                        ps_update_doc =  {  # update document
-                                '$setOnInsert': ps_set_on_insert,
-                                '$set': {
-                                    'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-                                },
-                                '$addToSet': {
-                                    '_labels': {
-                                        '$each': list(ps.labels)
-                                    },
-                                    'relationships.properties': {
-                                        '$each': [pid]
-                                    }
-                                }
-                            }
+        query = {'$and': [query, {'relationships.datasets': ds_id}]}
 
-                        settings_docs.append(UpdateOne(
-                            {'_id': ps_id},
-                            ps_update_doc,
-                            upsert=True,
-                        ))
+        cursor = self.properties.find(query, retfields)
 
-                        methods.append(ps.method)
-                        labels += list(ps.labels)
-                        settings_ids.append(ps_id)
+        all_co_ids = []
+        for pr_doc in tqdm(
+            cursor,
+            desc='Filtering on properties',
+            disable=not verbose,
+            ):
+            if filter_fxn(_decode_arrays(pr_doc)):
+                property_ids.append(pr_doc['_id'])
+                all_co_ids.append(pr_doc['relationships']['configurations'])
 
-                    # Prepare the property instance EDN document
-                    setOnInsert = {}
-                    # for k in property_map[pname]:
-                    for k in pmap:
-                        if k not in prop.keys():
-                            # To allow for missing non-required keys.
-                            # Required keys checked for in Property.from_definition
-                            continue
+        all_co_ids = list(set(itertools.chain.from_iterable(all_co_ids)))
 
-                        if isinstance(prop[k]['source-value'], (int, float, str)):
-                            # Add directly
-                            setOnInsert[k] = {
-                                'source-value': prop[k]['source-value']
-                            }
-                        else:
-                            # Then it's array-like and should be converted to a list
-                            setOnInsert[k] = {
-                                'source-value': np.atleast_1d(
-                                    prop[k]['source-value']
-                                ).tolist()
-                            }
+        cs_ids = ds_doc['relationships']['configuration_sets']
 
-                        if 'source-unit' in prop[k]:
-                            setOnInsert[k]['source-unit'] = prop[k]['source-unit']
+        # Group the configurations by configuration set, using the links from
+        # the configurations to their configuration sets
+        cs_co_ids = {csid: [] for csid in cs_ids}
+        for co_doc in _find_in(
+            self.configurations, all_co_ids,
+            query={'relationships.configuration_sets': {'$in': cs_ids}},
+            projection={'relationships.configuration_sets': 1}
+            ):
+            for csid in co_doc['relationships']['configuration_sets']:
+                if csid in cs_co_ids:
+                    cs_co_ids[csid].append(co_doc['_id'])
 
-                        p_update_doc = {
-                            '$addToSet': {
-                                'methods': {'$each': methods},
-                                'labels': {'$each': labels},
-                                # PR -> PSO pointer
-                                'relationships.property_settings': {
-                                    '$each': settings_ids
-                                },
-                                'relationships.configurations': cid,
-                            },
-                            '$setOnInsert': {
-                                '_id': pid,
-                                'type': pname,
-                                pname: setOnInsert
-                            },
-                            '$set': {
-                                'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-                            }
-                        }
+        # Then filter the configuration sets
+        for cs_doc in self.configuration_sets.find({'_id': {'$in': cs_ids}}):
+
+            co_ids = cs_co_ids[cs_doc['_id']]
+
+            configuration_sets.append(
+                ConfigurationSet(
+                    configuration_ids=co_ids,
+                    description=cs_doc['description'],
+                    aggregated_info=self.aggregate_configuration_info(
+                        co_ids,
+                        verbose=verbose
+                    )
+                )
+            )
+
+        return configuration_sets, property_ids
+
+
+    # def apply_transformation(
+    #     self,
+    #     dataset_id,
+    #     property_ids,
+    #     configuration_ids,
+    #     update_map,
+    #     ):
+    #     """
+    #     This function works by looping over the properties that match the
+    #     provided query and updating them by applying the updated rule. Fields
+    #     from the linked configurations can also be used for the update rule if
+    #     by setting configuration_fields.
+
+    #     Example:
+
+    #     .. code-block:: python
+
+    #         # Convert energies to per-atom values
+    #         database.apply_transformation(
+    #             dataset_id=<dataset_id>,
+
+    #             query={'_id': <property_ids>},
+    #             update={
+    #                 'property-name.energy':
+    #                 lambda fv, doc: fv/doc['configuration']['nsites']
+    #             }
+    #         )
+
+    #     Args:
+
+    #         dataset_id (str):
+    #             The ID of the dataset. Used as a safety measure to only update
+    #             entries for the given dataset.
+
+    #         property_ids (list or str):
+    #             The IDs of the properties to be updated.
+
+    #         update_map (dict):
+    #             A dictionary where the keys are the name of a field to update
+    #             (omitting "source-value"), and the values are callable functions
+    #             that take the field value and property document as arguments.
+
+    #         configuration_ids (list, default=None):
+    #             The IDs of the configurations to use for each property update.
+    #             Must be the same length as :code:`pr_ids`. Note that the fields
+    #             of configuration :code:`co_ids[i]` will be accessible for the
+    #             update command of property :code:`pr_ids[i]` using the
+    #             :code:`configuration.<field>` notation. If None, applies the
+    #             updates to the properties without using any configuration
+    #             fields.
+
+    #     Returns:
+
+    #         update_results (dict):
+    #             The results of a Mongo bulkWrite operation
+    #     """
+
+    #     dataset = self.get_dataset(dataset_id)['dataset']
+
+    #     pipeline = [
+    #         # Filter on the dataset properties
+    #         {'$match': {'_id': {'$in': dataset.property_ids}}},
+    #         # Filter on the specified properties
+    #         {'$match': {'_id': {'$in': property_ids}}},
+    #     ]
+
+    #     if configuration_ids:
+    #         # Attach the linked configuration documents
+    #         pipeline.append(
+    #             {'$lookup': {
+    #                 'from': 'configurations',
+    #                 'localField': 'relationships.configurations',
+    #                 'foreignField': '_id',
+    #                 'as': 'configuration'
+    #             }}
+    #         )
+    #         pipeline.append(
+    #             {'$unwind': '$configuration'}
+    #         )
+    #     else:
+    #         configuration_ids = [None]*len(property_ids)
+
+    #     pr_to_co_map = {p:c for p,c in zip(property_ids, configuration_ids)}
+
+    #     updates = []
+    #     for pr_doc in self.properties.aggregate(pipeline):
+    #         link_cid = pr_to_co_map[pr_doc['_id']]
+
+    #         # Only perform the operation for the desired configurations
+    #         if (link_cid is None) or (pr_doc['configuration']['_id'] == link_cid):
+    #             for key, fxn in update_map.items():
+    #                 fv = pr_doc
+    #                 missing = False
+    #                 for k in key.split('.'):
+    #                     if k in fv:
+    #                         fv = fv[k]
+    #                     else:
+    #                         # Does not have necessary data
+    #                         missing = True
+
+    #                 if missing: continue
+
+    #                 if isinstance(fv, dict):
+    #                     # Handle case where "source-value" isn't at end of key
+    #                     fv = fv['source-value']
+    #                     key += '.source-value'
+
+    #                 data = fxn(fv, pr_doc)
+
+    #                 if isinstance(data, (np.ndarray, list)):
+    #                     data = np.atleast_1d(data).tolist()
+    #                 elif isinstance(data, (str, bool, int, float)):
+    #                     pass
+    #                 elif np.issubdtype(data.dtype, np.integer):
+    #                     data = int(data)
+    #                 elif np.issubdtype(data.dtype, np.float):
+    #                     data = float(data)
+
+    #                 updates.append(UpdateOne(
+    #                     {'_id': pr_doc['_id']},
+    #                     {'$set': {key: data}}
+    #                 ))
 
-                    property_docs.append(UpdateOne(
-                        {'_id': pid},
-                        p_update_doc,
-                        upsert=True,
-                    ))
+    #     res = self.properties.bulk_write(updates, ordered=False)
+    #     nmatch = res.bulk_api_result['nMatched']
+    #     if nmatch:
+    #         warnings.warn('Modified {} properties'.format(nmatch))
 
-                    c_update_doc['$addToSet']['relationships.properties']['$each'].append(
-                        pid
-                    )
+    #     return res
 
-                    insertions.append((cid, pid))
 
-            config_docs.append(
-                UpdateOne({'_id': cid}, c_update_doc, upsert=True)
-            )
+    def dataset_from_markdown(
+        self,
+        html_file_path,
+        generator=False,
+        verbose=False,
+    ):
+        """
+        Loads a Dataset from a markdown file.
 
-            if not pid:
-                # Only yield if something wasn't yielded earlier
-                insertions.append((cid, pid))
+        Args:
 
-            ai += 1
+            html_file_path (str):
+                The full path to the markdown file
 
-        if config_docs:
-            res = coll_configurations.bulk_write(config_docs, ordered=False)
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate configurations detected'.format(nmatch)
-                )
-        if property_docs:
-            res = coll_properties.bulk_write(property_docs, ordered=False)
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate properties detected'.format(nmatch)
-                )
+            generator (bool, default=False):
+                If True, uses a generator when inserting data.
 
-        if settings_docs:
-            res = coll_property_settings.bulk_write(
-                settings_docs,
-                # [
-                #     UpdateOne(
-                #         {'_id': sid},
-                #         {'$addToSet': {'relationships.properties': {'$each': lst}}}
-                #     ) for sid, lst in settings_docs.items()
-                # ],
-                ordered=False
-            )
-            nmatch = res.bulk_api_result['nMatched']
-            if nmatch:
-                warnings.warn(
-                    '{} duplicate property settings detected'.format(nmatch)
-                )
+            verbose (bool, default=False):
+                If True, prints progress bars
 
+        Returns:
 
-        client.close()
-        return insertions
+            dataset (Dataset):
+                The Dataset object after adding it to the Database
+        """
 
+        base_path = os.path.split(html_file_path)[0]
 
-    def insert_property_definition(self, definition):
-        """
-        Inserts a new property definition into the database. Checks that
-        definition is valid, then builds all necessary groups in
-        :code:`/root/properties`. Throws an error if the property already
-        exists.
+        with open(html_file_path, 'r') as f:
+            try:
+                html = markdown.markdown(f.read(), extensions=['tables'])
+            except:
+                raise MarkdownFormatError(
+                    "Markdown file could not be read by markdown.markdown()"
+                )
 
-        Args:
+        # Parse information from markdown file
+        parser = DatasetParser()
+        parser.feed(html)
 
-            definition (dict or string):
-                The map defining the property. See the example below, or the
-                `OpenKIM Properties Framework <https://openkim.org/doc/schema/properties-framework/>`_
-                for more details. If a string is provided, it must be the name
-                of an existing property definition from the
-                `OpenKIM Properties List <https://openkim.org/properties>`_.
+        images = []
+        storage_table = parser.get_data('Storage format')
+        header = storage_table[0]
+        for row in storage_table:
 
-        Example definition:
+            # Check if already exists in Database
+            if row[header.index('Format')] == 'mongo':
+                return self.get_dataset(
+                    row[header.index('File')], resync=True, verbose=verbose
+                )
 
-        .. code-block:: python
+            # Else, need to build from scratch
+            try:
+                elements = [l.strip() for l in row[header.index('Elements')].split(',')]
+            except:
+                raise BadTableFormatting(
+                    "Error when parsing 'Elements' column of 'Storage format' table"
+                )
 
-            property_definition = {
-                'property-id': 'default',
-                'property-title': 'A default property used for testing',
-                'property-description': 'A description of the property',
-                'energy': {'type': 'float', 'has-unit': True, 'extent': [], 'required': True, 'description': 'empty'},
-                'stress': {'type': 'float', 'has-unit': True, 'extent': [6], 'required': True, 'description': 'empty'},
-                'name': {'type': 'string', 'has-unit': False, 'extent': [], 'required': True, 'description': 'empty'},
-                'nd-same-shape': {'type': 'float', 'has-unit': True, 'extent': [2,3,5], 'required': True, 'description': 'empty'},
-                'nd-diff-shape': {'type': 'float', 'has-unit': True, 'extent': [":", ":", ":"], 'required': True, 'description': 'empty'},
-                'forces': {'type': 'float', 'has-unit': True, 'extent': [":", 3], 'required': True, 'description': 'empty'},
-                'nd-same-shape-arr': {'type': 'float', 'has-unit': True, 'extent': [':', 2, 3], 'required': True, 'description': 'empty'},
-                'nd-diff-shape-arr': {'type': 'float', 'has-unit': True, 'extent': [':', ':', ':'], 'required': True, 'description': 'empty'},
-            }
+            # Load Configurations
+            images.append(load_data(
+                file_path=os.path.join(base_path, row[header.index('File')][0][1]),
+                file_format=row[header.index('Format')],
+                name_field=row[header.index('Name field')],
+                elements=elements,
+                default_name=parser.data['Name'],
+                verbose=verbose
+            ))
 
-        """
+        images = itertools.chain.from_iterable(images)
 
-        if isinstance(definition, str):
-            definition = KIM_PROPERTIES[definition]
+        # Add Property definitions and load property_map
+        property_map = {}
+        for prop in parser.get_data('Properties')[1:]:
+            pid         = prop[0][0]
+            kim_field   = prop[1]
+            ase_field   = prop[2]
+            units       = prop[3]
 
-        if self.property_definitions.count_documents(
-            {'_id': definition['property-id']}
-            ):
-            warnings.warn(
-                "Property definition with name '{}' already exists. "\
-                "Using existing definition.".format(
-                    definition['property-id']
-                )
-            )
+            if units == 'None':
+                units = None
 
-        dummy_dict = deepcopy(definition)
+            # pid, kim_field, ase_field, units = prop
 
-        # Spoof if necessary
-        if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
-            # Invalid ID. Try spoofing it
-            dummy_dict['property-id'] = 'tag:@,0000-00-00:property/'
-            dummy_dict['property-id'] += definition['property-id']
-            warnings.warn(
-                "Invalid KIM property-id; "\
-                "Temporarily renaming to {}. "\
-                "See https://openkim.org/doc/schema/properties-framework/ "\
-                "for more details.".format(dummy_dict['property-id'])
-            )
 
-        check_property_definition(dummy_dict)
+            if pid in KIM_PROPERTIES:
+                pname = definition = pid
+            elif isinstance(pid, tuple):
+                pname = pid[0]
 
-        self.property_definitions.update_one(
-            {'_id': definition['property-id']},
-            {
-                '$setOnInsert': {
-                    '_id': definition['property-id'],
-                    'definition': dummy_dict
-                }
-            },
-            upsert=True
-        )
+                edn_path = os.path.abspath(os.path.join(base_path, pid[1]))
+                definition = kim_edn.load(edn_path)
 
+            definition['property-id'] = pname
+            self.insert_property_definition(definition)
 
-    def get_property_definition(self, name):
-        return self.property_definitions.find_one({'_id': name})
+            pid_dict = property_map.setdefault(pname, {})
 
+            if kim_field in pid_dict:
+                raise BadTableFormatting(
+                    "Duplicate property field found"
+                )
 
-    def insert_property_settings(self, ps_object):
-        """
-        Inserts a new property settings object into the database by creating
-        and populating the necessary groups in :code:`/root/property_settings`.
+            pid_dict[kim_field] = {
+                'field': ase_field,
+                'units': units
+            }
 
-        Args:
+        # Extract property settings
+        property_settings = {}
+        pso_table = parser.get_data('Property settings')
+        header = pso_table[0]
+        for row in pso_table[1:]:
+            files = []
+            if 'Files' in header:
+                for ftup in row[header.index('Files')]:
+                    # Files will be stored as hyperlink tuples
+                    fpath = os.path.abspath(os.path.join(base_path, ftup[1]))
+                    with open(fpath, 'r') as f:
+                        files.append((
+                            ftup[0],
+                            '\n'.join([_.strip() for _ in f.readlines()])
+                        ))
 
-            ps_object (PropertySettings)
-                The :class:`~colabfit.tools.property_settings.PropertySettings`
-                object to insert into the database.
+            property_settings[row[header.index('Property')]] = PropertySettings(
+                method=row[header.index('Method')],
+                description=row[header.index('Description')],
+                labels=[
+                    _.strip() for _ in row[header.index('Labels')].split(',')
+                ] if 'Labels' in header else [],
+                files=files,
+            )
 
+        ids = list(self.insert_data(
+            images,
+            property_map=property_map,
+            property_settings=property_settings,
+            generator=generator,
+            verbose=verbose,
+        ))
 
-        Returns:
+        all_co_ids, all_pr_ids = list(zip(*ids))
 
-            ps_id (str):
-                The ID of the inserted property settings object. Equals the hash
-                of the object.
-        """
+        # Extract configuration sets and trigger CS refresh
+        cs_ids = []
 
-        ps_id = ID_FORMAT_STRING.format('PS', hash(ps_object), 0)
+        config_sets = parser.get_data('Configuration sets')
+        header = config_sets[0]
+        for row in config_sets[1:]:
+            query = literal_eval(row[header.index('Query')])
 
-        self.property_settings.update_one(
-            {'_id': ps_id},
-            {
-                '$addToSet': {
-                    'labels': {'$each': list(ps_object.labels)}
-                },
-                '$setOnInsert': {
-                    '_id': ps_id,
-                    'method': ps_object.method,
-                    'description': ps_object.description,
-                    'files': [
-                        {
-                            'file_name': ftup[0],
-                            'file_contents': ftup[1],
-                        } for ftup in ps_object.files
-                    ],
-                }
-            },
-            upsert=True
+            co_ids = self.get_data(
+                'configurations',
+                fields='_id',
+                query=query,
+                ids=all_co_ids,
+                ravel=True
+            ).tolist()
+
+            cs_id = self.insert_configuration_set(
+                co_ids,
+                description=row[header.index('Description')],
+                verbose=True
+            )
+
+            cs_ids.append(cs_id)
+
+        # Define the Dataset
+        ds_id = self.insert_dataset(
+            cs_ids=cs_ids,
+            pr_ids=all_pr_ids,
+            name='Mo_PRM2019',
+            authors=parser.data['Authors'],
+            links=parser.data['Links'],
+            description=parser.data['Description'],
+            verbose=verbose,
         )
 
-        return ps_id
-
-
-    def get_property_settings(self, pso_id):
-        pso_doc = self.property_settings.find_one({'_id': pso_id})
+        # Extract labels and trigger label refresh for configurations
+        labels = parser.get_data('Configuration labels')
+        header = labels[0]
+        for row in labels[1:]:
+            query = literal_eval(row[header.index('Query')])
 
-        return PropertySettings(
-                method=pso_doc['method'],
-                description=pso_doc['description'],
-                labels=set(pso_doc['labels']),
-                files=[
-                    (d['file_name'], d['file_contents'])
-                    for d in pso_doc['files']
-                ]
+            self.apply_labels(
+                dataset_id=ds_id,
+                collection_name='configurations',
+                query=query,
+                labels=[
+                    l.strip() for l in row[header.index('Labels')].split(',')
+                ],
+                verbose=True
             )
 
+        return self.get_dataset(ds_id, resync=True, verbose=verbose)
 
-    # @staticmethod
-    def get_data(
-        self, collection_name,
-        fields,
-        query=None,
-        ids=None,
-        keep_ids=False,
-        concatenate=False,
-        vstack=False,
-        ravel=False,
-        unpack_properties=True,
-        verbose=False,
+
+    def dataset_to_markdown(
+        self,
+        ds_id,
+        base_folder,
+        html_file_name,
+        data_file_name,
+        data_format,
+        name_field=ATOMS_NAME_FIELD,
+        histogram_fields=None,
+        yscale='linear',
         ):
         """
-        Queries the database and returns the fields specified by `keys` as a
-        list or an array of values. Returns the results in memory.
+        Saves a Dataset and writes a properly formatted markdown file. In the
+        case of a Dataset that has child Dataset objects, each child Dataset
+        is written to a separate sub-folder.
 
-        Example:
+        Args:
 
-        .. code-block:: python
+            ds_id (str):
+                The ID of the dataset.
 
-            data = database.get_data(
-                collection_name='properties',
-                query={'_id': {'$in': <list_of_property_IDs>}},
-                fields=['property_name_1.energy', 'property_name_1.forces'],
-                cache=True
-            )
+            base_folder (str):
+                Top-level folder in which to save the markdown and data files
 
-        Args:
+            html_file_name (str):
+                Name of file to save markdown to
 
-            collection_name (str):
-                The name of a collection in the database.
+            data_file_name (str):
+                Name of file to save configuration and properties to
 
-            fields (list or str):
-                The fields to return from the documents. Sub-fields can be
-                returned by providing names separated by periods ('.')
+            data_format (str, default='mongo'):
+                Format to use for data file. If 'mongo', does not save the
+                configurations to a new file, and instead adds the ID of the
+                Dataset in the Mongo Database.
 
-            query (dict, default=None):
-                A Mongo query dictionary. If None, returns the data for all of
-                the documents in the collection.
+            name_field (str):
+                The name of the field that should be used to generate
+                configuration names
 
-            ids (list):
-                The list of IDs to return the data for. If None, returns the
-                data for the entire collection. Note that this information can
-                also be provided using the :code:`query` argument.
+            histogram_fields (list, default=None):
+                The property fields to include in the histogram plot. If None,
+                plots all fields.
 
-            keep_ids (bool, default=False):
-                If True, includes the '_id' field as one of the returned values.
+            yscale (str, default='linear'):
+                Scaling to use for histogram plotting
+        """
 
-            concatenate (bool, default=False):
-                If True, concatenates the data before returning.
+        template = \
+"""
+# Summary
+|Chemical systems|Element ratios|# of properties|# of configurations|# of atoms|
+|---|---|---|---|---|
+|{}|{}|{}|{}|{}|
 
-            vstack (bool, default=False):
-                If True, calls np.vstack on data before returning.
+# Name
 
-            ravel (bool, default=False):
-                If True, concatenates and ravels the data before returning.
+{}
 
-            unpack_properties (bool, default=True):
-                If True, returns only the contents of the :code:`'source-value'`
-                key for each field in :attr:`fields` (assuming
-                :code:`'source-value'` exists). Users who wish to return the
-                full dictionaries for fields should set
-                :code:`unpack_properties=False`.
+# Authors
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
+{}
 
-        Returns:
+# Links
 
-            data (dict):
-                key = k for k in keys. val = in-memory data
-        """
+{}
 
-        if query is None:
-            query = {}
+# Description
 
-        if ids is not None:
-            if isinstance(ids, str):
-                ids = [ids]
-            elif isinstance(ids, np.ndarray):
-                ids = ids.tolist()
+{}
 
-            query['_id'] = {'$in': ids}
+# Storage format
 
-        if isinstance(fields, str):
-            fields = [fields]
+|Elements|File|Format|Name field|
+|---|---|---|---|
+| {} | {} | {} | {} |
 
-        retfields = {k: 1 for k in fields}
+# Properties
 
-        if keep_ids:
-            retfields['_id'] = 1
+|Property|KIM field|ASE field|Units
+|---|---|---|---|
+{}
 
-        collection = self[self.database_name][collection_name]
+# Property settings
+
+|ID|Method|Description|Labels|Files|
+|---|---|---|---|---|
+{}
 
-        cursor = collection.find(query, retfields)
+# Configuration sets
 
-        data = {
-            k: [] for k in retfields
-        }
+|ID|Description|# of structures| # of atoms|
+|---|---|---|---|
+{}
 
-        for doc in tqdm(cursor, desc='Getting data', disable=not verbose):
-            for k in retfields:
-                # For figuring out if document has the data
+# Configuration labels
 
-                # Handle keys like "property-name.property-field"
-                missing = False
-                v = doc
-                for kk in k.split('.'):
-                    if kk in v:
-                        v = v[kk]
-                    else:
-                        # Missing something
-                        missing = True
+|Labels|Counts|
+|---|---|
+{}
 
-                if not missing:
-                    if isinstance(v, dict):
-                        if unpack_properties and ('source-value' in v):
-                            v = v['source-value']
+# Figures
+![The results of plot_histograms](histograms.png)
+"""
 
-                    data[k].append(v)
+        if not os.path.isdir(base_folder):
+            os.mkdir(base_folder)
 
-        for k,v in data.items():
-            # data[k] = np.array(data[k])
+        html_file_name = os.path.join(base_folder, html_file_name)
 
-            if concatenate or ravel:
-                try:
-                    data[k] = np.concatenate(v)
-                except:
-                    data[k] = np.array(v)
+        dataset = self.get_dataset(ds_id)['dataset']
 
-            if vstack:
-                data[k] = np.vstack(v)
+        definition_files = {}
+        for pname in dataset.aggregated_info['property_types']:
+            definition = self.get_property_definition(pname)
 
-        if ravel:
-            for k,v in data.items():
-                data[k] = v.ravel()
+            def_fpath = os.path.join(base_folder, f'{pname}.edn')
 
-        if len(retfields) == 1:
-            return data[list(retfields.keys())[0]]
-        else:
-            return data
+            json.dump(definition, open(def_fpath, 'w'))
 
+            definition_files[pname] = def_fpath
 
-    def get_configuration(self, i, property_ids=None, attach_properties=False):
-        """
-        Returns a single configuration by calling :meth:`get_configurations`
-        """
-        return self.get_configurations(
-            [i], property_ids=property_ids, attach_properties=attach_properties
-        )[0]
+        property_map = {}
+        for pr_doc in self.properties.find({'relationships.datasets': ds_id}):
+            if pr_doc['type'] not in property_map:
+                property_map[pr_doc['type']] = {
+                    f: {
+                        'field': f,
+                        'units': v['source-unit'] if 'source-unit' in v else None
+                    }
+                    for f,v in pr_doc[pr_doc['type']].items()
+                }
 
+        agg_info = dataset.aggregated_info
 
-    def get_configurations(
-        self, configuration_ids,
-        property_ids=None,
-        attach_properties=False,
-        attach_settings=False,
-        generator=False,
-        verbose=False
-        ):
-        """
-        A generator that returns in-memory Configuration objects one at a time
-        by loading the atomic numbers, positions, cells, and PBCs.
+        # TODO: property settings should populate the MD file table
+
+        # property_settings = {}
+        # for pso_doc in self.property_settings.find(
+        #     {'relationships.properties': {'$in': dataset.property_ids}}
+        #     ):
+        #     property_settings[pso_doc['_id']] = self.get_property_settings(
+        #         pso_doc['_id']
+        #     )
 
-        Args:
+        property_settings = list(
+            self.property_settings.find(
+                {'relationships.properties': {'$in': list(dataset.property_ids)}}
+            )
+        )
 
-            configuration_ids (list or 'all'):
-                A list of string IDs specifying which Configurations to return.
-                If 'all', returns all of the configurations in the database.
+        # Build Property Settings table
 
-            property_ids (list, default=None):
-                A list of Property IDs. Used for limiting searches when
-                :code:`attach_properties==True`.  If None,
-                :code:`attach_properties` will attach all linked Properties.
-                Note that this only attaches one property per Configuration, so
-                if multiple properties point to the same Configuration, that
-                Configuration will be returned multiple times.
+        ps_table_lines = {}
+        for ps_doc in property_settings:
+            ps_tup = ('settings', )
+            ps_table.append('| {} | {} | {} | {} | {} |'.format(
+                pso_id,
+                pso.method,
+                pso.description,
+                ', '.join(pso.labels),
+                ', '.join('[{}]({})'.format(f, f) for f in pso.files)
+            ))
 
-            attach_properties (bool, default=False):
-                If True, attaches all the data of any linked properties from
-                :code:`property_ids`. The property data will either be added to
-                the :code:`arrays` dictionary on a Configuration (if it can be
-                converted to a matrix where the first dimension is the same
-                as the number of atoms in the Configuration) or the :code:`info`
-                dictionary (if it wasn't added to :code:`arrays`). Property
-                fields in a list to accomodate the possibility of multiple
-                properties of the same type pointing to the same configuration.
-                WARNING: don't use this option if multiple properties of the
-                same type point to the same Configuration, but the properties
-                don't have values for all of their fields.
 
-            attach_settings (bool, default=False):
-                If True, attaches all of the fields of the property settings
-                that are linked to the attached property instances. If
-                :code:`attach_settings=True`, must also have
-                :code:`attach_properties=True`.
+        for pr_doc in self.properties.aggregate([
+                {'$match': {'relationships.datasets': ds_id}},
+                {'$lookup': {
+                    'from': 'property_settings',
+                    'localField': 'relationships.property_settings',
+                    'foreignField': '_id',
+                    'as': 'linked_settings'
+                }},
+            ]):
 
-            generator (bool, default=False):
-                If True, this function returns a generator of the
-                configurations. This is useful if the configurations can't all
-                fit in memory at the same time.
+            for ps_doc in pr_doc['linked_settings']:
+                pass
 
-            verbose (bool):
-                If True, prints progress bar
+        # TODO: get the types of the properties linked to the PSs
 
-        Returns:
+        configuration_sets = {
+            csid: self.get_configuration_set(csid)['configuration_set']
+            for csid in dataset.configuration_set_ids
+        }
 
-            configurations (iterable):
-                A list or generator of the re-constructed configurations
-        """
+        # Write the markdown file
+        with open(html_file_name, 'w') as html:
 
-        if configuration_ids == 'all':
-            query = {}
-        else:
-            if isinstance(configuration_ids, str):
-                configuration_ids = [configuration_ids]
+            formatting_arguments = []
 
-            query = {'_id': {'$in': configuration_ids}}
+            # Summary
+            formatting_arguments.append(', '.join(agg_info['chemical_systems']))
 
-        if generator:
-            return self._get_configurations(
-                query=query,
-                property_ids=property_ids,
-                attach_properties=attach_properties,
-                verbose=verbose
-            )
-        else:
-            return list(self._get_configurations(
-                query=query,
-                property_ids=property_ids,
-                attach_properties=attach_properties,
-                attach_settings=attach_settings,
-                verbose=verbose
-            ))
+            tmp = []
+            for e, er in agg_info['total_elements_ratios'].items():
+                tmp.append('{} ({:.1f}%)'.format(e, er*100))
 
+            formatting_arguments.append(', '.join(tmp))
 
-    def _get_configurations(
-        self,
-        query,
-        property_ids,
-        attach_properties,
-        attach_settings,
-        verbose=False
-        ):
-        if not attach_properties:
-            for co_doc in tqdm(
-                self.configurations.find(
-                    query,
-                    {
-                        'atomic_numbers', 'positions', 'cell', 'pbc', 'names',
-                        'labels'
-                    }
-                ),
-                desc='Getting configurations',
-                disable=not verbose
-                ):
-                c = Configuration(
-                    symbols=co_doc['atomic_numbers'],
-                    positions=co_doc['positions'],
-                    cell=co_doc['cell'],
-                    pbc=co_doc['pbc'],
-                )
+            formatting_arguments.append(sum(agg_info['property_types_counts']))
+            formatting_arguments.append(agg_info['nconfigurations'])
+            formatting_arguments.append(agg_info['nsites'])
 
-                c.info['_id'] = co_doc['_id']
-                c.info[ATOMS_NAME_FIELD] = co_doc['names']
-                c.info[ATOMS_LABELS_FIELD] = co_doc['labels']
+            # Name
+            formatting_arguments.append(dataset.name)
 
-                yield c
-        else:
+            # Authors
+            formatting_arguments.append('\n\n'.join(dataset.authors))
 
-            property_match = { 'relationships.configurations': query['_id']}
+            # Links
+            formatting_arguments.append('\n\n'.join(dataset.links))
 
-            if property_ids is not None:
-                property_match['_id'] = {'$in': property_ids}
+            # Description
+            formatting_arguments.append(dataset.description)
 
-            pipeline = [
-                {'$match': query},
-                {'$lookup': {
-                    'from': 'properties',
-                    'localField': 'relationships.properties',
-                    'foreignField': '_id',
-                    'as': 'linked_properties'
-                }},
-                # {'$match': {'linked_properties._id': property_match}},
-                # {'$match': {'linked_properties._id': {'$in': property_ids}}},
-            ]
+            # Storage format
+            formatting_arguments.append(', '.join(agg_info['elements']))
 
-            if property_ids is not None:
-                pipeline.append(
-                    {'$match': {'linked_properties._id': {'$in': property_ids}}}
+            if data_format == 'mongo':
+                formatting_arguments.append(ds_id)
+            else:
+                formatting_arguments.append(
+                    '[{}]({})'.format(data_file_name, data_file_name)
                 )
 
-            if attach_settings:
-                pipeline.append(
-                    {'$lookup': {
-                        'from': 'property_settings',
-                        'localField': 'linked_properties.relationships.property_settings',
-                        'foreignField': '_id',
-                        'as': 'linked_property_settings'
-                    }}
-                )
+            formatting_arguments.append(data_format)
 
-            for co_doc in tqdm(
-                    self.configurations.aggregate(pipeline),
-                    desc='Getting configurations',
-                    disable=not verbose
-                ):
+            formatting_arguments.append(name_field)
 
-                c = Configuration(
-                    symbols=co_doc['atomic_numbers'],
-                    positions=co_doc['positions'],
-                    cell=co_doc['cell'],
-                    pbc=co_doc['pbc'],
-                )
+            tmp = []
+            for pid, fdict in property_map.items():
+                for f,v in fdict.items():
+                    tmp.append(
+                        '| {} | {} | {} | {}'.format(
+                            '[{}]({})'.format(pid, definition_files[pid]),
+                            f,
+                            v['field'],
+                            v['units']
+                        )
+                    )
 
-                c.info['_id'] = co_doc['_id']
-                c.info[ATOMS_NAME_FIELD] = co_doc['names']
-                c.info[ATOMS_LABELS_FIELD] = co_doc['labels']
+            formatting_arguments.append('\n'.join(tmp))
 
-                n = len(c)
+            tmp = []
+            for pso_id, pso in property_settings.items():
+                tmp.append('| {} | {} | {} | {} | {} |'.format(
+                    pso_id,
+                    pso.method,
+                    pso.description,
+                    ', '.join(pso.labels),
+                    ', '.join('[{}]({})'.format(f, f) for f in pso.files)
+                ))
 
-                for pr_doc in co_doc['linked_properties']:
-                    for field_name, field in pr_doc[pr_doc['type']].items():
-                        v = np.atleast_1d(field['source-value'])
+            formatting_arguments.append('\n'.join(tmp))
 
-                        if (v.dtype == 'O') or v.shape[0] != n:
-                            dct = c.info
-                        else:
-                            dct = c.arrays
+            tmp = []
+            for cs_id, cs in configuration_sets.items():
+                tmp.append('| {} | {} | {} | {} |'.format(
+                    cs_id,
+                    cs.description,
+                    cs.aggregated_info['nconfigurations'],
+                    cs.aggregated_info['nsites']
+                ))
 
-                        field_name = f'{pr_doc["type"]}.{field_name}'
+            formatting_arguments.append('\n'.join(tmp))
 
-                        if field_name in dct:
-                            # Then this is a duplicate property
-                            dct[field_name].append(v)
-                        else:
-                            # Then this is the first time
-                            # the property of this type is being added
-                            dct[field_name] = [v]
-
-                if attach_settings:
-                    for ps_doc in co_doc['linked_property_settings']:
-                        for k,v in ps_doc.items():
-                            if k in [
-                                '_id', '_description', '_labels', '_method'
-                                ]:
-                                c.info['_settings.'+k] = v
-                            elif k in ['_files', 'last_modified', 'relationships']:
-                                pass
-                            else:
-                                v = np.atleast_1d(field['source-value'])
+            tmp = []
+            for l, lc in zip(
+                dataset.aggregated_info['configuration_labels'], dataset.aggregated_info['configuration_labels_counts']
+                ):
 
-                                if (v.dtype == 'O') or v.shape[0] != n:
-                                    dct = c.info
-                                else:
-                                    dct = c.arrays
+                tmp.append('| {} | {} |'.format(l, lc))
 
-                                dct[k] = v
+            formatting_arguments.append('\n'.join(tmp))
 
-                yield c
+            html.write(template.format(*formatting_arguments))
 
 
-    def concatenate_configurations(self):
-        """
-        Concatenates the atomic_numbers, positions, cells, and pbcs groups in
-        /configurations.
-        """
-        self.database.concatenate_configurations()
+        # Save figures
+        if histogram_fields is None:
+            histogram_fields = dataset.aggregated_info['property_fields']
 
+        if len(histogram_fields) > 0:
+            fig = self.plot_histograms(
+                histogram_fields,
+                query={'relationships.datasets': ds_id},
+                yscale=yscale,
+                method='matplotlib'
+            )
 
-    def insert_configuration_set(self, ids, description='', verbose=False):
-        """
-        Inserts the configuration set of IDs to the database.
+            plt.savefig(os.path.join(base_folder, 'histograms.png'))
+            plt.close()
 
-        Args:
+        # Copy any PSO files
+        all_file_names = []
+        for pso_id, pso in property_settings.items():
+            for fi, f in enumerate(pso.files):
+                new_name = os.path.join(
+                    base_folder,
+                    pso_id + '_' + os.path.split(f)[-1]
+                )
+                shutil.copyfile(f, new_name)
 
-            ids (list or str):
-                The IDs of the configurations to include in the configuartion
-                set.
+                all_file_names.append(new_name)
+                pso.files[fi] = new_name
 
-            description (str, optional):
-                A human-readable description of the configuration set.
+        if data_format == 'xyz':
+            data_format = 'extxyz'
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
-        """
+        if data_format != 'mongo':
+            data_file_name = os.path.join(base_folder, data_file_name)
 
-        if isinstance(ids, str):
-            ids = [ids]
+            images = self.get_configurations(
+                ids=list(set(itertools.chain.from_iterable(
+                    cs.configuration_ids for cs in configuration_sets.values()
+                ))),
+                attach_settings=True,
+                attach_properties=True,
+                generator=True,
+            )
 
-        ids = list(set(ids))
+            ase_write(
+                data_file_name,
+                images=images,
+                format=data_format,
+            )
+
+
+def load_data(
+    file_path,
+    file_format,
+    name_field,
+    elements,
+    default_name='',
+    labels_field=None,
+    reader=None,
+    glob_string=None,
+    generator=True,
+    verbose=False,
+    **kwargs,
+    ):
+    """
+    Loads a list of Configuration objects.
+
+    Args:
+        file_path (str):
+            Path to the file or folder containing the data
+
+        file_format (str):
+            A string for specifying the type of Converter to use when loading
+            the configurations. Allowed values are 'xyz', 'extxyz', 'cfg', or
+            'folder'.
 
-        cs_hash = sha512()
-        cs_hash.update(description.encode('utf-8'))
-        for i in sorted(ids):
-            cs_hash.update(str(i).encode('utf-8'))
+        name_field (str):
+            Key name to use to access `ase.Atoms.info[<name_field>]` to
+            obtain the name of a configuration one the atoms have been
+            loaded from the data file. Note that if
+            `file_format == 'folder'`, `name_field` will be set to 'name'.
 
-        cs_hash = int(cs_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
-        cs_id = ID_FORMAT_STRING.format('CS', cs_hash, 0)
+        elements (list):
+            A list of strings of element types
 
-        # Check for duplicates
-        if self.configuration_sets.count_documents({'_id': cs_id}):
-            return cs_id
+        default_name (list):
+            Default name to be used if `name_field==None`.
 
-        # Make sure all of the configurations exist
-        if self.configurations.count_documents({'_id': {'$in': ids}}) != len(ids):
-            raise MissingEntryError(
-                "Not all of the IDs provided to insert_configuration_set exist"\
-                " in the database."
-            )
+        labels_field (str):
+            Key name to use to access `ase.Atoms.info[<labels_field>]` to
+            obtain the labels that should be applied to the configuration. This
+            field should contain a comma-separated list of strings
 
-        aggregated_info = self.aggregate_configuration_info(ids, verbose=verbose)
+        reader (callable):
+            An optional function for loading configurations from a file. Only
+            used for `file_format == 'folder'`
 
-        self.configuration_sets.update_one(
-            {'_id': cs_id},
-            {
-                '$addToSet': {
-                    'relationships.configurations': {'$each': ids}
-                },
-                '$setOnInsert': {
-                    '_id': cs_id,
-                    'description': description,
-                },
-                '$set': {
-                    'aggregated_info': aggregated_info,
-                    'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-                },
-            },
-            upsert=True
-        )
+        glob_string (str):
+            A string to use with `Path(file_path).rglob(glob_string)` to
+            generate a list of files to be passed to `self.reader`. Only used
+            for `file_format == 'folder'`, and only required if `file_path` is
+            a folder.
 
-        # Add the backwards relationships CO->CS
-        config_docs = []
-        for cid in ids:
-            config_docs.append(UpdateOne(
-                {'_id': cid},
-                {
-                    '$addToSet': {
-                        'relationships.configuration_sets': cs_id
-                    }
-                }
-            ))
+        generator (bool, default=True):
+            If True, returns a generator of Configurations. If False, returns a
+            list.
 
-        self.configurations.bulk_write(config_docs)
+        verbose (bool):
+            If True, prints progress bar.
 
-        return cs_id
+    All other keyword arguments will be passed with
+    `converter.load(..., **kwargs)`
+    """
 
+    if file_format == 'folder':
+        if reader is None:
+            raise RuntimeError(
+                "Must provide a `reader` function when `file_format=='folder'`"
+            )
 
-    def get_configuration_set(self, cs_id, resync=False):
-        """
-        Returns the configuration set with the given ID.
+        if (glob_string is None) and Path(file_path).is_dir():
+            raise RuntimeError(
+                "Must provide `glob_string` when `file_format=='folder'`"
+            )
 
-        Args:
 
-            cs_ids (str):
-                The ID of the configuration set to return
+        converter = FolderConverter(reader)
 
-            resync (bool):
-                If True, re-aggregates the configuration set information before
-                returning. Default is False.
+        results = converter.load(
+            file_path,
+            name_field=name_field,
+            elements=elements,
+            default_name=default_name,
+            labels_field=labels_field,
+            glob_string=glob_string,
+            verbose=verbose,
+            **kwargs,
+        )
 
-        Returns:
+    elif file_format in ['xyz', 'extxyz', 'cfg']:
+        if file_format in ['xyz', 'extxyz']:
+            converter = EXYZConverter()
+        elif file_format == 'cfg':
+            converter = CFGConverter()
 
-            A dictionary with two keys:
-                'last_modified': a datetime string
-                'configuration_set': the configuration set object
-        """
+        results = converter.load(
+            file_path,
+            name_field=name_field,
+            elements=elements,
+            default_name=default_name,
+            labels_field=labels_field,
+            verbose=verbose,
+        )
+    else:
+        raise RuntimeError(
+            "Invalid `file_format`. Must be one of "\
+                "['xyz', 'extxyz', 'cfg', 'folder']"
+        )
 
+    return results if generator else list(results)
 
-        if resync:
-            self.resync_configuration_set(cs_id)
 
-        cs_doc = self.configuration_sets.find_one({'_id': cs_id})
+def _connect(mongo_login, login_args=(), login_kwargs=None):
+    """
+    Opens a new MongoClient. :code:`mongo_login` is either a port number on
+    localhost or a full Mongo URI (see :meth:`MongoDatabase._mongo_login`).
+    """
 
-        return {
-            'last_modified': cs_doc['last_modified'],
-            'configuration_set': ConfigurationSet(
-                configuration_ids=cs_doc['relationships']['configurations'],
-                description=cs_doc['description'],
-                aggregated_info=cs_doc['aggregated_info']
-            )
-        }
+    if login_kwargs is None:
+        login_kwargs = {}
 
+    if isinstance(mongo_login, int):
+        return MongoClient(
+            'localhost', mongo_login, *login_args, **login_kwargs
+        )
+    else:
+        return MongoClient(mongo_login, *login_args, **login_kwargs)
 
-    def resync_configuration_set(self, cs_id, verbose=False):
-        """
-        Re-synchronizes the configuration set by re-aggregating the information
-        from the configurations.
 
-        Args:
+def _insert_data_writer(database, flush_size=None, flush_bytes=None):
+    """
+    Returns an :class:`_InsertDataWriter` for the collections written to by
+    :meth:`MongoDatabase.insert_data`. Writes are flushed periodically so that
+    memory usage doesn't grow with the number of configurations.
+    """
 
-            cs_id (str):
-                The ID of the configuration set to update
+    return _InsertDataWriter(
+        database, flush_size=flush_size, flush_bytes=flush_bytes
+    )
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
 
-        Returns:
+def _warn_duplicates(nmatched):
+    """Warns about the documents that already existed during an insertion"""
 
-            None; updates the configuration set document in-place
+    for name, label in [
+        (_CONFIGS_COLLECTION, 'configurations'),
+        (_PROPS_COLLECTION, 'properties'),
+        (_PROPSETTINGS_COLLECTION, 'property settings'),
+        ]:
 
-        """
+        nmatch = nmatched.get(name, 0)
+        if nmatch:
+            warnings.warn(
+                '{} duplicate {} detected'.format(nmatch, label)
+            )
 
-        cs_doc = self.configuration_sets.find_one({'_id': cs_id})
 
-        aggregated_info = self.aggregate_configuration_info(
-            cs_doc['relationships']['configurations'], verbose=verbose
-        )
+# The indexes created by MongoDatabase.ensure_indexes(), as lists of
+# (keys, options) for each collection
+_DEFAULT_INDEXES = {
+    _CONFIGS_COLLECTION: [
+        ('relationships.properties', {}),
+        ('relationships.configuration_sets', {}),
+        ('elements', {}),
+        ('labels', {}),
+        ('names', {}),
+        ('nsites', {}),
+        ('chemical_formula_reduced', {}),
+        ('chemical_formula_anonymous', {}),
+        ('chemical_formula_hill', {}),
+    ],
+    _PROPS_COLLECTION: [
+        ('relationships.configurations', {}),
+        ('relationships.datasets', {}),
+        ('relationships.property_settings', {}),
+        ('type', {}),
+        ('methods', {}),
+        ('labels', {}),
+    ],
+    _PROPSETTINGS_COLLECTION: [
+        ('relationships.properties', {}),
+    ],
+    _CONFIGSETS_COLLECTION: [
+        ('relationships.datasets', {}),
+    ],
+    _CONFIGSET_LINKS_COLLECTION: [
+        (
+            [('configuration_set', ASCENDING), ('configuration', ASCENDING)],
+            {'unique': True}
+        ),
+        ('configuration', {}),
+    ],
+    _DATASET_LINKS_COLLECTION: [
+        ([('dataset', ASCENDING), ('property', ASCENDING)], {'unique': True}),
+        ('property', {}),
+    ],
+}
+
+# Representative queries made by MongoDatabase, checked by index_report(), as
+# (collection name, query, sort field, description). The query plans don't
+# depend on whether the placeholder IDs exist.
+_REPORTED_QUERIES = [
+    (
+        _CONFIGS_COLLECTION,
+        {'relationships.configuration_sets': 'CS_ID'},
+        None,
+        'configurations of a configuration set',
+    ),
+    (
+        _CONFIGS_COLLECTION,
+        {'relationships.properties': {'$in': ['PI_ID']}},
+        None,
+        'configurations of properties',
+    ),
+    (
+        _CONFIGS_COLLECTION,
+        {'elements': 'H'},
+        None,
+        'configurations containing an element',
+    ),
+    (
+        _CONFIGS_COLLECTION,
+        {'labels': 'label'},
+        None,
+        'configurations with a label',
+    ),
+    (
+        _CONFIGS_COLLECTION,
+        {'chemical_formula_reduced': 'H2O'},
+        None,
+        'configurations with a chemical formula',
+    ),
+    (
+        _PROPS_COLLECTION,
+        {'relationships.datasets': 'DS_ID'},
+        None,
+        'properties of a dataset',
+    ),
+    (
+        _PROPS_COLLECTION,
+        {'relationships.configurations': {'$in': ['CO_ID']}},
+        None,
+        'properties of configurations',
+    ),
+    (
+        _PROPS_COLLECTION,
+        {'type': 'property-name'},
+        None,
+        'properties of a given type',
+    ),
+    (
+        _PROPS_COLLECTION,
+        {'labels': 'label'},
+        None,
+        'properties with a label',
+    ),
+    (
+        _PROPSETTINGS_COLLECTION,
+        {'relationships.properties': {'$in': ['PI_ID']}},
+        None,
+        'property settings of properties',
+    ),
+    (
+        _CONFIGSETS_COLLECTION,
+        {'relationships.datasets': 'DS_ID'},
+        None,
+        'configuration sets of a dataset',
+    ),
+    (
+        _CONFIGSET_LINKS_COLLECTION,
+        {'configuration_set': 'CS_ID'},
+        'configuration',
+        'linked configurations of a configuration set',
+    ),
+    (
+        _DATASET_LINKS_COLLECTION,
+        {'dataset': 'DS_ID'},
+        'property',
+        'linked properties of a dataset',
+    ),
+]
+
+
+def _has_plan_stage(plan, stage):
+    """
+    Returns True if a query plan returned by :code:`explain` (or any of its
+    input stages) has the given stage
+    """
 
-        self.configuration_sets.update_one(
-            {'_id': cs_id},
-            {'$set': {'aggregated_info': aggregated_info}},
-            upsert=True,
-        )
+    if isinstance(plan, dict):
+        if plan.get('stage') == stage:
+            return True
 
+        return any(_has_plan_stage(v, stage) for v in plan.values())
 
-    def resync_dataset(self, ds_id, verbose=False):
-        """
-        Re-synchronizes the dataset by aggregating all necessary data from
-        properties and configuration sets. Note that this also calls
-        :meth:`colabfit.tools.client.resync_configuration_set`
+    if isinstance(plan, list):
+        return any(_has_plan_stage(v, stage) for v in plan)
 
-        Args:
+    return False
 
-            ds_id (str):
-                The ID of the dataset to update
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
+# The MongoClient of an insertion worker process. Opened once by the pool
+# initializer, and re-used for every chunk processed by the worker.
+_worker_client = None
 
-        Returns:
+def _init_insert_worker(mongo_login, login_args, login_kwargs):
+    global _worker_client
 
-            None; updates the dataset document in-place
-        """
+    _worker_client = _connect(mongo_login, login_args, login_kwargs)
 
-        ds_doc = self.datasets.find_one({'_id': ds_id})
 
-        cs_ids = ds_doc['relationships']['configuration_sets']
-        pr_ids = ds_doc['relationships']['properties']
+def _insert_data_worker(
+    configurations, database_name, property_map, transform, skip_existing,
+    binary_arrays, flush_size, flush_bytes
+    ):
+    """
+    Inserts a chunk of configurations using the worker's MongoClient. Returns
+    the list of (configuration ID, property ID) pairs and the number of
+    matched documents for each collection.
+    """
 
-        for csid in cs_ids:
-            self.resync_configuration_set(csid, verbose=verbose)
+    database = _worker_client[database_name]
 
-        aggregated_info = {}
-        for k,v in self.aggregate_configuration_set_info(cs_ids).items():
-            if k == 'labels':
-                k = 'configuration_labels'
-            elif k == 'labels_counts':
-                k = 'configuration_labels_counts'
+    writer = _insert_data_writer(database, flush_size, flush_bytes)
 
-            aggregated_info[k] = v
+    ids = list(MongoDatabase._insert_data_stream(
+        database=database,
+        configurations=configurations,
+        writer=writer,
+        property_map=property_map,
+        transform=transform,
+        skip_existing=skip_existing,
+        binary_arrays=binary_arrays,
+    ))
 
-        for k,v in self.aggregate_property_info(pr_ids, verbose=verbose).items():
-            if k in {
-                'labels', 'labels_counts',
-                'types',  'types_counts',
-                'fields', 'fields_counts'
-                }:
-                k = 'property_' + k
+    writer.flush()
 
-            aggregated_info[k] = v
+    return ids, writer.nmatched
 
-        self.datasets.update_one(
-            {'_id': ds_id},
-            {'$set': {'aggregated_info': aggregated_info}},
-            upsert=True
-        )
 
+# Number of IDs per query when splitting long lists of IDs, and the number of
+# batches that are queried concurrently
+_IN_BATCH_SIZE = 10000
+_IN_NTHREADS = 4
 
-    def aggregate_configuration_info(self, ids, verbose=False):
-        """
-        Gathers the following information from a collection of configurations:
+# The maximum number of configurations fetched by each task of
+# MongoDatabase.get_configurations(parallel=...)
+_PARTITION_SIZE = 1000
 
-        * :code:`nconfigurations`: the total number of configurations
-        * :code:`nsites`: the total number of sites
-        * :code:`nelements`: the total number of unique element types
-        * :code:`elements`: the element types
-        * :code:`individual_elements_ratios`: a set of elements ratios generated
-          by looping over each configuration, extracting its concentration of
-          each element, and adding the tuple of concentrations to the set
-        * :code:`total_elements_ratios`: the ratio of the total count of atoms
-            of each element type over :code:`nsites`
-        * :code:`labels`: the union of all configuration labels
-        * :code:`labels_counts`: the total count of each label
-        * :code:`chemical_formula_reduced`: the set of all reduced chemical
-            formulae
-        * :code:`chemical_formula_anonymous`: the set of all anonymous chemical
-            formulae
-        * :code:`chemical_formula_hill`: the set of all hill chemical formulae
-        * :code:`nperiodic_dimensions`: the set of all numbers of periodic
-            dimensions
-        * :code:`dimension_types`: the set of all periodic boundary choices
+def _in_batches(fxn, ids, batch_size=None, nthreads=None):
+    """
+    Splits :code:`ids` into sorted batches of unique IDs, small enough to be
+    used in :code:`{'$in': batch}` queries, and yields :code:`fxn(batch)` for
+    each batch, in order. The batches are run concurrently on a thread pool,
+    with at most :code:`2*nthreads` results held in memory at a time.
+    """
 
-        Returns:
+    if batch_size is None:
+        batch_size = _IN_BATCH_SIZE
 
-            aggregated_info (dict):
-                All of the aggregated info
+    if nthreads is None:
+        nthreads = _IN_NTHREADS
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
-        """
+    ids = sorted(set(ids))
 
-        aggregated_info = {
-            'nconfigurations': len(ids),
-            'nsites': 0,
-            'nelements': 0,
-            'chemical_systems': set(),
-            'elements': [],
-            'individual_elements_ratios': {},
-            'total_elements_ratios': {},
-            'labels': [],
-            'labels_counts': [],
-            'chemical_formula_reduced': set(),
-            'chemical_formula_anonymous': set(),
-            'chemical_formula_hill': set(),
-            'nperiodic_dimensions': set(),
-            'dimension_types': set(),
-        }
+    batches = (
+        ids[i:i+batch_size] for i in range(0, len(ids), batch_size)
+    )
 
-        for doc in tqdm(
-            self.configurations.find({'_id': {'$in': ids}}),
-            desc='Aggregating configuration info',
-            disable=not verbose,
-            total=len(ids),
-            ):
-            aggregated_info['nsites'] += doc['nsites']
+    if len(ids) <= batch_size:
+        yield from map(fxn, batches)
+        return
 
-            aggregated_info['chemical_systems'].add(''.join(doc['elements']))
+    with ThreadPoolExecutor(nthreads) as executor:
+        pending = deque()
 
-            for e, er in zip(doc['elements'], doc['elements_ratios']):
-                if e not in aggregated_info['elements']:
-                    aggregated_info['nelements'] += 1
-                    aggregated_info['elements'].append(e)
-                    aggregated_info['total_elements_ratios'][e] = er*doc['nsites']
-                    aggregated_info['individual_elements_ratios'][e] = set(
-                        [np.round_(er, decimals=2)]
-                    )
-                else:
-                    aggregated_info['total_elements_ratios'][e] += er*doc['nsites']
-                    aggregated_info['individual_elements_ratios'][e].add(
-                        np.round_(er, decimals=2)
-                    )
+        for batch in batches:
+            pending.append(executor.submit(fxn, batch))
 
-            for l in doc['labels']:
-                if l not in aggregated_info['labels']:
-                    aggregated_info['labels'].append(l)
-                    aggregated_info['labels_counts'].append(1)
-                else:
-                    idx = aggregated_info['labels'].index(l)
-                    aggregated_info['labels_counts'][idx] += 1
+            if len(pending) >= 2*nthreads:
+                yield pending.popleft().result()
 
-            aggregated_info['chemical_formula_reduced'].add(doc['chemical_formula_reduced'])
-            aggregated_info['chemical_formula_anonymous'].add(doc['chemical_formula_anonymous'])
-            aggregated_info['chemical_formula_hill'].add(doc['chemical_formula_hill'])
+        while pending:
+            yield pending.popleft().result()
 
-            aggregated_info['nperiodic_dimensions'].add(doc['nperiodic_dimensions'])
-            aggregated_info['dimension_types'].add(tuple(doc['dimension_types']))
 
-        for e in aggregated_info['elements']:
-            aggregated_info['total_elements_ratios'][e] /= aggregated_info['nsites']
-            aggregated_info['individual_elements_ratios'][e] = list(aggregated_info['individual_elements_ratios'][e])
+def _find_in(
+    collection, ids, query=None, projection=None, field='_id',
+    batch_size=None, nthreads=None
+    ):
+    """
+    Yields the documents of :code:`collection` matching :code:`query` whose
+    :code:`field` is one of :code:`ids`, using :func:`_in_batches`. The
+    documents are sorted by ID within each batch, so that they are sorted by
+    ID overall if :code:`field` is :code:`'_id'`. Documents matching multiple
+    batches are only returned once.
+    """
 
-        aggregated_info['chemical_systems'] = list(aggregated_info['chemical_systems'])
+    if query is None:
+        query = {}
 
-        aggregated_info['chemical_formula_reduced'] = list(aggregated_info['chemical_formula_reduced'])
-        aggregated_info['chemical_formula_anonymous'] = list(aggregated_info['chemical_formula_anonymous'])
-        aggregated_info['chemical_formula_hill'] = list(aggregated_info['chemical_formula_hill'])
-        aggregated_info['nperiodic_dimensions'] = list(aggregated_info['nperiodic_dimensions'])
-        aggregated_info['dimension_types'] = list(aggregated_info['dimension_types'])
+    def find(batch):
+        return sorted(
+            collection.find(
+                {'$and': [query, {field: {'$in': batch}}]}, projection
+            ),
+            key=lambda doc: doc['_id']
+        )
 
-        return aggregated_info
+    docs = itertools.chain.from_iterable(
+        _in_batches(find, ids, batch_size, nthreads)
+    )
 
+    if field == '_id':
+        yield from docs
+        return
 
-    def aggregate_property_info(self, pr_ids, verbose=False):
-        """
-        Aggregates the following information from a list of properties:
+    seen = set()
+    for doc in docs:
+        if doc['_id'] not in seen:
+            seen.add(doc['_id'])
+            yield doc
 
-            * types
-            * labels
-            * labels_counts
 
-        Args:
+def _nrows_expression(field, unpack_properties=True):
+    """
+    Returns an aggregation expression for the length of the first dimension of
+    the value of :code:`field` (1 for scalars, 0 if missing or null), in either
+    of the array encodings.
+    """
 
-            pr_ids (list or str):
-                The IDs of the configurations to aggregate information from
+    if unpack_properties:
+        value = {'$ifNull': ['$'+field+'.source-value', '$'+field]}
+    else:
+        value = '$'+field
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
+    return {'$let': {
+        'vars': {'v': value},
+        'in': {'$switch': {
+            'branches': [
+                {
+                    'case': {'$eq': [{'$ifNull': ['$$v', None]}, None]},
+                    'then': 0
+                },
+                {
+                    'case': {'$isArray': '$$v'},
+                    'then': {'$size': '$$v'}
+                },
+                {
+                    'case': {'$isArray': '$$v.shape'},
+                    'then': {'$ifNull': [{'$arrayElemAt': ['$$v.shape', 0]}, 1]}
+                },
+            ],
+            'default': 1,
+        }},
+    }}
 
-        Returns:
 
-            aggregated_info (dict):
-                All of the aggregated info
-        """
+def _get_columnar_data(
+    collection, fields, query, ids=None, unpack_properties=True, verbose=False
+    ):
+    """
+    Loads :code:`fields` of the documents matching :code:`query` (and
+    :code:`ids`, if not None) as a dictionary of RaggedArrays. See the
+    :code:`columnar` argument of :meth:`MongoDatabase.get_data`.
+    """
 
-        if isinstance(pr_ids, str):
-            pr_ids = [pr_ids]
+    # The total number of rows of each field is computed by the server so
+    # that each buffer can be allocated once, before any data is received
+    group = {'_id': None}
+    for i, k in enumerate(fields):
+        group[f'nrows{i}'] = {'$sum': _nrows_expression(k, unpack_properties)}
 
-        aggregated_info = {
-            'types': [],
-            'types_counts': [],
-            'fields': [],
-            'fields_counts': [],
-            'methods': [],
-            'methods_counts': [],
-            'labels': [],
-            'labels_counts': []
-        }
+    def count_rows(q):
+        for doc in collection.aggregate([{'$match': q}, {'$group': group}]):
+            return [doc[f'nrows{i}'] for i in range(len(fields))]
 
-        ignore_keys = {
-            'property-id', 'property-title', 'property-description', '_id',
-        }
+        return [0]*len(fields)
 
-        for doc in tqdm(
-            self.properties.find({'_id': {'$in': pr_ids}}),
-            desc='Aggregating property info',
-            disable=not verbose,
-            total=len(pr_ids)
-            ):
-            if doc['type'] not in aggregated_info['types']:
-                aggregated_info['types'].append(doc['type'])
-                aggregated_info['types_counts'].append(1)
+    if ids is None:
+        nrows = count_rows(query)
+        cursor = collection.find(query, {k: 1 for k in fields})
+    else:
+        nrows = np.sum(
+            [[0]*len(fields)] + list(_in_batches(
+                lambda batch: count_rows(
+                    {'$and': [query, {'_id': {'$in': batch}}]}
+                ),
+                ids
+            )),
+            axis=0
+        ).tolist()
+        cursor = _find_in(collection, ids, query, {k: 1 for k in fields})
+
+    buffers = {k: None for k in fields}
+    offsets = {k: [0] for k in fields}
+    doc_ids = {k: [] for k in fields}
+
+    for doc in tqdm(cursor, desc='Getting data', disable=not verbose):
+        for k, n in zip(fields, nrows):
+            v = _field_array(doc, k, unpack_properties)
+
+            if v is None:
+                continue
+
+            buf = buffers[k]
+            if buf is None:
+                dtype = object if v.dtype.kind in 'USO' else v.dtype
+                buf = np.empty((n,) + v.shape[1:], dtype=dtype)
             else:
-                idx = aggregated_info['types'].index(doc['type'])
-                aggregated_info['types_counts'][idx] += 1
+                _check_inner_shape(k, buf.shape[1:], v.shape[1:])
+
+                if not np.can_cast(v.dtype, buf.dtype):
+                    # e.g., integers followed by floats
+                    buf = buf.astype(np.result_type(buf.dtype, v.dtype))
 
-            for l in doc[doc['type']]:
-                if l in ignore_keys: continue
+            start = offsets[k][-1]
+            stop = start + v.shape[0]
+
+            # The rows were counted before the data was read, so documents
+            # inserted in the meantime may not fit
+            if stop > buf.shape[0]:
+                grown = np.empty(
+                    (max(stop, 2*buf.shape[0]),) + buf.shape[1:],
+                    dtype=buf.dtype
+                )
+                grown[:start] = buf[:start]
+                buf = grown
+
+            buf[start:stop] = v
+            buffers[k] = buf
+
+            offsets[k].append(stop)
+            doc_ids[k].append(doc['_id'])
+
+    # Documents that were deleted in the meantime leave unused rows
+    return {
+        k: RaggedArray(
+            buffers[k][:offsets[k][-1]] if buffers[k] is not None
+            else np.empty(0),
+            offsets[k],
+            doc_ids[k]
+        )
+        for k in fields
+    }
 
-                l = '.'.join([doc['type'], l])
 
-                if l not in aggregated_info['fields']:
-                    aggregated_info['fields'].append(l)
-                    aggregated_info['fields_counts'].append(1)
-                else:
-                    idx = aggregated_info['fields'].index(l)
-                    aggregated_info['fields_counts'][idx] += 1
+def _check_inner_shape(field, expected, shape):
+    """
+    Raises an error if the shape of the values of :code:`field` in a document
+    (after the first dimension) doesn't match the shape of the previous
+    documents, since they can't be stored in the same RaggedArray.
+    """
 
-            for l in doc['labels']:
-                if l not in aggregated_info['labels']:
-                    aggregated_info['labels'].append(l)
-                    aggregated_info['labels_counts'].append(1)
-                else:
-                    idx = aggregated_info['labels'].index(l)
-                    aggregated_info['labels_counts'][idx] += 1
+    if shape != expected:
+        raise RuntimeError(
+            "The values of '{}' have different shapes after their first "\
+            "dimension ({} and {}), so they can't be loaded as a RaggedArray. "\
+            "Use columnar=False and batch_size=None to load them as separate "\
+            "arrays.".format(field, expected, shape)
+        )
 
 
-            for l in doc['methods']:
-                if l not in aggregated_info['methods']:
-                    aggregated_info['methods'].append(l)
-                    aggregated_info['methods_counts'].append(1)
-                else:
-                    idx = aggregated_info['methods'].index(l)
-                    aggregated_info['methods_counts'][idx] += 1
+def _field_array(doc, field, unpack_properties=True):
+    """
+    Returns the value of :code:`field` (which may contain periods for
+    sub-fields) in :code:`doc` as an array with at least one dimension, or
+    None if the document doesn't have the field.
+    """
 
-        return aggregated_info
+    v = doc
+    for k in field.split('.'):
+        if isinstance(v, dict) and (k in v):
+            v = v[k]
+        else:
+            return None
 
+    if v is None:
+        return None
 
-    def aggregate_configuration_set_info(self, cs_ids, resync=False, verbose=False):
-        """
-        Aggregates the following information from a list of configuration sets:
+    if isinstance(v, dict):
+        if unpack_properties and ('source-value' in v):
+            v = v['source-value']
 
-            * nconfigurations
-            * nsites
-            * chemical_systems
-            * nelements
-            * elements
-            * individual_elements_ratios
-            * total_elements_ratios
-            * labels
-            * labels_counts
-            * chemical_formula_reduced
-            * chemical_formula_anonymous
-            * chemical_formula_hill
-            * nperiodic_dimensions
-            * dimension_types
+    return np.atleast_1d(_decode_arrays(v))
 
-        Args:
 
-            cs_ids (list or str):
-                The IDs of the configurations to aggregate information from
+def _iter_columnar_data(
+    collection, fields, query, ids=None, unpack_properties=True,
+    batch_size=10000, flatten=False, verbose=False
+    ):
+    """
+    Yields the data of :code:`fields` in chunks of at most :code:`batch_size`
+    documents, as dictionaries of RaggedArrays. See the :code:`batch_size`
+    argument of :meth:`MongoDatabase.get_data`. If :code:`flatten` is True,
+    the values of each document are flattened first, so that documents with
+    different shapes can be combined (e.g., for computing statistics).
+    """
 
-            resync (bool, default=False):
-                If True, re-synchronizes each configuration set before
-                aggregating the information.
+    projection = {k: 1 for k in fields}
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
+    if ids is None:
+        # One chunk is received from the server per round trip
+        cursor = collection.find(query, projection).batch_size(batch_size)
+    else:
+        cursor = _find_in(
+            collection, ids, query, projection,
+            batch_size=max(batch_size, _IN_BATCH_SIZE)
+        )
 
-        Returns:
+    cursor = iter(tqdm(cursor, desc='Getting data', disable=not verbose))
 
-            aggregated_info (dict):
-                All of the aggregated info
-        """
+    while True:
+        docs = list(itertools.islice(cursor, batch_size))
 
-        if isinstance(cs_ids, str):
-            cs_ids = [cs_ids]
+        if not docs:
+            return
 
-        if resync:
-            for csid in cs_ids:
-                self.resync_configuration_set(csid, verbose=verbose)
+        chunk = {}
+        for k in fields:
+            values = []
+            doc_ids = []
+            for doc in docs:
+                v = _field_array(doc, k, unpack_properties)
 
-        co_ids = list(set(itertools.chain.from_iterable(
-            cs_doc['relationships']['configurations'] for cs_doc in
-            self.configuration_sets.find({'_id': {'$in': cs_ids}})
-        )))
+                if v is None:
+                    continue
 
-        return self.aggregate_configuration_info(co_ids, verbose=verbose)
+                if flatten:
+                    v = v.ravel()
+                elif values:
+                    _check_inner_shape(k, values[0].shape[1:], v.shape[1:])
 
+                values.append(v)
+                doc_ids.append(doc['_id'])
 
-    def insert_dataset(
-        self, cs_ids, pr_ids, name,
-        authors=None,
-        links=None,
-        description='',
-        resync=False,
-        verbose=False,
-        ):
-        """
-        Inserts a dataset into the database.
+            chunk[k] = RaggedArray.from_arrays(values, doc_ids)
 
-        Args:
+        yield chunk
 
-            cs_ids (list or str):
-                The IDs of the configuration sets to link to the dataset.
 
-            pr_ids (list or str):
-                The IDs of the properties to link to the dataset
+def _update_in_batches(collection, ids, update, desc=None, verbose=False):
+    """
+    Applies :code:`update` to the documents of :code:`collection` with IDs in
+    :code:`ids`, using one :code:`update_many` per batch of IDs (see
+    :func:`_in_batches`). Warns if some of the documents don't exist. Returns
+    the number of modified documents.
+    """
 
-            name (str):
-                The name of the dataset
+    nmatched = 0
+    nmodified = 0
 
-            authors (list or str or None):
-                The names of the authors of the dataset. If None, then no
-                authors are added.
+    with tqdm(total=len(ids), desc=desc, disable=not verbose) as pbar:
+        for batch_size, result in _in_batches(
+            lambda batch: (
+                len(batch),
+                collection.update_many({'_id': {'$in': batch}}, update)
+            ),
+            ids
+            ):
+            nmatched += result.matched_count
+            nmodified += result.modified_count
 
-            links (list or str or None):
-                External links (e.g., journal articles, Git repositories, ...)
-                to be associated with the dataset. If None, then no links are
-                added.
+            pbar.update(batch_size)
+            pbar.set_postfix(modified=nmodified)
 
-            description (str or None):
-                A human-readable description of the dataset. If None, then not
-                description is added.
+    nids = len(set(ids))
+    if nmatched != nids:
+        warnings.warn(
+            "{} IDs passed, but only {} documents exist in the '{}' "\
+            "collection".format(nids, nmatched, collection.name)
+        )
 
-            resync (bool):
-                If True, re-synchronizes the configuration sets and properties
-                before adding to the dataset. Default is False.
+    return nmodified
 
-            verbose (bool, default=False):
-                If True, prints a progress bar
 
-        Returns:
+# Number of configurations checked per query when using skip_existing
+_EXISTING_BATCH_SIZE = 1000
 
-            ds_id (str):
-                The ID of the inserted dataset
-        """
+def _find_existing(database, configurations, transform=None, skip_existing=False):
+    """
+    Applies :code:`transform` to the configurations and yields (configuration,
+    configuration ID, existing properties, membership) tuples. If
+    :code:`skip_existing` is True, the IDs are looked up in batches, and for
+    configurations that are already in the database the existing properties
+    are given as a dictionary of {property type: [property IDs]}. Otherwise
+    the existing properties are always None.
+
+    For configurations that are already in the database and belong to
+    configuration sets, the membership is the stored document with its
+    :code:`labels` and :code:`relationships.configuration_sets`, so that the
+    stored summaries can be updated for any new labels. Otherwise it is None.
+
+    Each batch is looked up with a single query, which is skipped if
+    :code:`skip_existing` is False and there are no configuration sets.
+    """
 
-        if isinstance(cs_ids, str):
-            cs_ids = [cs_ids]
+    configurations = iter(configurations)
 
-        if isinstance(pr_ids, str):
-            pr_ids = [pr_ids]
+    find_members = database[_CONFIGSETS_COLLECTION].find_one(
+        {}, {'_id': 1}
+    ) is not None
 
-        # Remove possible duplicates
-        cs_ids = list(set(cs_ids))
-        pr_ids = list(set(pr_ids))
+    projection = {'labels': 1, 'relationships.configuration_sets': 1}
 
-        # Make sure to only include PRs with COs contained by the given CSs
-        all_co_ids = []
-        for cs_doc in self.configuration_sets.find({'_id': {'$in': cs_ids}}):
-            all_co_ids += cs_doc['relationships']['configurations']
+    if skip_existing:
+        projection['relationships.properties'] = 1
 
-        all_co_ids = list(set(all_co_ids))
+    while True:
+        batch = list(itertools.islice(configurations, _EXISTING_BATCH_SIZE))
 
-        clean_pr_ids = [
-            _['_id'] for _ in self.properties.find(
-                {
-                    '_id': {'$in': pr_ids},
-                    'relationships.configurations': {'$in': all_co_ids},
-                },
-                {'_id'}
-            )
-        ]
+        if not batch:
+            break
 
-        if len(pr_ids) != len(clean_pr_ids):
-            warnings.warn(
-                "{} PR IDs passed to insert_dataset, but only {} point to COs "\
-                "contained by the given CSs".format(
-                    len(pr_ids), len(clean_pr_ids)
-                )
-            )
+        if transform:
+            for atoms in batch:
+                transform(atoms)
 
-        if isinstance(authors, str):
-            authors = [authors]
+        cids = [ID_FORMAT_STRING.format('CO', hash(atoms), 0) for atoms in batch]
 
-        if isinstance(links, str):
-            links = [links]
+        existing = {}
+        members = {}
 
-        ds_hash = sha512()
-        for ci in sorted(cs_ids):
-            ds_hash.update(str(ci).encode('utf-8'))
-        for pi in sorted(clean_pr_ids):
-            ds_hash.update(str(pi).encode('utf-8'))
+        if skip_existing or find_members:
+            query = {'_id': {'$in': cids}}
 
-        ds_hash = int(ds_hash.hexdigest()[:HASH_LENGTH], 16)-HASH_SHIFT
-        ds_id = ID_FORMAT_STRING.format('DS', ds_hash, 0)
+            if not skip_existing:
+                query['relationships.configuration_sets.0'] = {'$exists': True}
 
-        # Check for duplicates
-        if self.datasets.count_documents({'_id': ds_id}):
-            if resync:
-                self.resync_dataset(ds_id)
+            docs = list(database[_CONFIGS_COLLECTION].find(query, projection))
+        else:
+            docs = []
 
-            return ds_id
+        for doc in docs:
+            if doc.get('relationships', {}).get('configuration_sets'):
+                members[doc['_id']] = doc
 
-        aggregated_info = {}
-        for k,v in self.aggregate_configuration_set_info(
-            cs_ids, verbose=verbose).items():
-            if k == 'labels':
-                k = 'configuration_labels'
-            elif k == 'labels_counts':
-                k = 'configuration_labels_counts'
+        if skip_existing:
+            linked_pids = {
+                doc['_id']: doc.get('relationships', {}).get('properties', [])
+                for doc in docs
+            }
 
-            aggregated_info[k] = v
+            types = {
+                doc['_id']: doc['type']
+                for doc in database[_PROPS_COLLECTION].find(
+                    {'_id': {'$in': list(set(itertools.chain.from_iterable(
+                        linked_pids.values()
+                    )))}},
+                    {'type': 1}
+                )
+            }
 
-        for k,v in self.aggregate_property_info(
-            clean_pr_ids, verbose=verbose).items():
-            if k in {
-                'labels', 'labels_counts',
-                'types',  'types_counts',
-                'fields', 'fields_counts'
-                }:
-                k = 'property_' + k
+            for cid, pids in linked_pids.items():
+                existing[cid] = {}
+                for pid in pids:
+                    if pid in types:
+                        existing[cid].setdefault(types[pid], []).append(pid)
 
-            aggregated_info[k] = v
+        for atoms, cid in zip(batch, cids):
+            yield atoms, cid, existing.get(cid), members.get(cid)
 
-        self.datasets.update_one(
-            {'_id': ds_id},
-            {
-                '$addToSet': {
-                    'relationships.configuration_sets': {'$each': cs_ids},
-                    'relationships.properties': {'$each': clean_pr_ids},
-                },
-                '$setOnInsert': {
-                    '_id': ds_id,
-                    'name': name,
-                    'authors': authors,
-                    'links': links,
-                    'description': description,
-                },
-                '$set': {
-                    'aggregated_info': aggregated_info,
-                    'last_modified': datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')
-                },
-            },
-            upsert=True
-        )
 
-        # Add the backwards relationships CS->DS
-        config_set_docs = []
-        for csid in cs_ids:
-            config_set_docs.append(UpdateOne(
-                {'_id': csid},
-                {'$addToSet': {'relationships.datasets': ds_id}}
-            ))
+def _first_appearance_counts(field, unwind=True, by_parent=False):
+    """
+    Returns the stages of an aggregation pipeline that count the occurrences of
+    each value of :code:`field`, sorted by the order in which the values first
+    appear. The input documents must be sorted by ID. If :code:`unwind` is
+    True, :code:`field` is an array which is unwound first; otherwise it
+    should be a scalar, or an already-unwound array with its index in
+    :code:`idx`. If :code:`by_parent` is True, the values are counted
+    separately for each value of the :code:`parent` field, and the group IDs
+    are {'parent': ..., 'value': ...}.
+    """
 
-        self.configuration_sets.bulk_write(config_set_docs)
+    stages = []
 
-        # Add the backwards relationships PR->DS
-        property_docs = []
-        for pid in tqdm(clean_pr_ids, desc='Updating PR->DS relationships'):
-            property_docs.append(UpdateOne(
-                {'_id': pid},
-                {'$addToSet': {'relationships.datasets': ds_id}}
-            ))
+    if unwind:
+        stages.append(
+            {'$unwind': {'path': '$'+field, 'includeArrayIndex': 'idx'}}
+        )
 
-        self.properties.bulk_write(property_docs)
+    if by_parent:
+        group_id = {'parent': '$parent', 'value': '$'+field}
+    else:
+        group_id = '$'+field
 
-        return ds_id
+    stages += [
+        {'$group': {
+            '_id': group_id,
+            'first_doc': {'$first': '$_id'},
+            'first_idx': {'$first': '$idx'},
+            'count': {'$sum': 1},
+        }},
+        {'$sort': {'first_doc': 1, 'first_idx': 1}},
+    ]
 
+    return stages
 
-    def get_dataset(self, ds_id, resync=False, verbose=False):
-        """
-        Returns the dataset with the given ID.
 
-        Args:
+def _summarize_configurations(collection, query, cs_ids=None, weight=None):
+    """
+    Computes the summaries (see :meth:`MongoDatabase.summarize_configurations`)
+    of the configurations matching :code:`query` in a single pass over the
+    configurations. If :code:`cs_ids` is None, returns {None: summary}.
+    Otherwise, each configuration is also counted towards each of the
+    configuration sets in :code:`cs_ids` that it belongs to, and the summary
+    of each configuration set is returned under its ID, next to the summary of
+    all of the matching configurations under None.
+
+    If :code:`weight` is not None, it is an aggregation expression giving a
+    non-negative weight for each configuration, by which all of its counts
+    are multiplied. Configurations with a weight of 0 are skipped.
+    """
 
-            ds_ids (str):
-                The ID of the dataset to return
+    if weight is None:
+        weight = {'$literal': 1}
 
-            resync (bool):
-                If True, re-aggregates the configuration set and property
-                information before returning. Default is False.
+    if cs_ids is None:
+        parent = {'$literal': None}
+    else:
+        parent = {'$concatArrays': [
+            {'$filter': {
+                'input': {'$ifNull': ['$relationships.configuration_sets', []]},
+                'as': 'csid',
+                'cond': {'$in': ['$$csid', cs_ids]},
+            }},
+            {'$literal': [None]},
+        ]}
+
+    counters = [
+        'labels',
+        'chemical_systems',
+        'chemical_formula_reduced',
+        'chemical_formula_anonymous',
+        'chemical_formula_hill',
+        'nperiodic_dimensions',
+        'dimension_types',
+    ]
+
+    # Each configuration is unwound into one document per element, and each
+    # of those into (counter, value) entries, which are grouped by (parent,
+    # counter, value). The configuration-level entries are only emitted for
+    # the first element. The grouped counts are returned through a cursor, so
+    # the result isn't limited by the maximum document size regardless of the
+    # number of distinct values (unlike a $facet, which returns a single
+    # document).
+    element_entries = {'$objectToArray': {
+        'elements': '$elements',
+        'individual_elements_ratios': {
+            'element': '$elements', 'ratio': '$ratio'
+        },
+    }}
+
+    configuration_entries = {'$concatArrays': [
+        {'$objectToArray': dict(
+            {'nconfigurations': None, 'nsites': None},
+            **{k: '$'+k for k in counters if k != 'labels'}
+        )},
+        {'$map': {
+            'input': {'$ifNull': ['$labels', []]},
+            'as': 'label',
+            'in': {'k': 'labels', 'v': '$$label'},
+        }},
+    ]}
+
+    # Elements are weighted by their number of atoms, and the total number of
+    # sites by the number of sites of each configuration
+    entry_weight = {'$multiply': ['$weight', {'$cond': [
+        {'$eq': ['$entries.k', 'elements']},
+        '$element_weight',
+        {'$cond': [{'$eq': ['$entries.k', 'nsites']}, '$nsites', 1]},
+    ]}]}
+
+    # Values are counted in the order in which they first appear when
+    # iterating over the configurations sorted by ID. The positions are never
+    # sent by the server.
+    pipeline = [
+        {'$match': query},
+        {'$sort': {'_id': 1}},
+        {'$project': {
+            'parent': parent,
+            'weight': weight,
+            'nsites': 1,
+            'elements': 1,
+            'elements_ratios': 1,
+            'chemical_systems': '$elements',
+            'labels': 1,
+            'chemical_formula_reduced': 1,
+            'chemical_formula_anonymous': 1,
+            'chemical_formula_hill': 1,
+            'nperiodic_dimensions': 1,
+            'dimension_types': 1,
+        }},
+        {'$match': {'weight': {'$ne': 0}}},
+    ]
+
+    if cs_ids is not None:
+        pipeline.append({'$unwind': '$parent'})
+
+    fields = {
+        k: 1 for k in ['parent', 'weight', 'nsites', 'elements'] + counters
+    }
+
+    pipeline += [
+        {'$unwind': {
+            'path': '$elements',
+            'includeArrayIndex': 'element_idx',
+            'preserveNullAndEmptyArrays': True,
+        }},
+        {'$project': dict(
+            fields,
+            element_idx={'$ifNull': ['$element_idx', 0]},
+            ratio={'$arrayElemAt': [
+                '$elements_ratios', {'$ifNull': ['$element_idx', 0]}
+            ]},
+        )},
+        {'$project': {
+            'parent': 1,
+            'weight': 1,
+            'element_idx': 1,
+            'nsites': 1,
+            'element_weight': {'$multiply': ['$ratio', '$nsites']},
+            'entries': {'$concatArrays': [
+                {'$cond': [
+                    {'$ifNull': ['$elements', False]}, element_entries, []
+                ]},
+                {'$cond': [
+                    {'$eq': ['$element_idx', 0]}, configuration_entries, []
+                ]},
+            ]},
+        }},
+        {'$unwind': {'path': '$entries', 'includeArrayIndex': 'entry_idx'}},
+        {'$group': {
+            '_id': {'parent': '$parent', 'k': '$entries.k', 'v': '$entries.v'},
+            'first_doc': {'$first': '$_id'},
+            'first_element': {'$first': '$element_idx'},
+            'first_entry': {'$first': '$entry_idx'},
+            'count': {'$sum': entry_weight},
+        }},
+        {'$sort': {'first_doc': 1, 'first_element': 1, 'first_entry': 1}},
+    ]
+
+    parents = [None] if cs_ids is None else [None] + list(cs_ids)
+
+    summaries = {
+        p: {
+            'nconfigurations': 0,
+            'nsites': 0,
+            'elements': [],
+            'individual_elements_ratios': [],
+            'chemical_systems': [],
+            'labels': [],
+            'chemical_formula_reduced': [],
+            'chemical_formula_anonymous': [],
+            'chemical_formula_hill': [],
+            'nperiodic_dimensions': [],
+            'dimension_types': [],
+        } for p in parents
+    }
+
+    for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        summary = summaries[doc['_id']['parent']]
+        k, v = doc['_id']['k'], doc['_id'].get('v')
+
+        if k in ('nconfigurations', 'nsites'):
+            summary[k] = doc['count']
+        elif k == 'individual_elements_ratios':
+            # Rounded here to match np.round_ exactly
+            summary[k].append([
+                [v['element'], float(np.round_(v['ratio'], decimals=2))],
+                doc['count']
+            ])
+        elif k == 'chemical_systems':
+            summary[k].append([''.join(v), doc['count']])
+        else:
+            summary[k].append([v, doc['count']])
 
-            verbose (bool, default=True):
-                If True, prints a progress bar. Only used if
-                :code:`resync=False`.
+    # Ratios and chemical systems that are equal after rounding or joining
+    # are merged
+    for summary in summaries.values():
+        for k in ['individual_elements_ratios', 'chemical_systems']:
+            summary[k] = _merge_counts([summary[k]], [1])
 
-        Returns:
+    return summaries
 
-            A dictionary with two keys:
-                'last_modified': a datetime string
-                'dataset': the dataset object
-        """
 
+def _summarize_configurations_worker(database_name, query, cs_ids):
+    """Runs :func:`_summarize_configurations` using the worker's MongoClient"""
 
-        if resync:
-            self.resync_dataset(ds_id, verbose=verbose)
+    return _summarize_configurations(
+        _worker_client[database_name][_CONFIGS_COLLECTION], query, cs_ids
+    )
 
-        ds_doc = self.datasets.find_one({'_id': ds_id})
 
-        return {
-            '_id': ds_id,
-            'last_modified': ds_doc['last_modified'],
-            'dataset': Dataset(
-                configuration_set_ids=ds_doc['relationships']['configuration_sets'],
-                property_ids=ds_doc['relationships']['properties'],
-                name=ds_doc['name'],
-                authors=ds_doc['authors'],
-                links=ds_doc['links'],
-                description=ds_doc['description'],
-                aggregated_info=ds_doc['aggregated_info']
-            )
-        }
+def _id_ranges(collection, query, nranges):
+    """
+    Splits the documents matching :code:`query` into at most :code:`nranges`
+    contiguous ranges of IDs of roughly equal sizes. Returns a list of
+    queries, one for each range.
+    """
 
+    ndocs = collection.count_documents(query)
 
+    bounds = [None]
+    for i in range(1, nranges):
+        doc = next(
+            collection.find(query, {'_id': 1}).sort('_id', 1).skip(
+                i*ndocs//nranges
+            ).limit(1),
+            None
+        )
 
-    def aggregate_dataset_info(self, ds_ids):
-        """
-        Aggregates information from a list of datasets.
+        if doc is not None and doc['_id'] != bounds[-1]:
+            bounds.append(doc['_id'])
 
-        NOTE: this will face all of the same challenges as
-        aggregate_configuration_set_info()
+    bounds.append(None)
 
-            * you need to find the overlap of COs and PRs.
-        """
-        pass
+    queries = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        id_range = {}
+        if lo is not None:
+            id_range['$gte'] = lo
+        if hi is not None:
+            id_range['$lt'] = hi
 
+        if id_range:
+            queries.append({'$and': [query, {'_id': id_range}]})
+        else:
+            queries.append(query)
 
-    def apply_labels(
-        self, dataset_id, collection_name, query, labels, verbose=False
-        ):
-        """
-        Applies the given labels to all objects in the specified collection that
-        match the query and are linked to the given dataset.
+    return queries
 
-        Args:
 
-            dataset_id (str):
-                The ID of the dataset. Used as a safety measure to only update
-                entries for the given dataset.
+def _accumulate_statistics(
+    collection, fields, query, ids, batch_size, sample_size, verbose=False
+    ):
+    """
+    Accumulates the statistics of :code:`fields` over the matching documents
+    in a single pass. Returns a dictionary of field: StreamingStatistics.
+    """
 
-            collection_name (str):
-                One of 'configurations' or 'properties'.
+    accumulators = {
+        f: StreamingStatistics(sample_size=sample_size) for f in fields
+    }
 
-            query (dict):
-                A Mongo-style query for filtering the collection. For
-                example: :code:`query = {'nsites': {'$lt': 100}}`.
+    for chunk in _iter_columnar_data(
+        collection, fields, query, ids=ids, batch_size=batch_size,
+        flatten=True, verbose=verbose
+        ):
+        for f in fields:
+            accumulators[f].update(chunk[f].data)
 
-            labels (set or str):
-                A set of labels to apply to the matching entries.
+    return accumulators
 
-            verbose (bool):
-                If True, prints progress bar.
 
-        Pseudocode:
-            * Get the IDs of the configurations that match the query
-            * Use updateMany to update the MongoDB
-            * Iterate over the HDF5 entries.
-        """
+def _statistics_worker(
+    database_name, fields, query, ids, batch_size, sample_size
+    ):
+    """Runs :func:`_accumulate_statistics` using the worker's MongoClient"""
 
-        dataset = self.get_dataset(dataset_id)['dataset']
+    return _accumulate_statistics(
+        _worker_client[database_name][_PROPS_COLLECTION], fields, query, ids,
+        batch_size, sample_size
+    )
 
-        if collection_name == 'configurations':
-            collection = self.configurations
 
-            cs_ids = dataset.configuration_set_ids
+def _proportional_allocation(populations, size, minimum=2):
+    """
+    Splits a sample of :code:`size` documents between strata. Each non-empty
+    stratum gets at least :code:`minimum` documents (or all of its documents,
+    if it has fewer), so that its variance can be estimated, and the rest of
+    the sample is split in proportion to the remaining documents of each
+    stratum, rounding using the largest remainders. The total can be larger
+    than :code:`size` if there are many small strata.
+    """
 
-            all_co_ids = list(set(itertools.chain.from_iterable(
-                cs_doc['relationships']['configurations'] for cs_doc in
-                self.configuration_sets.find({'_id': {'$in': cs_ids}})
-            )))
+    populations = np.asarray(populations, dtype=np.int64)
 
-            query['_id'] = {'$in': all_co_ids}
-        elif collection_name == 'properties':
-            collection = self.properties
+    sizes = np.minimum(populations, minimum)
+    capacities = populations - sizes
 
-            query['_id'] = {'$in': dataset.property_ids}
-        else:
-            raise RuntimeError(
-                "collection_name must be 'configurations' or 'properties'"
-            )
+    remainder = int(size - sizes.sum())
 
-        if isinstance(labels, str):
-            labels = {labels}
+    if (remainder <= 0) or (capacities.sum() == 0):
+        return sizes
 
-        for doc in tqdm(
-            collection.find(query, {'_id': 1}),
-            desc='Applying configuration labels',
-            disable=not verbose
-            ):
-            doc_id = doc['_id']
+    quotas = remainder*capacities/capacities.sum()
+    extra = np.floor(quotas).astype(np.int64)
 
-            collection.update_one(
-                {'_id': doc_id},
-                {'$addToSet': {'labels': {'$each': list(labels)}}}
-            )
+    remainder = int(remainder - extra.sum())
+    extra[np.argsort(extra - quotas)[:remainder]] += 1
 
+    return sizes + extra
 
-    def plot_histograms(
-        self,
-        fields=None,
-        query=None,
-        ids=None,
-        verbose=False,
-        nbins=100,
-        xscale='linear',
-        yscale='linear',
-        method='matplotlib'
-        ):
-        """
-        Generates histograms of the given fields.
 
-        Args:
+def _sample_strata(collection, query, ids, sample, stratify=None):
+    """
+    Draws a random sample of about :code:`sample` documents from the
+    properties matching :code:`query` (and with IDs in :code:`ids`, if not
+    None), using :code:`$sample` on the server. If :code:`stratify` is not
+    None, the properties are split into strata by the value of that field in
+    their first configuration, and the sample is split between the strata
+    using :func:`_proportional_allocation`, so every stratum is sampled. All
+    of the strata are sampled during the same pass, using :code:`$facet`. If
+    :code:`ids` is not None, the strata of the IDs are looked up in batches
+    and sampled locally instead.
+
+    Returns a list of :code:`(population, sampled_ids)` for each stratum.
+    Since strata may be sampled at different rates, estimates should weight
+    the documents of each stratum by its population divided by its sample
+    size.
+    """
 
-            fields (list or str):
-                The names of the fields to plot
+    if stratify is None:
+        if ids is not None:
+            # Sampling the IDs directly avoids sending them to the server
+            ids = list(set(ids))
+            return [(len(ids), random.sample(ids, min(sample, len(ids))))]
 
-            query (dict, default=None):
-                A Mongo query dictionary. If None, returns the data for all of
-                the documents in the collection.
+        population = collection.count_documents(query)
 
-            ids (list or str):
-                The IDs of the objects to plot the data for
+        if population == 0:
+            return [(0, [])]
 
-            verbose (bool, default=False):
-                If True, prints progress bar
+        return [(population, [
+            doc['_id'] for doc in collection.aggregate([
+                {'$match': query},
+                {'$sample': {'size': sample}},
+                {'$project': {'_id': 1}},
+            ])
+        ])]
+
+    pipeline = [
+        {'$project': {'configuration': {
+            '$arrayElemAt': ['$relationships.configurations', 0]
+        }}},
+        {'$lookup': {
+            'from': _CONFIGS_COLLECTION,
+            'localField': 'configuration',
+            'foreignField': '_id',
+            'as': 'configuration',
+        }},
+        {'$project': {'stratum': {
+            '$arrayElemAt': ['$configuration.' + stratify, 0]
+        }}},
+    ]
+
+    if ids is not None:
+        # The stratum values may be lists or dictionaries, so they are keyed
+        # by their representation
+        members = {}
+        for batch in _aggregate_in(collection, query, list(set(ids)), pipeline):
+            for doc in batch:
+                members.setdefault(repr(doc.get('stratum')), []).append(
+                    doc['_id']
+                )
 
-            nbins (int):
-                Number of bins per histogram
+        members = list(members.values())
 
-            xscale (str):
-                Scaling for x-axes. One of ['linear', 'log'].
+        sizes = _proportional_allocation(
+            [len(m) for m in members],
+            min(sample, sum(len(m) for m in members))
+        )
 
-            yscale (str):
-                Scaling for y-axes. One of ['linear', 'log'].
+        return [
+            (len(m), random.sample(m, int(size)))
+            for m, size in zip(members, sizes)
+        ]
 
-            method (str, default='plotly')
-                Package to use for plotting. 'plotly' or 'matplotlib'.
+    pipeline = [{'$match': query}] + pipeline
 
-        Returns:
-            Returns the figure object.
-        """
-        if fields is None:
-            fields = self.property_fields
-        elif isinstance(fields, str):
-            fields = [fields]
+    strata = [
+        (doc['_id'], doc['count']) for doc in collection.aggregate(
+            pipeline + [{'$group': {'_id': '$stratum', 'count': {'$sum': 1}}}]
+        )
+    ]
+
+    sizes = _proportional_allocation(
+        [count for _, count in strata],
+        min(sample, sum(count for _, count in strata))
+    )
+
+    facets = {
+        str(i): [
+            {'$match': {'stratum': value}},
+            {'$sample': {'size': int(size)}},
+            {'$project': {'_id': 1}},
+        ]
+        for i, ((value, _), size) in enumerate(zip(strata, sizes)) if size > 0
+    }
 
-        nfields = len(fields)
+    if not facets:
+        return [(count, []) for _, count in strata]
 
-        nrows = max(1, int(np.ceil(nfields/3)))
-        if (nrows > 1) or (nfields%3 == 0):
-            ncols = 3
-        else:
-            ncols = nfields%3
+    doc = next(collection.aggregate(pipeline + [{'$facet': facets}]))
 
-        if method == 'plotly':
-            fig = make_subplots(rows=nrows, cols=ncols, subplot_titles=fields)
-        elif method == 'matplotlib':
-            fig, axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(4*ncols, 2*nrows))
-            axes = np.atleast_2d(axes)
-        else:
-            raise RuntimeError('Unsupported plotting method')
+    return [
+        (count, [d['_id'] for d in doc.get(str(i), [])])
+        for i, (_, count) in enumerate(strata)
+    ]
 
-        for i, prop in enumerate(fields):
-            data = self.get_data(
-                'properties', prop,
-                query=query,
-                ids=ids,
-                verbose=verbose,
-                ravel=True
-            )
 
-            c = i % 3
-            r = i // 3
+def _sampled_statistics(
+    collection, fields, strata, batch_size, sample_size, quantiles,
+    verbose=False
+    ):
+    """
+    Computes the statistics of :code:`fields` over sampled documents (see
+    :func:`_sample_strata`), with the standard error of the average of each
+    field. The values of each stratum are weighted by its population divided
+    by its sample size, so the estimates aren't biased towards the strata
+    that were sampled at higher rates. The 'count' is the number of sampled
+    values. Returns a dictionary of field: results, like
+    :meth:`MongoDatabase.get_statistics`.
+    """
 
+    accumulators = {
+        f: StreamingStatistics(sample_size=sample_size) for f in fields
+    }
 
-            if nrows > 1:
+    # The sum and number of values of each sampled document, per stratum
+    clusters = {f: [] for f in fields}
 
-                if method == 'plotly':
-                    fig.add_trace(
-                        go.Histogram(x=data, nbinsx=nbins, name=prop),
-                        row=r+1, col=c+1,
-                    )
-                else:
-                    _ = axes[r][c].hist(data, bins=nbins)
-                    axes[r][c].set_title(prop)
-                    axes[r][c].set_xscale(xscale)
-                    axes[r][c].set_yscale(yscale)
-            else:
-                if method == 'plotly':
-                    fig.add_trace(
-                        go.Histogram(x=data, nbinsx=nbins, name=prop),
-                        row=1, col=c+1,
-                    )
-                else:
-                    _ = axes[0][c].hist(data, bins=nbins)
-                    axes[r][c].set_title(prop)
-                    axes[r][c].set_xscale(xscale)
-                    axes[r][c].set_yscale(yscale)
+    nvalues = {f: 0 for f in fields}
 
-        c += 1
-        while c < ncols:
-            if method == 'matplotlib':
-                axes[r][c].axis('off')
-            c += 1
+    for population, sampled_ids in strata:
+        totals = {f: {} for f in fields}
+        counts = {f: {} for f in fields}
 
-        if method == 'plotly':
-            fig.update_layout(
-                showlegend=True,
-            )
-            fig.update_xaxes(type=xscale)
-            fig.update_yaxes(type=yscale)
-            fig.for_each_annotation(lambda a: a.update(text=""))
-        else:
-            plt.tight_layout()
+        stratum_accumulators = {
+            f: StreamingStatistics(sample_size=sample_size) for f in fields
+        }
 
-        return fig
+        if sampled_ids:
+            for chunk in _iter_columnar_data(
+                collection, fields, {}, ids=sampled_ids,
+                batch_size=batch_size, flatten=True, verbose=verbose
+                ):
+                for f in fields:
+                    data = chunk[f].data
 
+                    if data.shape[0] == 0:
+                        continue
 
-    def get_statistics(
-        self,
-        fields,
-        query=None,
-        ids=None,
-        verbose=False,
-        ):
-        """
-        Queries the database and returns the fields specified by `keys` as a
-        list or an array of values. Returns the results in memory.
+                    stratum_accumulators[f].update(data)
 
-        Example:
+                    row_sums = np.concatenate([
+                        [0.0],
+                        np.cumsum(
+                            data.reshape(data.shape[0], -1).sum(axis=1)
+                        )
+                    ])
+                    row_size = int(np.prod(data.shape[1:]))
 
-        .. code-block:: python
+                    for i, doc_id in enumerate(chunk[f].ids):
+                        start = chunk[f].offsets[i]
+                        stop = chunk[f].offsets[i+1]
 
-            data = database.get_data(
-                collection_name='properties',
-                query={'_id': {'$in': <list_of_property_IDs>}},
-                fields=['property_name_1.energy', 'property_name_1.forces'],
-                cache=True
-            )
+                        totals[f][doc_id] = row_sums[stop] - row_sums[start]
+                        counts[f][doc_id] = (stop - start)*row_size
 
-        Args:
+        for f in fields:
+            if sampled_ids:
+                accumulators[f].merge(
+                    stratum_accumulators[f],
+                    weight=population/len(sampled_ids)
+                )
 
-            collection_name (str):
-                The name of a collection in the database.
+            nvalues[f] += stratum_accumulators[f].n
 
-            fields (list or str):
-                The fields to return from the documents. Sub-fields can be
-                returned by providing names separated by periods ('.')
+            # Sampled documents without the field have no values
+            clusters[f].append((
+                population,
+                [totals[f].get(i, 0.0) for i in sampled_ids],
+                [counts[f].get(i, 0) for i in sampled_ids],
+            ))
 
-            query (dict, default=None):
-                A Mongo query dictionary. If None, returns the data for all of
-                the documents in the collection.
+    retdict = {}
+    for f in fields:
+        retdict[f] = accumulators[f].result(quantiles)
+        retdict[f]['count'] = nvalues[f]
+
+        retdict[f]['sample'] = {
+            'ndocuments': sum(len(ids) for _, ids in strata),
+            'population': sum(population for population, _ in strata),
+            'average_stderr': ratio_standard_error(
+                clusters[f], retdict[f]['average']
+            ),
+        }
 
-            ids (list):
-                The list of IDs to return the data for. If None, returns the
-                data for the entire collection. Note that this information can
-                also be provided using the :code:`query` argument.
+    return retdict
 
-            verbose (bool, default=False):
-                If True, prints a progress bar during data extraction
 
-        Returns:
-            results (dict)::
-                .. code-block:: python
+def _sampled_histograms(
+    collection, fields, strata, nbins, batch_size, verbose=False
+    ):
+    """
+    Estimates the histograms of :code:`fields` from sampled documents (see
+    :func:`_sample_strata`). The counts of each stratum are scaled by its
+    population divided by its sample size.
+    """
 
-                    {
-                        f:  {
-                            'average': np.average(data),
-                            'std': np.std(data),
-                            'min': np.min(data),
-                            'max': np.max(data),
-                            'average_abs': np.average(np.abs(data))
-                        } for f in fields
-                    }
+    sampled_ids = [i for _, ids in strata for i in ids]
 
-        """
+    accumulators = _accumulate_statistics(
+        collection, fields, {}, sampled_ids, batch_size, 0, verbose
+    )
 
-        if isinstance(fields, str):
-            fields = [fields]
+    estimates = {}
+    for f in fields:
+        acc = accumulators[f]
+        hist = StreamingHistogram.from_range(
+            acc.min if acc.n else None, acc.max if acc.n else None, nbins
+        )
 
-        retdict = {}
+        estimates[f] = (
+            np.zeros(hist.counts.shape[0], dtype=np.float64), hist.bin_edges
+        )
 
-        for field in fields:
+    for population, ids in strata:
+        if not ids:
+            continue
 
-            data = self.get_data(
-                'properties', field, query=query, ids=ids,
-                ravel=True, verbose=verbose
-            )
+        histograms = {f: StreamingHistogram(estimates[f][1]) for f in fields}
 
-            retdict[field] = {
-                'average': np.average(data),
-                'std': np.std(data),
-                'min': np.min(data),
-                'max': np.max(data),
-                'average_abs': np.average(np.abs(data)),
-            }
+        for chunk in _iter_columnar_data(
+            collection, fields, {}, ids=ids, batch_size=batch_size,
+            flatten=True, verbose=verbose
+            ):
+            for f in fields:
+                histograms[f].update(chunk[f].data)
 
-        if len(fields) == 1:
-            return retdict[fields[0]]
-        else:
-            return retdict
+        for f in fields:
+            estimates[f][0][:] += histograms[f].counts*population/len(ids)
 
+    return estimates
 
-    def filter_on_configurations(self, ds_id, query, verbose=False):
-        """
-        Searches the configuration sets of a given dataset, and
-        returns configuration sets and properties that have been filtered based
-        on the given criterion.
 
-            * The returned configuration sets will only include configurations that return True for the filter
-            * The returned property IDs will only include properties that point to a configuration that returned True for the filter.
+def _accumulate_distinct(
+    collection, field, query, ids, precision, batch_size, verbose=False
+    ):
+    """
+    Adds the values of :code:`field` in the matching documents to a
+    DistinctCounter. Returns the counter.
+    """
 
-        Args:
+    counter = DistinctCounter(precision=precision)
 
-            ds_id (str):
-                The ID of the dataset to filter
+    if ids is None:
+        cursor = collection.find(query, {field: 1}).batch_size(batch_size)
+    else:
+        cursor = _find_in(collection, ids, query, {field: 1})
 
-            query (dict):
-                A Mongo query that will return the desired objects. Note that
-                the key-value pair :code:`{'_id': {'$in': ...}}` will be
-                included automatically to filter on only the objects that are
-                already linked to the given dataset.
+    cursor = iter(tqdm(cursor, desc='Counting values', disable=not verbose))
 
-            verbose (bool, default=False):
-                If True, prints progress bars
+    keys = field.split('.')
 
-        Returns:
+    def values(docs):
+        for doc in docs:
+            v = doc
+            for k in keys:
+                if isinstance(v, dict) and (k in v):
+                    v = v[k]
+                else:
+                    v = None
+                    break
 
-            configuration_sets (list):
-                A list of configuration sets that have been pruned to only
-                include configurations that satisfy the filter
+            if v is not None:
+                yield _hashable(v)
 
-            property_ids (list):
-                A list of property IDs that satisfy the filter
-        """
+    while True:
+        docs = list(itertools.islice(cursor, batch_size))
 
-        ds_doc = self.datasets.find_one({'_id': ds_id})
+        if not docs:
+            return counter
 
-        configuration_sets = []
-        property_ids = []
+        counter.update(values(docs))
 
-        # Loop over configuration sets
-        cursor = self.configuration_sets.find({
-            '_id': {'$in': ds_doc['relationships']['configuration_sets']}
-            }
-        )
 
-        for cs_doc in tqdm(
-            cursor,
-            desc='Filtering on configuration sets',
-            disable=not verbose
-            ):
+def _distinct_counter_worker(
+    database_name, collection_name, field, query, precision, batch_size
+    ):
+    """Runs :func:`_accumulate_distinct` using the worker's MongoClient"""
 
-            query['_id'] = {'$in': cs_doc['relationships']['configurations']}
+    return _accumulate_distinct(
+        _worker_client[database_name][collection_name], field, query, None,
+        precision, batch_size
+    )
 
-            co_ids = self.get_data('configurations', fields='_id', query=query)
 
-            # Build the filtered configuration sets
-            configuration_sets.append(
-                ConfigurationSet(
-                    configuration_ids=co_ids,
-                    description=cs_doc['description'],
-                    aggregated_info=self.aggregate_configuration_info(
-                        co_ids,
-                        verbose=verbose
-                    )
-                )
-            )
+def _fetch_configurations(
+    database, ids, query, property_ids, attach_properties, attach_settings,
+    property_fields=None, join='lookup', views=False
+    ):
+    """
+    Yields the configurations matching :code:`query` (and with IDs in
+    :code:`ids`, if not None) from a Mongo database, as Configurations or
+    ConfigurationViews. See :meth:`MongoDatabase.get_configurations` for the
+    other arguments.
+    """
 
-        # Now get the corresponding properties
-        property_ids = [_['_id'] for _ in self.properties.filter(
-            {
-            '_id': {'$in': list(itertools.chain.from_iterable(
-                cs.configuration_ids for cs in configuration_sets
-            ))}
-            },
-            {'_id': 1}
-        )]
+    co_projection = {
+        k: 1 for k in [
+            'atomic_numbers', 'positions', 'cell', 'pbc', 'names', 'labels'
+        ]
+    }
 
-        return configuration_sets, property_ids
+    if property_fields is not None:
+        pr_query = {'type': {
+            '$in': list({f.split('.')[0] for f in property_fields})
+        }}
+        pr_projection = {'type': 1, **{f: 1 for f in property_fields}}
 
+        if attach_settings:
+            pr_projection['relationships.property_settings'] = 1
+    else:
+        pr_query = {}
+        pr_projection = None
+
+    if not attach_properties:
+        def fetch(query):
+            return database[_CONFIGS_COLLECTION].find(query, co_projection)
+    elif join == 'client':
+        def fetch(query):
+            cursor = database[_CONFIGS_COLLECTION].find(
+                query, {'relationships.properties': 1, **co_projection}
+            )
 
-    def filter_on_properties(
-        self, ds_id, filter_fxn=None, query=None, fields=None, verbose=False
-        ):
-        """
-        Searches the properties of a given dataset, and returns configuration
-        sets and properties that have been filtered based on the given
-        criterion.
+            # The linked documents are loaded for one batch of
+            # configurations at a time
+            while True:
+                co_docs = list(itertools.islice(cursor, _IN_BATCH_SIZE))
 
-            * The returned configuration sets will only include configurations that are pointed to by a property that returned True for the filter
-            * The returned property IDs will only include properties that returned True for the filter function.
+                if not co_docs:
+                    return
 
-        Example:
+                yield from _join_linked_documents(
+                    database, co_docs, property_ids,
+                    pr_query, pr_projection, attach_settings
+                )
+    elif property_fields is not None:
+        pipeline = [
+            # Only the requested fields are sent back by the lookup, which
+            # can still use the index on _id
+            {'$lookup': {
+                'from': 'properties',
+                'localField': 'relationships.properties',
+                'foreignField': '_id',
+                'pipeline': [
+                    {'$match': pr_query},
+                    {'$project': pr_projection},
+                ],
+                'as': 'linked_properties'
+            }},
+        ]
 
-        .. code-block:: python
+        if property_ids is not None:
+            pipeline.append(
+                {'$match': {'linked_properties._id': {'$in': property_ids}}}
+            )
 
-            configuration_sets, property_ids = database.filter_on_properties(
-                ds_id=...,
-                filter_fxn=lambda x: np.max(np.abs(x[']))
+        if attach_settings:
+            pipeline.append(
+                {'$lookup': {
+                    'from': 'property_settings',
+                    'localField': 'linked_properties.relationships.property_settings',
+                    'foreignField': '_id',
+                    'pipeline': [
+                        {'$project': {'_files': 0, 'relationships': 0}},
+                    ],
+                    'as': 'linked_property_settings'
+                }}
             )
 
-        Args:
+        pipeline.append({'$project': {
+            'linked_properties': 1,
+            'linked_property_settings': 1,
+            **co_projection
+        }})
 
-            ds_id (str):
-                The ID of the dataset to filter
+        def fetch(query):
+            return database[_CONFIGS_COLLECTION].aggregate(
+                [{'$match': query}] + pipeline
+            )
+    else:
+        pipeline = [
+            {'$lookup': {
+                'from': 'properties',
+                'localField': 'relationships.properties',
+                'foreignField': '_id',
+                'as': 'linked_properties'
+            }},
+            # {'$match': {'linked_properties._id': property_match}},
+            # {'$match': {'linked_properties._id': {'$in': property_ids}}},
+        ]
 
-            filter_fxn (callable, default=None):
-                A callable function to use as :code:`filter(filter_fxn, cursor)`
-                where :code:`cursor` is a Mongo cursor over all of the
-                property documents in the given dataset. If
-                :code:`filter_fxn` is None, must specify :code:`query`.
+        if property_ids is not None:
+            pipeline.append(
+                {'$match': {'linked_properties._id': {'$in': property_ids}}}
+            )
 
-            query (dict, default=None):
-                A Mongo query that will return the desired objects. Note that
-                the key-value pair :code:`{'_id': {'$in': ...}}` will be
-                included automatically to filter on only the objects that are
-                already linked to the given dataset.
+        if attach_settings:
+            pipeline.append(
+                {'$lookup': {
+                    'from': 'property_settings',
+                    'localField': 'linked_properties.relationships.property_settings',
+                    'foreignField': '_id',
+                    'as': 'linked_property_settings'
+                }}
+            )
 
-            fields (str or list, default=None):
-                The fields required by :code:`filter_fxn`. Providing the minimum
-                number of necessary fields can improve query performance.
+        def fetch(query):
+            return database[_CONFIGS_COLLECTION].aggregate(
+                [{'$match': query}] + pipeline
+            )
 
-            verbose (bool, default=False):
-                If True, prints progress bars
+    if ids is None:
+        cursor = fetch(query)
+    else:
+        cursor = itertools.chain.from_iterable(_in_batches(
+            lambda batch: sorted(
+                fetch({'$and': [query, {'_id': {'$in': batch}}]}),
+                key=lambda d: d['_id']
+            ),
+            ids
+        ))
 
-        Returns:
+    for co_doc in cursor:
+        # The decoded buffers are wrapped without copying them
+        c = ConfigurationView(
+            numbers=np.asarray(co_doc['atomic_numbers']),
+            positions=_decode_array(co_doc['positions']),
+            cell=_decode_array(co_doc['cell']),
+            pbc=np.asarray(co_doc['pbc'], dtype=bool),
+            info={
+                '_id': co_doc['_id'],
+                ATOMS_NAME_FIELD: co_doc['names'],
+                ATOMS_LABELS_FIELD: co_doc['labels'],
+            }
+        )
 
-            configuration_sets (list):
-                A list of configuration sets that have been pruned to only
-                include configurations that satisfy the filter
+        if attach_properties:
+            n = len(c)
 
-            property_ids (list):
-                A list of property IDs that satisfy the filter
-        """
+            for pr_doc in co_doc['linked_properties']:
+                for field_name, field in pr_doc.get(pr_doc['type'], {}).items():
+                    v = np.atleast_1d(_decode_array(field['source-value']))
 
-        if filter_fxn is None:
-            if query is None:
-                raise RuntimeError(
-                    'filter_fxn and query cannot both be None'
-                )
-            else:
-                filter_fxn = lambda x: True
+                    if (v.dtype == 'O') or v.shape[0] != n:
+                        dct = c.info
+                    else:
+                        dct = c.arrays
 
-        ds_doc = self.datasets.find_one({'_id': ds_id})
+                    field_name = f'{pr_doc["type"]}.{field_name}'
 
-        configuration_sets = []
-        property_ids = []
+                    if field_name in dct:
+                        # Then this is a duplicate property
+                        dct[field_name].append(v)
+                    else:
+                        # Then this is the first time
+                        # the property of this type is being added
+                        dct[field_name] = [v]
 
-        # Filter the properties
-        retfields = {'_id': 1, 'relationships.configurations': 1}
-        if fields is not None:
-            if isinstance(fields, str):
-                fields = [fields]
+            if attach_settings:
+                for ps_doc in co_doc['linked_property_settings']:
+                    for k,v in ps_doc.items():
+                        if k in [
+                            '_id', '_description', '_labels', '_method'
+                            ]:
+                            c.info['_settings.'+k] = v
+                        elif k in ['_files', 'last_modified', 'relationships']:
+                            pass
+                        else:
+                            v = np.atleast_1d(field['source-value'])
 
-            for f in fields:
-                retfields[f] = 1
+                            if (v.dtype == 'O') or v.shape[0] != n:
+                                dct = c.info
+                            else:
+                                dct = c.arrays
 
-        if query is None:
-            query = {}
+                            dct[k] = v
 
-        query['_id'] = {'$in': ds_doc['relationships']['properties']}
+        if views:
+            yield c
+        else:
+            yield c.to_configuration()
 
-        cursor = self.properties.find(query, retfields)
 
-        all_co_ids = []
-        for pr_doc in tqdm(
-            cursor,
-            desc='Filtering on properties',
-            disable=not verbose,
-            ):
-            if filter_fxn(pr_doc):
-                property_ids.append(pr_doc['_id'])
-                all_co_ids.append(pr_doc['relationships']['configurations'])
+def _fetch_configurations_worker(database_name, ids, query, kwargs):
+    """
+    Runs :func:`_fetch_configurations` using the worker's MongoClient, and
+    returns the configurations sorted by ID
+    """
 
-        all_co_ids = list(set(itertools.chain.from_iterable(all_co_ids)))
+    return sorted(
+        _fetch_configurations(
+            _worker_client[database_name], ids, query, **kwargs
+        ),
+        key=lambda c: c.info['_id']
+    )
 
-        # Then filter the configuration sets
-        for cs_doc in self.configuration_sets.find({
-            '_id': {'$in': ds_doc['relationships']['configuration_sets']}
-            }):
 
-            co_ids =list(
-                set(cs_doc['relationships']['configurations']).intersection(
-                    all_co_ids
-                )
-            )
+def _stream_tasks(submit, tasks, max_pending, ordered=True):
+    """
+    Runs each task using :code:`submit(task)`, which must return a
+    :class:`concurrent.futures.Future` of a list, with at most
+    :code:`max_pending` tasks submitted at a time. Yields the items of the
+    results in the order of the tasks if :code:`ordered` is True, or as soon as
+    each task is done otherwise.
+    """
 
-            configuration_sets.append(
-                ConfigurationSet(
-                    configuration_ids=co_ids,
-                    description=cs_doc['description'],
-                    aggregated_info=self.aggregate_configuration_info(
-                        co_ids,
-                        verbose=verbose
-                    )
-                )
-            )
+    tasks = iter(tasks)
+    pending = deque(
+        submit(task) for task in itertools.islice(tasks, max_pending)
+    )
 
-        return configuration_sets, property_ids
+    while pending:
+        if ordered:
+            future = pending.popleft()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = next(f for f in pending if f in done)
+            pending.remove(future)
 
+        for task in itertools.islice(tasks, 1):
+            pending.append(submit(task))
 
-    # def apply_transformation(
-    #     self,
-    #     dataset_id,
-    #     property_ids,
-    #     configuration_ids,
-    #     update_map,
-    #     ):
-    #     """
-    #     This function works by looping over the properties that match the
-    #     provided query and updating them by applying the updated rule. Fields
-    #     from the linked configurations can also be used for the update rule if
-    #     by setting configuration_fields.
+        yield from future.result()
 
-    #     Example:
 
-    #     .. code-block:: python
+def _iter_id_ranges(collection, query, size):
+    """
+    Yields queries for consecutive ranges of IDs that each contain
+    :code:`size` of the documents matching :code:`query` (except the last
+    one). Unlike :func:`_id_ranges`, the ranges are generated lazily by
+    skipping ahead from the previous bound, so the IDs are only scanned once.
+    """
 
-    #         # Convert energies to per-atom values
-    #         database.apply_transformation(
-    #             dataset_id=<dataset_id>,
+    lo = None
+    while True:
+        if lo is None:
+            remaining = query
+        else:
+            remaining = {'$and': [query, {'_id': {'$gte': lo}}]}
 
-    #             query={'_id': <property_ids>},
-    #             update={
-    #                 'property-name.energy':
-    #                 lambda fv, doc: fv/doc['configuration']['nsites']
-    #             }
-    #         )
+        doc = next(
+            collection.find(remaining, {'_id': 1}).sort('_id', 1).skip(
+                size
+            ).limit(1),
+            None
+        )
 
-    #     Args:
+        hi = None if doc is None else doc['_id']
 
-    #         dataset_id (str):
-    #             The ID of the dataset. Used as a safety measure to only update
-    #             entries for the given dataset.
+        id_range = {}
+        if lo is not None:
+            id_range['$gte'] = lo
+        if hi is not None:
+            id_range['$lt'] = hi
 
-    #         property_ids (list or str):
-    #             The IDs of the properties to be updated.
+        if id_range:
+            yield {'$and': [query, {'_id': id_range}]}
+        else:
+            yield query
 
-    #         update_map (dict):
-    #             A dictionary where the keys are the name of a field to update
-    #             (omitting "source-value"), and the values are callable functions
-    #             that take the field value and property document as arguments.
+        if hi is None:
+            return
 
-    #         configuration_ids (list, default=None):
-    #             The IDs of the configurations to use for each property update.
-    #             Must be the same length as :code:`pr_ids`. Note that the fields
-    #             of configuration :code:`co_ids[i]` will be accessible for the
-    #             update command of property :code:`pr_ids[i]` using the
-    #             :code:`configuration.<field>` notation. If None, applies the
-    #             updates to the properties without using any configuration
-    #             fields.
+        lo = hi
 
-    #     Returns:
 
-    #         update_results (dict):
-    #             The results of a Mongo bulkWrite operation
-    #     """
+def _join_linked_documents(
+    database, co_docs, property_ids, pr_query, pr_projection, attach_settings
+    ):
+    """
+    Adds the 'linked_properties' (and 'linked_property_settings', if
+    :code:`attach_settings` is True) of a batch of configuration documents,
+    like the :code:`$lookup` stages in
+    :meth:`MongoDatabase._get_configurations`, but using indexed queries for
+    the linked IDs. If :code:`property_ids` is not None, only configurations
+    linked to at least one of them are returned.
+    """
 
-    #     dataset = self.get_dataset(dataset_id)['dataset']
+    pr_ids = [
+        pid for co_doc in co_docs
+        for pid in co_doc.get('relationships', {}).get('properties', [])
+    ]
 
-    #     pipeline = [
-    #         # Filter on the dataset properties
-    #         {'$match': {'_id': {'$in': dataset.property_ids}}},
-    #         # Filter on the specified properties
-    #         {'$match': {'_id': {'$in': property_ids}}},
-    #     ]
+    pr_docs = {
+        pr_doc['_id']: pr_doc for pr_doc in _find_in(
+            database[_PROPS_COLLECTION], pr_ids, pr_query, pr_projection
+        )
+    }
 
-    #     if configuration_ids:
-    #         # Attach the linked configuration documents
-    #         pipeline.append(
-    #             {'$lookup': {
-    #                 'from': 'configurations',
-    #                 'localField': 'relationships.configurations',
-    #                 'foreignField': '_id',
-    #                 'as': 'configuration'
-    #             }}
-    #         )
-    #         pipeline.append(
-    #             {'$unwind': '$configuration'}
-    #         )
-    #     else:
-    #         configuration_ids = [None]*len(property_ids)
+    if attach_settings:
+        ps_ids = [
+            psid for pr_doc in pr_docs.values()
+            for psid in pr_doc.get('relationships', {}).get(
+                'property_settings', []
+            )
+        ]
 
-    #     pr_to_co_map = {p:c for p,c in zip(property_ids, configuration_ids)}
+        ps_docs = {
+            ps_doc['_id']: ps_doc for ps_doc in _find_in(
+                database[_PROPSETTINGS_COLLECTION], ps_ids,
+                projection={'_files': 0, 'relationships': 0}
+            )
+        }
 
-    #     updates = []
-    #     for pr_doc in self.properties.aggregate(pipeline):
-    #         link_cid = pr_to_co_map[pr_doc['_id']]
+    if property_ids is not None:
+        property_ids = set(property_ids)
 
-    #         # Only perform the operation for the desired configurations
-    #         if (link_cid is None) or (pr_doc['configuration']['_id'] == link_cid):
-    #             for key, fxn in update_map.items():
-    #                 fv = pr_doc
-    #                 missing = False
-    #                 for k in key.split('.'):
-    #                     if k in fv:
-    #                         fv = fv[k]
-    #                     else:
-    #                         # Does not have necessary data
-    #                         missing = True
+    for co_doc in co_docs:
+        linked = [
+            pr_docs[pid]
+            for pid in co_doc.get('relationships', {}).get('properties', [])
+            if pid in pr_docs
+        ]
 
-    #                 if missing: continue
+        if (property_ids is not None) and not any(
+            pr_doc['_id'] in property_ids for pr_doc in linked
+            ):
+            continue
 
-    #                 if isinstance(fv, dict):
-    #                     # Handle case where "source-value" isn't at end of key
-    #                     fv = fv['source-value']
-    #                     key += '.source-value'
+        co_doc['linked_properties'] = linked
 
-    #                 data = fxn(fv, pr_doc)
+        if attach_settings:
+            # Each settings document is only attached once, like $lookup
+            ps_ids = dict.fromkeys(
+                psid for pr_doc in linked
+                for psid in pr_doc.get('relationships', {}).get(
+                    'property_settings', []
+                )
+                if psid in ps_docs
+            )
 
-    #                 if isinstance(data, (np.ndarray, list)):
-    #                     data = np.atleast_1d(data).tolist()
-    #                 elif isinstance(data, (str, bool, int, float)):
-    #                     pass
-    #                 elif np.issubdtype(data.dtype, np.integer):
-    #                     data = int(data)
-    #                 elif np.issubdtype(data.dtype, np.float):
-    #                     data = float(data)
+            co_doc['linked_property_settings'] = [
+                ps_docs[psid] for psid in ps_ids
+            ]
 
-    #                 updates.append(UpdateOne(
-    #                     {'_id': pr_doc['_id']},
-    #                     {'$set': {key: data}}
-    #                 ))
+        yield co_doc
 
-    #     res = self.properties.bulk_write(updates, ordered=False)
-    #     nmatch = res.bulk_api_result['nMatched']
-    #     if nmatch:
-    #         warnings.warn('Modified {} properties'.format(nmatch))
 
-    #     return res
+def _aggregate_in(collection, query, ids, pipeline):
+    """
+    Runs :code:`pipeline` on the documents matching :code:`query` (and with
+    IDs in :code:`ids`, if not None). Yields the list of results for each batch
+    of IDs (see :func:`_in_batches`), or once if :code:`ids` is None.
+    """
 
+    if ids is None:
+        yield list(collection.aggregate([{'$match': query}] + pipeline))
+    else:
+        yield from _in_batches(
+            lambda batch: list(collection.aggregate(
+                [{'$match': {'$and': [query, {'_id': {'$in': batch}}]}}]
+                + pipeline
+            )),
+            ids
+        )
 
-    def dataset_from_markdown(
-        self,
-        html_file_path,
-        generator=False,
-        verbose=False,
-    ):
-        """
-        Loads a Dataset from a markdown file.
 
-        Args:
+def _scalar_field_ranges(collection, fields, query, ids):
+    """
+    Returns a dictionary of field: (min, max) for the property fields where
+    every value is a scalar number, using server-side :code:`$min`/:code:`$max`.
+    The other fields (arrays, binary arrays, strings, or fields without any
+    values) are left out.
+    """
 
-            html_file_path (str):
-                The full path to the markdown file
+    candidates = []
+    for f in fields:
+        key = f + '.source-value'
 
-            generator (bool, default=False):
-                If True, uses a generator when inserting data.
+        # Note that {'$type': 'number'} also matches arrays of numbers
+        non_numeric = {'$or': [
+            {key: {'$type': 'array'}},
+            {key: {'$not': {'$type': 'number'}, '$ne': None}},
+        ]}
 
-            verbose (bool, default=False):
-                If True, prints progress bars
+        if not any(
+            results for results in _aggregate_in(
+                collection, {'$and': [query, non_numeric]}, ids,
+                [{'$limit': 1}, {'$project': {'_id': 1}}]
+            )
+            ):
+            candidates.append(f)
 
-        Returns:
+    if not candidates:
+        return {}
 
-            dataset (Dataset):
-                The Dataset object after adding it to the Database
-        """
+    group = {'_id': None}
+    for i, f in enumerate(candidates):
+        group['min{}'.format(i)] = {'$min': '${}.source-value'.format(f)}
+        group['max{}'.format(i)] = {'$max': '${}.source-value'.format(f)}
 
-        base_path = os.path.split(html_file_path)[0]
+    ranges = {}
+    for results in _aggregate_in(collection, query, ids, [{'$group': group}]):
+        for doc in results:
+            for i, f in enumerate(candidates):
+                lo = doc['min{}'.format(i)]
+                hi = doc['max{}'.format(i)]
 
-        with open(html_file_path, 'r') as f:
-            try:
-                html = markdown.markdown(f.read(), extensions=['tables'])
-            except:
-                raise MarkdownFormatError(
-                    "Markdown file could not be read by markdown.markdown()"
-                )
+                if lo is None:
+                    continue
 
-        # Parse information from markdown file
-        parser = DatasetParser()
-        parser.feed(html)
+                if f in ranges:
+                    lo = min(lo, ranges[f][0])
+                    hi = max(hi, ranges[f][1])
 
-        images = []
-        storage_table = parser.get_data('Storage format')
-        header = storage_table[0]
-        for row in storage_table:
+                ranges[f] = (lo, hi)
 
-            # Check if already exists in Database
-            if row[header.index('Format')] == 'mongo':
-                return self.get_dataset(
-                    row[header.index('File')], resync=True, verbose=verbose
-                )
+    return ranges
 
-            # Else, need to build from scratch
-            try:
-                elements = [l.strip() for l in row[header.index('Elements')].split(',')]
-            except:
-                raise BadTableFormatting(
-                    "Error when parsing 'Elements' column of 'Storage format' table"
-                )
 
-            # Load Configurations
-            images.append(load_data(
-                file_path=os.path.join(base_path, row[header.index('File')][0][1]),
-                file_format=row[header.index('Format')],
-                name_field=row[header.index('Name field')],
-                elements=elements,
-                default_name=parser.data['Name'],
-                verbose=verbose
-            ))
+def _bucket_counts(collection, histograms, query, ids):
+    """
+    Adds the counts of scalar property fields to a dictionary of field:
+    StreamingHistogram, using one :code:`$bucket` per field. All of the fields
+    are binned during the same pass, using :code:`$facet`.
+    """
 
-        images = itertools.chain.from_iterable(images)
+    facets = {}
+    for i, (f, hist) in enumerate(histograms.items()):
+        key = f + '.source-value'
+
+        facets[str(i)] = [
+            {'$match': {key: {'$ne': None}}},
+            {'$bucket': {
+                'groupBy': '$' + key,
+                'boundaries': hist.bin_edges.tolist(),
+                # $bucket excludes the upper boundary, but np.histogram puts
+                # the maximum in the last bin
+                'default': 'upper',
+                'output': {'count': {'$sum': 1}},
+            }},
+        ]
 
-        # Add Property definitions and load property_map
-        property_map = {}
-        for prop in parser.get_data('Properties')[1:]:
-            pid         = prop[0][0]
-            kim_field   = prop[1]
-            ase_field   = prop[2]
-            units       = prop[3]
+    for results in _aggregate_in(collection, query, ids, [{'$facet': facets}]):
+        for doc in results:
+            for i, hist in enumerate(histograms.values()):
+                lower_edges = {
+                    edge: j for j, edge in enumerate(hist.bin_edges[:-1])
+                }
 
-            if units == 'None':
-                units = None
+                for bucket in doc[str(i)]:
+                    if bucket['_id'] == 'upper':
+                        hist.counts[-1] += bucket['count']
+                    else:
+                        hist.counts[lower_edges[bucket['_id']]] += bucket['count']
 
-            # pid, kim_field, ase_field, units = prop
 
+def _hashable(value):
+    """Converts (possibly nested) lists to tuples so they can be dict keys"""
 
-            if pid in KIM_PROPERTIES:
-                pname = definition = pid
-            elif isinstance(pid, tuple):
-                pname = pid[0]
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
 
-                edn_path = os.path.abspath(os.path.join(base_path, pid[1]))
-                definition = kim_edn.load(edn_path)
+    return value
 
-            definition['property-id'] = pname
-            self.insert_property_definition(definition)
 
-            pid_dict = property_map.setdefault(pname, {})
+def _merge_counts(counters, weights):
+    """
+    Merges lists of [value, count] pairs, preserving the order of first
+    appearance. Values whose merged count is no longer positive are dropped.
+    Element totals are floats, so anything below half an atom is treated as
+    zero.
+    """
 
-            if kim_field in pid_dict:
-                raise BadTableFormatting(
-                    "Duplicate property field found"
-                )
+    merged = {}
+    for counter, w in zip(counters, weights):
+        for value, count in counter:
+            key = _hashable(value)
+            if key in merged:
+                merged[key][1] += w*count
+            else:
+                merged[key] = [value, w*count]
 
-            pid_dict[kim_field] = {
-                'field': ase_field,
-                'units': units
-            }
+    return [pair for pair in merged.values() if pair[1] > 0.5]
 
-        # Extract property settings
-        property_settings = {}
-        pso_table = parser.get_data('Property settings')
-        header = pso_table[0]
-        for row in pso_table[1:]:
-            files = []
-            if 'Files' in header:
-                for ftup in row[header.index('Files')]:
-                    # Files will be stored as hyperlink tuples
-                    fpath = os.path.abspath(os.path.join(base_path, ftup[1]))
-                    with open(fpath, 'r') as f:
-                        files.append((
-                            ftup[0],
-                            '\n'.join([_.strip() for _ in f.readlines()])
-                        ))
 
-            property_settings[row[header.index('Property')]] = PropertySettings(
-                method=row[header.index('Method')],
-                description=row[header.index('Description')],
-                labels=[
-                    _.strip() for _ in row[header.index('Labels')].split(',')
-                ] if 'Labels' in header else [],
-                files=files,
+def _apply_label_counts(database, collection_name, new_counts):
+    """
+    Updates the stored summaries and aggregated information of the
+    configuration sets and datasets that contain newly-labeled entries of
+    :code:`collection_name` (see :meth:`MongoDatabase.apply_labels`).
+    :code:`new_counts` is a list of (parent IDs, label, count) tuples, where
+    the parent IDs are the configuration sets (or datasets, for properties)
+    of the counted entries. Configuration sets and datasets without a stored
+    summary are left to be re-synchronized.
+    """
+
+    if not new_counts:
+        return
+
+    configuration_sets = database[_CONFIGSETS_COLLECTION]
+    datasets = database[_DATASETS_COLLECTION]
+
+    if collection_name == 'configurations':
+        cs_deltas = {}
+        for cs_ids, label, count in new_counts:
+            for csid in cs_ids:
+                cs_deltas.setdefault(csid, []).append([label, count])
+
+        cs_datasets = {}
+        for cs_doc in configuration_sets.find(
+            {'_id': {'$in': list(cs_deltas)}},
+            {'aggregated_summary': 1, 'relationships.datasets': 1}
+            ):
+            cs_datasets[cs_doc['_id']] = cs_doc.get(
+                'relationships', {}
+            ).get('datasets', [])
+
+            _merge_stored_summary(
+                configuration_sets, cs_doc,
+                {'labels': cs_deltas[cs_doc['_id']]}, _configuration_info
             )
 
-        ids = list(self.insert_data(
-            images,
-            property_map=property_map,
-            property_settings=property_settings,
-            generator=generator,
-            verbose=verbose,
-        ))
+        ds_deltas = {}
+        for cs_ids, label, count in new_counts:
+            ds_ids = set(itertools.chain.from_iterable(
+                cs_datasets.get(csid, []) for csid in cs_ids
+            ))
 
-        all_co_ids, all_pr_ids = list(zip(*ids))
+            for dsid in ds_ids:
+                ds_deltas.setdefault(dsid, []).append([label, count])
 
-        # Extract configuration sets and trigger CS refresh
-        cs_ids = []
+        ds_deltas = {
+            dsid: {'configurations': {'labels': delta}}
+            for dsid, delta in ds_deltas.items()
+        }
+    else:
+        ds_deltas = {}
+        for ds_ids, label, count in new_counts:
+            for dsid in ds_ids:
+                ds_deltas.setdefault(dsid, []).append([label, count])
+
+        ds_deltas = {
+            dsid: {'properties': {'labels': delta}}
+            for dsid, delta in ds_deltas.items()
+        }
 
-        config_sets = parser.get_data('Configuration sets')
-        header = config_sets[0]
-        for row in config_sets[1:]:
-            query = literal_eval(row[header.index('Query')])
-            query['_id'] = {'$in': all_co_ids}
+    for ds_doc in datasets.find(
+        {'_id': {'$in': list(ds_deltas)}}, {'aggregated_summary': 1}
+        ):
+        _merge_stored_summary(
+            datasets, ds_doc, ds_deltas[ds_doc['_id']], _dataset_info
+        )
 
-            co_ids = self.get_data(
-                'configurations',
-                fields='_id',
-                query=query,
-                ravel=True
-            ).tolist()
 
-            cs_id = self.insert_configuration_set(
-                co_ids,
-                description=row[header.index('Description')],
-                verbose=True
-            )
+def _merge_stored_summary(collection, doc, delta, info):
+    """
+    Merges :code:`delta` into the :code:`aggregated_summary` of :code:`doc`
+    (a document of :code:`collection`), and sets its :code:`aggregated_info`
+    to :code:`info(summary)`. The update only matches if the stored summary
+    hasn't changed since it was read, and is retried with the new summary
+    otherwise, so that concurrent updates (e.g., by insertion workers) aren't
+    lost. Documents without a stored summary are left unchanged.
+    """
 
-            cs_ids.append(cs_id)
+    while (doc is not None) and (doc.get('aggregated_summary') is not None):
+        summary = merge_summaries([doc['aggregated_summary'], delta])
 
-        # Define the Dataset
-        ds_id = self.insert_dataset(
-            cs_ids=cs_ids,
-            pr_ids=all_pr_ids,
-            name='Mo_PRM2019',
-            authors=parser.data['Authors'],
-            links=parser.data['Links'],
-            description=parser.data['Description'],
-            verbose=verbose,
+        res = collection.update_one(
+            {'_id': doc['_id'], 'aggregated_summary': doc['aggregated_summary']},
+            {'$set': {
+                'aggregated_info': info(summary),
+                'aggregated_summary': summary,
+            }}
         )
 
-        # Extract labels and trigger label refresh for configurations
-        labels = parser.get_data('Configuration labels')
-        header = labels[0]
-        for row in labels[1:]:
-            query = literal_eval(row[header.index('Query')])
-            query['_id'] = {'$in': all_co_ids}
+        if res.matched_count:
+            break
 
-            self.apply_labels(
-                dataset_id=ds_id,
-                collection_name='configurations',
-                query=query,
-                labels=[
-                    l.strip() for l in row[header.index('Labels')].split(',')
-                ],
-                verbose=True
-            )
+        doc = collection.find_one({'_id': doc['_id']}, {'aggregated_summary': 1})
 
-        return self.get_dataset(ds_id, resync=True, verbose=verbose)
 
+def merge_summaries(summaries, weights=None):
+    """
+    Merges summaries computed by :meth:`MongoDatabase.summarize_configurations`
+    or :meth:`MongoDatabase.summarize_properties`, or dataset summaries
+    containing both. Summaries of collections that overlap can be corrected
+    by merging the summary of the overlap with a negative weight.
 
-    def dataset_to_markdown(
-        self,
-        ds_id,
-        base_folder,
-        html_file_name,
-        data_file_name,
-        data_format,
-        name_field=ATOMS_NAME_FIELD,
-        histogram_fields=None,
-        yscale='linear',
-        ):
-        """
-        Saves a Dataset and writes a properly formatted markdown file. In the
-        case of a Dataset that has child Dataset objects, each child Dataset
-        is written to a separate sub-folder.
+    Args:
 
-        Args:
+        summaries (list):
+            A list of summaries
 
-            ds_id (str):
-                The ID of the dataset.
+        weights (list, default=None):
+            The weight of each summary. Default is 1 for all.
 
-            base_folder (str):
-                Top-level folder in which to save the markdown and data files
+    Returns:
 
-            html_file_name (str):
-                Name of file to save markdown to
+        summary (dict):
+            The merged summary
+    """
 
-            data_file_name (str):
-                Name of file to save configuration and properties to
+    if weights is None:
+        weights = [1]*len(summaries)
 
-            data_format (str, default='mongo'):
-                Format to use for data file. If 'mongo', does not save the
-                configurations to a new file, and instead adds the ID of the
-                Dataset in the Mongo Database.
+    merged = {}
+    for summary, w in zip(summaries, weights):
+        for k, v in summary.items():
+            merged.setdefault(k, []).append((v, w))
 
-            name_field (str):
-                The name of the field that should be used to generate
-                configuration names
+    for k, values in merged.items():
+        values, ws = zip(*values)
 
-            histogram_fields (list, default=None):
-                The property fields to include in the histogram plot. If None,
-                plots all fields.
+        if isinstance(values[0], dict):
+            merged[k] = merge_summaries(values, ws)
+        elif isinstance(values[0], list):
+            merged[k] = _merge_counts(values, ws)
+        else:
+            merged[k] = sum(w*v for v, w in zip(values, ws))
 
-            yscale (str, default='linear'):
-                Scaling to use for histogram plotting
-        """
+    return merged
 
-        template = \
-"""
-# Summary
-|Chemical systems|Element ratios|# of properties|# of configurations|# of atoms|
-|---|---|---|---|---|
-|{}|{}|{}|{}|{}|
 
-# Name
+def _configuration_info(summary):
+    """
+    Derives the output of :meth:`MongoDatabase.aggregate_configuration_info`
+    from the summary of the configurations.
+    """
 
-{}
+    nsites = summary['nsites']
+
+    individual_elements_ratios = {e: [] for e, _ in summary['elements']}
+    for (e, ratio), _ in summary['individual_elements_ratios']:
+        individual_elements_ratios[e].append(ratio)
+
+    return {
+        'nconfigurations': summary['nconfigurations'],
+        'nsites': nsites,
+        'nelements': len(summary['elements']),
+        'chemical_systems': [v for v, _ in summary['chemical_systems']],
+        'elements': [e for e, _ in summary['elements']],
+        'individual_elements_ratios': individual_elements_ratios,
+        'total_elements_ratios': {
+            e: total/nsites for e, total in summary['elements']
+        },
+        'labels': [v for v, _ in summary['labels']],
+        'labels_counts': [c for _, c in summary['labels']],
+        'chemical_formula_reduced': [
+            v for v, _ in summary['chemical_formula_reduced']
+        ],
+        'chemical_formula_anonymous': [
+            v for v, _ in summary['chemical_formula_anonymous']
+        ],
+        'chemical_formula_hill': [
+            v for v, _ in summary['chemical_formula_hill']
+        ],
+        'nperiodic_dimensions': [
+            v for v, _ in summary['nperiodic_dimensions']
+        ],
+        'dimension_types': [
+            tuple(v) for v, _ in summary['dimension_types']
+        ],
+    }
+
+
+def _property_info(summary):
+    """
+    Derives the output of :meth:`MongoDatabase.aggregate_property_info` from
+    the summary of the properties.
+    """
 
-# Authors
+    aggregated_info = {}
+    for k in ['types', 'fields', 'methods', 'labels']:
+        aggregated_info[k] = [v for v, _ in summary[k]]
+        aggregated_info[k+'_counts'] = [c for _, c in summary[k]]
 
-{}
+    return aggregated_info
 
-# Links
 
-{}
+def _insert_links(collection, owner_field, owner_id, member_field, member_ids):
+    """
+    Inserts one document in a link collection for each of the
+    :code:`member_ids` of :code:`owner_id`. Existing links are left
+    unchanged.
+    """
 
-# Description
+    if not member_ids:
+        return
 
-{}
+    collection.bulk_write(
+        [
+            UpdateOne(
+                {owner_field: owner_id, member_field: mid},
+                {'$setOnInsert': {owner_field: owner_id, member_field: mid}},
+                upsert=True
+            )
+            for mid in member_ids
+        ],
+        ordered=False
+    )
 
-# Storage format
 
-|Elements|File|Format|Name field|
-|---|---|---|---|
-| {} | {} | {} | {} |
+def _dataset_info(summary):
+    """
+    Derives the aggregated information of a dataset from its summary, which
+    contains the summaries of its configurations and of its properties.
+    """
 
-# Properties
+    aggregated_info = {}
+    for k,v in _configuration_info(summary['configurations']).items():
+        if k == 'labels':
+            k = 'configuration_labels'
+        elif k == 'labels_counts':
+            k = 'configuration_labels_counts'
 
-|Property|KIM field|ASE field|Units
-|---|---|---|---|
-{}
+        aggregated_info[k] = v
 
-# Property settings
+    for k,v in _property_info(summary['properties']).items():
+        if k in {
+            'labels', 'labels_counts',
+            'types',  'types_counts',
+            'fields', 'fields_counts'
+            }:
+            k = 'property_' + k
 
-|ID|Method|Description|Labels|Files|
-|---|---|---|---|---|
-{}
+        aggregated_info[k] = v
 
-# Configuration sets
+    return aggregated_info
 
-|ID|Description|# of structures| # of atoms|
-|---|---|---|---|
-{}
 
-# Configuration labels
+def _find_shards(file_path, glob_string=None):
+    """
+    Returns the list of files to be loaded by
+    :meth:`MongoDatabase.insert_data_from_files`. Folders are expanded using
+    :code:`Path(path).rglob(glob_string)`.
+    """
 
-|Labels|Counts|
-|---|---|
-{}
+    if isinstance(file_path, (str, Path)):
+        file_path = [file_path]
 
-# Figures
-![The results of plot_histograms](histograms.png)
-"""
+    files = []
+    for path in file_path:
+        path = Path(path)
 
-        if not os.path.isdir(base_folder):
-            os.mkdir(base_folder)
+        if path.is_dir():
+            if glob_string is None:
+                raise RuntimeError(
+                    "Must provide `glob_string` when loading from a folder"
+                )
 
-        html_file_name = os.path.join(base_folder, html_file_name)
+            files += sorted(path.rglob(glob_string))
+        else:
+            files.append(path)
 
-        dataset = self.get_dataset(ds_id)['dataset']
+    return files
 
-        definition_files = {}
-        for pname in dataset.aggregated_info['property_types']:
-            definition = self.get_property_definition(pname)
 
-            def_fpath = os.path.join(base_folder, f'{pname}.edn')
+def _load_shard(file_index, file_path, load_kwargs):
+    """Loads the configurations from a single file using :meth:`load_data`"""
 
-            json.dump(definition, open(def_fpath, 'w'))
+    load_kwargs = dict(load_kwargs)
+    load_kwargs['default_name'] = '{}_{}'.format(
+        load_kwargs['default_name'], file_index
+    )
 
-            definition_files[pname] = def_fpath
+    return load_data(
+        file_path,
+        generator=True,
+        verbose=False,
+        **load_kwargs,
+    )
 
-        property_map = {}
-        for pr_doc in self.properties.find(
-            {'_id': {'$in': dataset.property_ids}}
-            ):
-            if pr_doc['type'] not in property_map:
-                property_map[pr_doc['type']] = {
-                    f: {
-                        'field': f,
-                        'units': v['source-unit'] if 'source-unit' in v else None
-                    }
-                    for f,v in pr_doc[pr_doc['type']].items()
-                }
 
-        agg_info = dataset.aggregated_info
+def _insert_files_worker(
+    shard, database_name, load_kwargs, property_map, transform,
+    skip_existing, binary_arrays, flush_size, flush_bytes
+    ):
+    """
+    Parses a single file and inserts its configurations using the worker's
+    MongoClient. :code:`shard` is a (file index, file path) tuple. Returns the
+    same as :func:`_insert_data_worker`.
+    """
 
-        # TODO: property settings should populate the MD file table
+    file_index, file_path = shard
 
-        # property_settings = {}
-        # for pso_doc in self.property_settings.find(
-        #     {'relationships.properties': {'$in': dataset.property_ids}}
-        #     ):
-        #     property_settings[pso_doc['_id']] = self.get_property_settings(
-        #         pso_doc['_id']
-        #     )
+    return _insert_data_worker(
+        _load_shard(file_index, file_path, load_kwargs),
+        database_name=database_name,
+        property_map=property_map,
+        transform=transform,
+        skip_existing=skip_existing,
+        binary_arrays=binary_arrays,
+        flush_size=flush_size,
+        flush_bytes=flush_bytes,
+    )
 
-        property_settings = list(
-            self.property_settings.find(
-                {'relationships.properties': {'$in': dataset.property_ids}}
-            )
-        )
 
-        # Build Property Settings table
+def _encode_array(arr, binary=False):
+    """
+    Returns the representation of an array that is stored in a Mongo document.
+    If :code:`binary` is True and the array is numeric, the array is stored as a
+    dictionary with its dtype, shape, and packed data. Otherwise the array is
+    converted to a (nested) list.
+    """
+
+    arr = np.asarray(arr)
+
+    if binary and (arr.dtype.kind in 'biuf'):
+        arr = np.ascontiguousarray(arr)
+
+        return {
+            'dtype': arr.dtype.str,
+            'shape': list(arr.shape),
+            'data': Binary(arr.tobytes()),
+        }
+
+    return arr.tolist()
+
+
+def _convert_array(value, binary):
+    """
+    Returns a stored array re-encoded using :func:`_encode_array`, or None if
+    it is already in the requested format or can't be converted (e.g., scalars
+    and ragged or non-numeric lists).
+    """
+
+    if _is_binary_array(value):
+        return None if binary else _decode_array(value).tolist()
+
+    if (not binary) or (not isinstance(value, list)):
+        return None
 
-        ps_table_lines = {}
-        for ps_doc in property_settings:
-            ps_tup = ('settings', )
-            ps_table.append('| {} | {} | {} | {} | {} |'.format(
-                pso_id,
-                pso.method,
-                pso.description,
-                ', '.join(pso.labels),
-                ', '.join('[{}]({})'.format(f, f) for f in pso.files)
-            ))
+    try:
+        arr = np.asarray(value)
+    except ValueError:
+        # Ragged lists
+        return None
 
+    if arr.dtype.kind not in 'biuf':
+        return None
 
-        for pr_doc in self.properties.aggregate([
-                {'$match': {'$in': dataset.property_ids}},
-                {'$lookup': {
-                    'from': 'property_settings',
-                    'localField': 'relationships.property_settings',
-                    'foreignField': '_id',
-                    'as': 'linked_settings'
-                }},
-            ]):
+    return _encode_array(arr, binary=True)
 
-            for ps_doc in pr_doc['linked_settings']:
-                pass
 
-        # TODO: get the types of the properties linked to the PSs
+def _is_binary_array(value):
+    return (
+        isinstance(value, dict)
+        and (len(value) == 3)
+        and isinstance(value.get('data'), bytes)
+        and ('dtype' in value)
+        and ('shape' in value)
+    )
 
-        configuration_sets = {
-            csid: self.get_configuration_set(csid)['configuration_set']
-            for csid in dataset.configuration_set_ids
-        }
 
-        # Write the markdown file
-        with open(html_file_name, 'w') as html:
+def _decode_array(value):
+    """
+    The inverse of :func:`_encode_array`. Binary arrays are returned as
+    read-only views of the document data (no copies are made); all other
+    values are returned unchanged.
+    """
 
-            formatting_arguments = []
+    if _is_binary_array(value):
+        return np.frombuffer(
+            value['data'], dtype=np.dtype(value['dtype'])
+        ).reshape(value['shape'])
 
-            # Summary
-            formatting_arguments.append(', '.join(agg_info['chemical_systems']))
+    return value
 
-            tmp = []
-            for e, er in agg_info['total_elements_ratios'].items():
-                tmp.append('{} ({:.1f}%)'.format(e, er*100))
 
-            formatting_arguments.append(', '.join(tmp))
+def _decode_arrays(value):
+    """
+    Decodes any binary arrays in a (possibly nested) dictionary, e.g. a full
+    property document. Lists aren't searched.
+    """
 
-            formatting_arguments.append(sum(agg_info['property_types_counts']))
-            formatting_arguments.append(agg_info['nconfigurations'])
-            formatting_arguments.append(agg_info['nsites'])
+    if _is_binary_array(value):
+        return _decode_array(value)
 
-            # Name
-            formatting_arguments.append(dataset.name)
+    if isinstance(value, dict):
+        return {k: _decode_arrays(v) for k, v in value.items()}
 
-            # Authors
-            formatting_arguments.append('\n\n'.join(dataset.authors))
+    return value
 
-            # Links
-            formatting_arguments.append('\n\n'.join(dataset.links))
 
-            # Description
-            formatting_arguments.append(dataset.description)
+class LinkedIDs:
+    """
+    A lazy, read-only collection of the IDs of the members of a configuration
+    set or dataset which uses the link collections (see
+    :code:`link_collections` in :class:`MongoDatabase`). The IDs are fetched
+    from the server in pages sorted by ID, so at most one page is held in
+    memory while iterating.
 
-            # Storage format
-            formatting_arguments.append(', '.join(agg_info['elements']))
+    Attributes:
 
-            if data_format == 'mongo':
-                formatting_arguments.append(ds_id)
-            else:
-                formatting_arguments.append(
-                    '[{}]({})'.format(data_file_name, data_file_name)
-                )
+        page_size (int):
+            The number of IDs fetched per query
+    """
 
-            formatting_arguments.append(data_format)
+    def __init__(
+        self, collection, owner_field, owner_id, member_field, page_size=10000
+        ):
+        self._collection    = collection
+        self._owner_field   = owner_field
+        self._owner_id      = owner_id
+        self._member_field  = member_field
+        self.page_size      = page_size
 
-            formatting_arguments.append(name_field)
 
-            tmp = []
-            for pid, fdict in property_map.items():
-                for f,v in fdict.items():
-                    tmp.append(
-                        '| {} | {} | {} | {}'.format(
-                            '[{}]({})'.format(pid, definition_files[pid]),
-                            f,
-                            v['field'],
-                            v['units']
-                        )
-                    )
+    def __iter__(self):
+        query = {self._owner_field: self._owner_id}
 
-            formatting_arguments.append('\n'.join(tmp))
+        while True:
+            page = [
+                doc[self._member_field] for doc in self._collection.find(
+                    query, {'_id': 0, self._member_field: 1}
+                ).sort(self._member_field, 1).limit(self.page_size)
+            ]
 
-            tmp = []
-            for pso_id, pso in property_settings.items():
-                tmp.append('| {} | {} | {} | {} | {} |'.format(
-                    pso_id,
-                    pso.method,
-                    pso.description,
-                    ', '.join(pso.labels),
-                    ', '.join('[{}]({})'.format(f, f) for f in pso.files)
-                ))
+            yield from page
 
-            formatting_arguments.append('\n'.join(tmp))
+            if len(page) < self.page_size:
+                return
 
-            tmp = []
-            for cs_id, cs in configuration_sets.items():
-                tmp.append('| {} | {} | {} | {} |'.format(
-                    cs_id,
-                    cs.description,
-                    cs.aggregated_info['nconfigurations'],
-                    cs.aggregated_info['nsites']
-                ))
+            # Continue after the last ID instead of skipping, so that each
+            # page is a range scan over the index
+            query = {
+                self._owner_field: self._owner_id,
+                self._member_field: {'$gt': page[-1]},
+            }
 
-            formatting_arguments.append('\n'.join(tmp))
 
-            tmp = []
-            for l, lc in zip(
-                dataset.aggregated_info['configuration_labels'], dataset.aggregated_info['configuration_labels_counts']
-                ):
+    def __len__(self):
+        return self._collection.count_documents(
+            {self._owner_field: self._owner_id}
+        )
 
-                tmp.append('| {} | {} |'.format(l, lc))
 
-            formatting_arguments.append('\n'.join(tmp))
+    def __contains__(self, member_id):
+        return self._collection.count_documents(
+            {self._owner_field: self._owner_id, self._member_field: member_id},
+            limit=1
+        ) > 0
 
-            html.write(template.format(*formatting_arguments))
 
+    def __repr__(self):
+        return 'LinkedIDs({}={})'.format(self._owner_field, self._owner_id)
 
-        # Save figures
-        if histogram_fields is None:
-            histogram_fields = dataset.aggregated_info['property_fields']
 
-        if len(histogram_fields) > 0:
-            fig = self.plot_histograms(
-                histogram_fields,
-                ids=dataset.property_ids,
-                yscale=yscale,
-                method='matplotlib'
-            )
+# Approximate BSON size of a single array entry: a type byte, the array index
+# as a string key, and an 8-byte double
+_BSON_BYTES_PER_VALUE = 16
 
-            plt.savefig(os.path.join(base_folder, 'histograms.png'))
-            plt.close()
+class _BulkWriter:
+    """
+    Buffers update operations for one or more collections, and writes them using
+    unordered :code:`bulk_write` calls whenever the number of buffered
+    operations or their approximate size exceeds the given limits. The number of
+    matched (i.e., already existing) documents is totalled over all writes.
 
-        # Copy any PSO files
-        all_file_names = []
-        for pso_id, pso in property_settings.items():
-            for fi, f in enumerate(pso.files):
-                new_name = os.path.join(
-                    base_folder,
-                    pso_id + '_' + os.path.split(f)[-1]
-                )
-                shutil.copyfile(f, new_name)
+    Note that the buffers of all collections are flushed together, in the order
+    in which the collections were given.
+    """
 
-                all_file_names.append(new_name)
-                pso.files[fi] = new_name
+    def __init__(self, collections, flush_size=None, flush_bytes=None):
+        """
+        Args:
 
-        if data_format == 'xyz':
-            data_format = 'extxyz'
+            collections (dict):
+                key = a name used for :meth:`add`; value = a Mongo collection
 
-        if data_format != 'mongo':
-            data_file_name = os.path.join(base_folder, data_file_name)
+            flush_size (int, default=None):
+                The maximum number of buffered operations. If None, operations
+                are only written when :meth:`flush` is called.
 
-            images = self.get_configurations(
-                ids=list(set(itertools.chain.from_iterable(
-                    cs.configuration_ids for cs in configuration_sets.values()
-                ))),
-                attach_settings=True,
-                attach_properties=True,
-                generator=True,
-            )
+            flush_bytes (int, default=None):
+                The approximate maximum size of the buffered operations. If
+                None, the size is not checked.
+        """
 
-            ase_write(
-                data_file_name,
-                images=images,
-                format=data_format,
-            )
+        self.collections = collections
+        self.flush_size = flush_size
+        self.flush_bytes = flush_bytes
 
+        self.operations = {name: [] for name in collections}
+        self.nmatched = {name: 0 for name in collections}
 
-def load_data(
-    file_path,
-    file_format,
-    name_field,
-    elements,
-    default_name='',
-    labels_field=None,
-    reader=None,
-    glob_string=None,
-    generator=True,
-    verbose=False,
-    **kwargs,
-    ):
-    """
-    Loads a list of Configuration objects.
+        self._ndocs = 0
+        self._nbytes = 0
 
-    Args:
-        file_path (str):
-            Path to the file or folder containing the data
 
-        file_format (str):
-            A string for specifying the type of Converter to use when loading
-            the configurations. Allowed values are 'xyz', 'extxyz', 'cfg', or
-            'folder'.
+    def add(self, name, operation, nvalues=0):
+        """
+        Buffers an operation for the given collection. :code:`nvalues` is the
+        number of array entries in the operation, and is used for estimating
+        its size.
+        """
 
-        name_field (str):
-            Key name to use to access `ase.Atoms.info[<name_field>]` to
-            obtain the name of a configuration one the atoms have been
-            loaded from the data file. Note that if
-            `file_format == 'folder'`, `name_field` will be set to 'name'.
+        self.operations[name].append(operation)
 
-        elements (list):
-            A list of strings of element types
+        self._ndocs += 1
+        self._nbytes += _BSON_BYTES_PER_VALUE*nvalues
 
-        default_name (list):
-            Default name to be used if `name_field==None`.
+        if (self.flush_size is not None) and (self._ndocs >= self.flush_size):
+            self.flush()
+        elif (self.flush_bytes is not None) and (self._nbytes >= self.flush_bytes):
+            self.flush()
 
-        labels_field (str):
-            Key name to use to access `ase.Atoms.info[<labels_field>]` to
-            obtain the labels that should be applied to the configuration. This
-            field should contain a comma-separated list of strings
 
-        reader (callable):
-            An optional function for loading configurations from a file. Only
-            used for `file_format == 'folder'`
+    def flush(self):
+        """Writes all buffered operations to the database"""
 
-        glob_string (str):
-            A string to use with `Path(file_path).rglob(glob_string)` to
-            generate a list of files to be passed to `self.reader`. Only used
-            for `file_format == 'folder'`.
+        for name, collection in self.collections.items():
+            if not self.operations[name]:
+                continue
 
-        generator (bool, default=True):
-            If True, returns a generator of Configurations. If False, returns a
-            list.
+            res = collection.bulk_write(self.operations[name], ordered=False)
+            self.nmatched[name] += res.bulk_api_result['nMatched']
 
-        verbose (bool):
-            If True, prints progress bar.
+            self.operations[name] = []
 
-    All other keyword arguments will be passed with
-    `converter.load(..., **kwargs)`
+        self._ndocs = 0
+        self._nbytes = 0
+
+
+class _InsertDataWriter(_BulkWriter):
+    """
+    A :class:`_BulkWriter` for :meth:`MongoDatabase.insert_data`, which also
+    buffers the labels that are added to configurations that already belong to
+    configuration sets. Before the buffered operations are written, each label
+    is added using :code:`update_many`, only to the configurations that don't
+    have it yet, so that a configuration is only counted once even if it is
+    inserted multiple times or by concurrent writers. The numbers of modified
+    configurations are then used to update the stored summaries of the
+    configuration sets and datasets (see :func:`_apply_label_counts`).
     """
 
-    if file_format == 'folder':
-        if reader is None:
-            raise RuntimeError(
-                "Must provide a `reader` function when `file_format=='folder'`"
-            )
+    def __init__(self, database, flush_size=None, flush_bytes=None):
+        super().__init__(
+            {
+                _CONFIGS_COLLECTION: database[_CONFIGS_COLLECTION],
+                _PROPS_COLLECTION: database[_PROPS_COLLECTION],
+                _PROPSETTINGS_COLLECTION: database[_PROPSETTINGS_COLLECTION],
+            },
+            flush_size=flush_size,
+            flush_bytes=flush_bytes,
+        )
 
-        if glob_string is None:
-            raise RuntimeError(
-                "Must provide `glob_string` when `file_format=='folder'`"
-            )
+        self.database = database
 
+        # {(configuration set IDs, label): [configuration IDs]}
+        self.labels = {}
 
-        converter = FolderConverter(reader)
 
-        results = converter.load(
-            file_path,
-            name_field=name_field,
-            elements=elements,
-            default_name=default_name,
-            labels_field=labels_field,
-            glob_string=glob_string,
-            verbose=verbose,
-            **kwargs,
-        )
+    def add_labels(self, cid, cs_ids, labels):
+        """
+        Buffers labels that are added to the configuration :code:`cid`, which
+        belongs to the configuration sets :code:`cs_ids`
+        """
 
-    elif file_format in ['xyz', 'extxyz', 'cfg']:
-        if file_format in ['xyz', 'extxyz']:
-            converter = EXYZConverter()
-        elif file_format == 'cfg':
-            converter = CFGConverter()
+        cs_ids = tuple(sorted(cs_ids))
 
-        results = converter.load(
-            file_path,
-            name_field=name_field,
-            elements=elements,
-            default_name=default_name,
-            labels_field=labels_field,
-            verbose=verbose,
-        )
-    else:
-        raise RuntimeError(
-            "Invalid `file_format`. Must be one of "\
-                "['xyz', 'extxyz', 'cfg', 'folder']"
-        )
+        for label in labels:
+            self.labels.setdefault((cs_ids, label), []).append(cid)
+
+
+    def flush(self):
+        """
+        Adds the buffered labels and updates the stored summaries, then writes
+        all buffered operations to the database
+        """
+
+        new_counts = []
+        for (cs_ids, label), cids in self.labels.items():
+            res = self.collections[_CONFIGS_COLLECTION].update_many(
+                {'_id': {'$in': cids}, 'labels': {'$ne': label}},
+                {'$addToSet': {'labels': label}}
+            )
+
+            if res.modified_count:
+                new_counts.append((list(cs_ids), label, res.modified_count))
+
+        self.labels = {}
+
+        _apply_label_counts(self.database, 'configurations', new_counts)
+
+        super().flush()
 
-    return results if generator else list(results)
 
 class ConcatenationException(Exception):
     pass
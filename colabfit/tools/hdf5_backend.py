@@ -4,7 +4,6 @@ import warnings
 import datetime
 import numpy as np
 from tqdm import tqdm
-from ase import Atoms
 from copy import deepcopy
 from hashlib import sha512
 
@@ -18,7 +17,7 @@ from colabfit import (
     ATOMS_NAME_FIELD,
     STRING_DTYPE_SPECIFIER
 )
-from colabfit.tools.configuration import Configuration
+from colabfit.tools.configuration import Configuration, ConfigurationView
 from colabfit.tools.property import Property
 from colabfit.tools.property_settings import PropertySettings
 
@@ -1094,7 +1093,7 @@ class HDF5Backend(h5py.File):
         """
         return self.get_configurations([i])[0]
 
-    def get_configurations(self, ids, generator=False, verbose=False):
+    def get_configurations(self, ids, generator=False, views=False, verbose=False):
         """
         A generator that returns in-memory Configuration objects one at a time
         by loading the atomic numbers, positions, cells, and PBCs.
@@ -1111,6 +1110,12 @@ class HDF5Backend(h5py.File):
                 configurations can't all fit in memory at the same time. Default
                 is False.
 
+            views (bool):
+                If True, returns lightweight, read-only
+                :class:`~colabfit.tools.configuration.ConfigurationView`
+                objects instead of building full Configurations. Default is
+                False.
+
             verbose (bool):
                 If True, prints progress bar
 
@@ -1121,12 +1126,14 @@ class HDF5Backend(h5py.File):
         """
 
         if generator:
-            return self._get_configurations_gen(ids, verbose=verbose)
+            return self._get_configurations_gen(
+                ids, views=views, verbose=verbose
+            )
         else:
-            return self._get_configurations(ids, verbose=verbose)
+            return self._get_configurations(ids, views=views, verbose=verbose)
 
 
-    def _get_configurations(self, ids, verbose=False):
+    def _get_configurations(self, ids, views=False, verbose=False):
         if ids == 'all':
             # ids = [
             #     ds.asstr()[0]
@@ -1172,24 +1179,15 @@ class HDF5Backend(h5py.File):
             #     'configurations/last_modified'
             # )[self[f'configurations/last_modified/slices/{co_id}'][()]].asstr()[()]
 
-            atoms = Atoms(
-                symbols=self[f'configurations/atomic_numbers/data/{co_id}'],
-                positions=self[f'configurations/positions/data/{co_id}'],
-                cell=self[f'configurations/cells/data/{co_id}'],
-                pbc=self[f'configurations/pbcs/data/{co_id}'],
-            )
-
-            atoms.info[ATOMS_NAME_FIELD] = set(self[f'configurations/names/data/{co_id}'].asstr()[()])
-            atoms.info[ATOMS_LABELS_FIELD] = set(self[f'configurations/labels/data/{co_id}'].asstr()[()])
-            atoms.info[ATOMS_LAST_MODIFIED_FIELD] = self[f'configurations/last_modified/data/{co_id}'].asstr()[()]
+            view = self._get_configuration_view(co_id)
 
-            configurations.append(Configuration.from_ase(atoms))
+            configurations.append(view if views else view.to_configuration())
 
         return configurations
 
 
 
-    def _get_configurations_gen(self, ids, verbose=False):
+    def _get_configurations_gen(self, ids, views=False, verbose=False):
         if ids == 'all':
             ids = [
                 ds.asstr()[0]
@@ -1231,18 +1229,28 @@ class HDF5Backend(h5py.File):
             #     'configurations/last_modified'
             # )[self[f'configurations/last_modified/slices/{co_id}'][()]].asstr()[()]
 
-            atoms = Atoms(
-                symbols=self[f'configurations/atomic_numbers/data/{co_id}'][()],
-                positions=self[f'configurations/positions/data/{co_id}'][()],
-                cell=self[f'configurations/cells/data/{co_id}'][()],
-                pbc=self[f'configurations/pbcs/data/{co_id}'][()],
-            )
+            view = self._get_configuration_view(co_id)
+
+            yield view if views else view.to_configuration()
 
-            atoms.info[ATOMS_NAME_FIELD] = set(self[f'configurations/names/data/{co_id}'].asstr()[()])
-            atoms.info[ATOMS_LABELS_FIELD] = set(self[f'configurations/labels/data/{co_id}'].asstr()[()])
-            atoms.info[ATOMS_LAST_MODIFIED_FIELD] = self[f'configurations/last_modified/data/{co_id}'].asstr()[()]
 
-            yield Configuration.from_ase(atoms)
+    def _get_configuration_view(self, co_id):
+        """
+        Wraps the arrays read for a configuration in a ConfigurationView,
+        without building an intermediate :code:`ase.Atoms` object
+        """
+
+        return ConfigurationView(
+            numbers=self[f'configurations/atomic_numbers/data/{co_id}'][()],
+            positions=self[f'configurations/positions/data/{co_id}'][()],
+            cell=self[f'configurations/cells/data/{co_id}'][()],
+            pbc=self[f'configurations/pbcs/data/{co_id}'][()],
+            info={
+                ATOMS_NAME_FIELD: set(self[f'configurations/names/data/{co_id}'].asstr()[()]),
+                ATOMS_LABELS_FIELD: set(self[f'configurations/labels/data/{co_id}'].asstr()[()]),
+                ATOMS_LAST_MODIFIED_FIELD: self[f'configurations/last_modified/data/{co_id}'].asstr()[()],
+            }
+        )
 
 
     def concatenate_configurations(self):
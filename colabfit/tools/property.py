@@ -8,14 +8,12 @@ from copy import deepcopy
 from hashlib import sha512
 
 import kim_edn
-from kim_property.instance import check_property_instances
-from kim_property import (
-    kim_property_create,
-    check_instance_optional_key_marked_required_are_present
-)
+from kim_property import kim_property_create
+from kim_property.instance import check_optional_key_source_value_scalar
 
+from kim_property.definition import check_property_definition
 from kim_property.definition import PROPERTY_ID as VALID_KIM_ID
-from kim_property.create import KIM_PROPERTIES
+from kim_property.create import KIM_PROPERTIES, PROPERTY_NAME_TO_PROPERTY_ID
 
 from colabfit import (
     HASH_LENGTH, HASH_SHIFT,
@@ -49,6 +47,289 @@ class MissingPropertyFieldWarning(Warning):
 class InvalidPropertyDefinition(Exception):
     pass
 
+
+# Fields that are required by every KIM Property Definition/Instance, and are
+# therefore not property fields
+_definition_keys = {'property-id', 'property-title', 'property-description'}
+_instance_keys = {'property-id', 'instance-id', 'disclaimer'}
+
+# Compiled templates, keyed by the contents of the definition (see
+# get_property_template())
+_PROPERTY_TEMPLATES = {}
+
+
+class PropertyTemplate:
+    """
+    A PropertyTemplate is a compiled Property Definition. The definition is
+    validated by OpenKIM only once, when the template is built. Afterwards,
+    :meth:`new_instance` returns an empty instance skeleton and
+    :meth:`check_instance` validates a filled-in instance against the
+    pre-computed field specifications, without any file I/O or EDN parsing.
+
+    Templates should be obtained using :func:`get_property_template`, which
+    caches them so that each definition is only compiled once per process.
+
+    Attributes:
+
+        definition (dict):
+            The KIM Property Definition used to build the template. Note that
+            the property ID may have been spoofed (see :attr:`property_id`).
+
+        property_id (str):
+            The property ID used by the instances. Invalid KIM IDs are spoofed
+            as :code:`'tag:@,0000-00-00:property/<property-id>'`.
+
+        fields (dict):
+            key = the name of a field in the definition
+
+            value = a tuple of (scalar, type, ndims, has_unit) used for checking
+            the :code:`'source-value'` and :code:`'source-unit'` of an instance
+
+        required_fields (set):
+            The names of the fields marked as required in the definition
+    """
+
+    def __init__(self, definition):
+        """
+        Args:
+
+            definition (dict or str):
+                A KIM Property Definition, the path to an EDN file containing
+                a definition, or the name of an existing KIM Property Definition
+        """
+
+        if isinstance(definition, dict):
+            dummy_dict = deepcopy(definition)
+        elif isinstance(definition, str):
+            if os.path.isfile(definition):
+                dummy_dict = kim_edn.load(definition)
+            else:
+                # Then this has to be an existing (or added) KIM definition
+                dummy_dict = None
+        else:
+            raise InvalidPropertyDefinition(
+                "Property definition must either be a dictionary or a path to "\
+                "an EDN file"
+            )
+
+        if dummy_dict is None:
+            property_id = PROPERTY_NAME_TO_PROPERTY_ID.get(
+                definition, definition
+            )
+        else:
+            property_id = dummy_dict['property-id']
+
+        # Spoof if necessary
+        if VALID_KIM_ID.match(property_id) is None:
+            # Invalid ID. Try spoofing it
+            property_id = 'tag:@,0000-00-00:property/' + property_id
+
+        if dummy_dict is None:
+            if property_id not in KIM_PROPERTIES:
+                raise InvalidPropertyDefinition(
+                    "Property definition '{}' does not exist".format(
+                        definition
+                    )
+                )
+
+            instance = kim_edn.loads(kim_property_create(
+                instance_id=1,
+                property_name=property_id,
+            ))[0]
+
+            self.definition = KIM_PROPERTIES[property_id]
+        else:
+            dummy_dict['property-id'] = property_id
+
+            if property_id in KIM_PROPERTIES:
+                # The ID has already been registered, possibly by a different
+                # definition, so this definition is only validated
+                check_property_definition(dummy_dict)
+
+                instance = kim_edn.loads(kim_property_create(
+                    instance_id=1,
+                    property_name=property_id,
+                ))[0]
+            else:
+                # Note that this validates the definition and registers it in
+                # KIM_PROPERTIES
+                with tempfile.NamedTemporaryFile('w') as tmp:
+                    tmp.write(json.dumps(dummy_dict))
+                    tmp.flush()
+
+                    instance = kim_edn.loads(kim_property_create(
+                        instance_id=1,
+                        property_name=tmp.name,
+                    ))[0]
+
+            self.definition = dummy_dict
+
+        self.property_id = property_id
+
+        self._skeleton = instance
+
+        self.fields = {}
+        self.required_fields = set()
+
+        for key, field in self.definition.items():
+            if key in _definition_keys: continue
+
+            self.fields[key] = (
+                len(field['extent']) == 0,
+                field['type'],
+                len(field['extent']),
+                field['has-unit'],
+            )
+
+            if field['required']:
+                self.required_fields.add(key)
+
+
+    def new_instance(self, instance_id=1):
+        """
+        Returns a new, empty property instance dictionary.
+
+        Args:
+
+            instance_id (int):
+                A positive non-zero integer
+        """
+
+        instance = dict(self._skeleton)
+        instance['instance-id'] = instance_id
+
+        return instance
+
+
+    def check_instance(self, instance):
+        """
+        Checks that a filled-in property instance is consistent with the
+        definition. This performs the same checks as
+        :code:`kim_property.check_property_instances`: the number of
+        dimensions (or the type, for scalars) of each field, the presence of
+        units, and the presence of all required fields.
+
+        Args:
+
+            instance (dict):
+                The property instance to check
+
+        Raises:
+
+            PropertyParsingError:
+                If the instance is not consistent with the definition
+        """
+
+        if instance['property-id'] != self.property_id:
+            raise PropertyParsingError(
+                "Instance property-id '{}' does not match the definition "\
+                "property-id '{}'".format(
+                    instance['property-id'], self.property_id
+                )
+            )
+
+        for key, val in instance.items():
+            if key in _instance_keys: continue
+
+            if not isinstance(val, dict) or ('source-value' not in val):
+                raise PropertyParsingError(
+                    "Field '{}' must be a dictionary with a 'source-value' "\
+                    "key".format(key)
+                )
+
+            if key not in self.fields:
+                # Extra fields (e.g. the configuration geometry) aren't checked
+                continue
+
+            scalar, vtype, ndims, has_unit = self.fields[key]
+
+            value = val['source-value']
+
+            if scalar:
+                if not check_optional_key_source_value_scalar(value, vtype):
+                    raise PropertyParsingError(
+                        "Field '{}' should be a single item of type '{}', "\
+                        "but got {}".format(key, vtype, type(value))
+                    )
+            elif _source_value_ndims(value) != ndims:
+                raise PropertyParsingError(
+                    "Field '{}' should have {} dimensions, but got {}".format(
+                        key, ndims, _source_value_ndims(value)
+                    )
+                )
+
+            if has_unit and ('source-unit' not in val):
+                raise PropertyParsingError(
+                    "Field '{}' requires a 'source-unit'".format(key)
+                )
+            elif not has_unit and ('source-unit' in val):
+                raise PropertyParsingError(
+                    "Field '{}' does not have units in the definition, but a "\
+                    "'source-unit' was provided".format(key)
+                )
+
+        missing = self.required_fields - instance.keys()
+        if missing:
+            raise PropertyParsingError(
+                "Required fields {} are missing from the property "\
+                "instance".format(missing)
+            )
+
+
+def get_property_template(definition):
+    """
+    Returns the compiled :class:`PropertyTemplate` for the given definition,
+    building it if it does not exist yet.
+
+    Templates are identified by the contents of the definition, so different
+    definitions with the same property ID get different templates, and an EDN
+    file is compiled again if it has been modified since it was compiled.
+
+    Args:
+
+        definition (dict or str):
+            A KIM Property Definition, the path to an EDN file containing a
+            definition, or the name of an existing KIM Property Definition
+    """
+
+    key = _template_key(definition)
+
+    template = _PROPERTY_TEMPLATES.get(key)
+
+    if template is None:
+        template = PropertyTemplate(definition)
+        _PROPERTY_TEMPLATES[key] = template
+
+    return template
+
+
+def _template_key(definition):
+    """Returns the key of a definition in :code:`_PROPERTY_TEMPLATES`"""
+
+    if isinstance(definition, dict):
+        return json.dumps(definition, sort_keys=True, default=str)
+    elif os.path.isfile(definition):
+        return (os.path.abspath(definition), os.path.getmtime(definition))
+    else:
+        return definition
+
+
+def _source_value_ndims(value):
+    """Counts the nesting depth of a 'source-value' by following the first
+    entry of each level, which avoids walking the whole array"""
+
+    ndims = 0
+    while isinstance(value, list):
+        ndims += 1
+
+        if len(value) == 0:
+            break
+
+        value = value[0]
+
+    return ndims
+
+
 class Property(dict):
     """
     A Property is used to store the results of some kind of calculation or
@@ -134,102 +415,51 @@ class Property(dict):
                 is False
         """
 
-        global KIM_PROPERTIES
-
-        load_from_existing = False
-
-        if isinstance(definition, dict):
-            dummy_dict = deepcopy(definition)
-
-            # Spoof if necessary
-            if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
-                # Invalid ID. Try spoofing it
-                dummy_dict['property-id'] = 'tag:@,0000-00-00:property/'
-                dummy_dict['property-id'] += definition['property-id']
-                # warnings.warn(f"Invalid KIM property-id; Temporarily renaming to {dummy_dict['property-id']}")
+        template = get_property_template(definition)
 
-            load_from_existing = dummy_dict['property-id'] in KIM_PROPERTIES
-            definition_name = dummy_dict['property-id']
+        instance = deepcopy(instance)
+        instance['property-id'] = template.property_id
 
-        elif isinstance(definition, str):
-            if os.path.isfile(definition):
-                dummy_dict = kim_edn.load(definition)
+        template.check_instance(instance)
 
-                # Check if you need to spoof the property ID to trick OpenKIM
-                if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
-                    # Invalid ID. Try spoofing it
-                    dummy_dict['property-id'] = 'tag:@,0000-00-00:property/' + dummy_dict['property-id']
-                    warnings.warn(f"Invalid KIM property-id; Temporarily renaming to {dummy_dict['property-id']}")
+        self._initialize(
+            definition=definition,
+            template=template,
+            instance=instance,
+            configuration_ids=configuration_ids,
+            property_map=property_map,
+            settings=settings,
+            convert_units=convert_units,
+        )
 
-                load_from_existing = dummy_dict['property-id'] in KIM_PROPERTIES
-                definition_name = dummy_dict['property-id']
 
-            else:
-                # Then this has to be an existing (or added) KIM Property Definition
-                load_from_existing = True
+    def _initialize(
+        self,
+        definition,
+        template,
+        instance,
+        configuration_ids,
+        property_map,
+        settings,
+        convert_units,
+        ):
+        """
+        Populates the attributes of a Property from an instance that has
+        already been checked against its template. The instance is used as-is,
+        without being copied.
+        """
 
-                # It may have been added previously, but spoofed
-                if VALID_KIM_ID.match(definition) is None:
-                    # Invalid ID. Try spoofing it
-                    definition_name = 'tag:@,0000-00-00:property/' + definition
+        if isinstance(definition, dict):
+            self.definition = definition
         else:
-            raise InvalidPropertyDefinition(
-                "Property definition must either be a dictionary or a path to "\
-                "an EDN file"
-            )
+            self.definition = template.definition
 
-        self.definition = definition
         self.name = self.definition['property-id']
 
-        # if load_from_existing:
-        #     instance = kim_edn.loads(kim_property_create(
-        #         instance_id=instance_id,
-        #         property_name=definition,
-        #     ))[0]
-        # else:
-        #     with tempfile.NamedTemporaryFile('w') as tmp:
-        #         tmp.write(json.dumps(dummy_dict))
-        #         tmp.flush()
-
-        #         instance = kim_edn.loads(kim_property_create(
-        #             instance_id=instance_id,
-        #             property_name=tmp.name,
-        #         ))[0]
-
-        # if instance is None:
-        #     self.instance = kim_edn.loads(kim_property_create(
-        #         instance_id=instance_id,
-        #         property_name=self.name
-        #     ))[0]
-        # else:
-        #     # if name != PROPERTY_ID_TO_PROPERTY_NAME[edn['property-id']]:
-        #     #     raise RuntimeError(
-        #     #         "`name` does not match `edn['property_name']`"
-        #     #     )
-
-        self.instance = instance
-        self.instance['property-id'] = definition_name
-
-        check_instance_optional_key_marked_required_are_present(
-            self.instance,
-            self.definition,
-            # KIM_PROPERTIES[self.instance['property-id']]
-        )
-
-        if load_from_existing:
-            check_property_instances(
-                self.instance,
-                fp_path=KIM_PROPERTIES
-            )
-        else:
-            with tempfile.NamedTemporaryFile('w') as tmp:
-                tmp.write(json.dumps(dummy_dict))
-                tmp.flush()
-
-                check_property_instances(
-                    self.instance,
-                    fp=tmp.name
-                )
+        self._instance = instance
+        self._property_fields = [
+            key for key in instance if key not in _ignored_fields
+        ]
 
         if property_map is not None:
             self.property_map = dict(property_map)
@@ -312,64 +542,11 @@ class Property(dict):
 
         """
 
-        global KIM_PROPERTIES
-
-        load_from_existing = False
-
-        if isinstance(definition, dict):
-            dummy_dict = deepcopy(definition)
+        # Re-uses the compiled definition; no KIM instance creation or
+        # validation from files is needed
+        template = get_property_template(definition)
 
-            # Spoof if necessary
-            if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
-                # Invalid ID. Try spoofing it
-                dummy_dict['property-id'] = 'tag:@,0000-00-00:property/'
-                dummy_dict['property-id'] += definition['property-id']
-                # warnings.warn(f"Invalid KIM property-id; Temporarily renaming to {dummy_dict['property-id']}")
-
-            load_from_existing = dummy_dict['property-id'] in KIM_PROPERTIES
-            definition_name = dummy_dict['property-id']
-
-        elif isinstance(definition, str):
-            if os.path.isfile(definition):
-                dummy_dict = kim_edn.load(definition)
-
-                # Check if you need to spoof the property ID to trick OpenKIM
-                if VALID_KIM_ID.match(dummy_dict['property-id']) is None:
-                    # Invalid ID. Try spoofing it
-                    dummy_dict['property-id'] = 'tag:@,0000-00-00:property/' + dummy_dict['property-id']
-                    warnings.warn(f"Invalid KIM property-id; Temporarily renaming to {dummy_dict['property-id']}")
-
-                load_from_existing = dummy_dict['property-id'] in KIM_PROPERTIES
-                definition_name = dummy_dict['property-id']
-
-            else:
-                # Then this has to be an existing (or added) KIM Property Definition
-                load_from_existing = True
-
-                # It may have been added previously, but spoofed
-                if VALID_KIM_ID.match(definition) is None:
-                    # Invalid ID. Try spoofing it
-                    definition_name = 'tag:@,0000-00-00:property/' + definition
-        else:
-            raise InvalidPropertyDefinition(
-                "Property definition must either be a dictionary or a path to "\
-                "an EDN file"
-            )
-
-        if load_from_existing:
-            instance = kim_edn.loads(kim_property_create(
-                instance_id=instance_id,
-                property_name=definition_name,
-            ))[0]
-        else:
-            with tempfile.NamedTemporaryFile('w') as tmp:
-                tmp.write(json.dumps(dummy_dict))
-                tmp.flush()
-
-                instance = kim_edn.loads(kim_property_create(
-                    instance_id=instance_id,
-                    property_name=tmp.name,
-                ))[0]
+        instance = template.new_instance(instance_id=instance_id)
 
         update_edn_with_conf(instance, configuration)
 
@@ -391,7 +568,7 @@ class Property(dict):
                 pass
             elif np.issubdtype(data.dtype, np.integer):
                 data = int(data)
-            elif np.issubdtype(data.dtype, np.float):
+            elif np.issubdtype(data.dtype, np.floating):
                 data = float(data)
 
             instance[key] = {
@@ -401,15 +578,22 @@ class Property(dict):
             if (val['units'] != 'None') and (val['units'] is not None):
                 instance[key]['source-unit'] = val['units']
 
-        return cls(
+        template.check_instance(instance)
+
+        prop = cls.__new__(cls)
+
+        prop._initialize(
             definition=definition,
+            template=template,
+            instance=instance,
             configuration_ids=[str(hash(configuration))],
             property_map=property_map,
             settings=settings,
-            instance=instance,
             convert_units=convert_units,
         )
 
+        return prop
+
 
     # @classmethod
     # def Default(
@@ -0,0 +1,156 @@
+import numpy as np
+
+
+class RaggedArray:
+    """
+    A collection of arrays with different lengths along their first dimension
+    (e.g., the forces of configurations with different numbers of atoms),
+    stored as a single flat buffer. The values of the i-th entry are
+    :code:`data[offsets[i]:offsets[i+1]]`.
+
+    Indexing, slicing, and iterating return views into :attr:`data`, so no
+    values are copied.
+
+    Attributes:
+
+        data (np.ndarray):
+            The flat buffer of all of the values, concatenated along the first
+            dimension
+
+        offsets (np.ndarray):
+            An integer array of length :code:`len(self)+1`, where the i-th entry
+            starts at :code:`offsets[i]` in :attr:`data`
+
+        ids (list):
+            The ID of the document that each entry was loaded from
+    """
+
+    def __init__(self, data, offsets, ids=None):
+        self.data       = data
+        self.offsets    = np.asarray(offsets, dtype=np.int64)
+        self.ids        = ids
+
+
+    @classmethod
+    def from_arrays(cls, arrays, ids=None):
+        """
+        Builds a RaggedArray by copying a list of arrays into a new buffer.
+        Scalars are treated as arrays of length 1.
+        """
+
+        arrays = [np.atleast_1d(a) for a in arrays]
+
+        for a in arrays[1:]:
+            if a.shape[1:] != arrays[0].shape[1:]:
+                raise RuntimeError(
+                    'The arrays must have the same shape after their first '\
+                    'dimension, but got {} and {}'.format(
+                        arrays[0].shape[1:], a.shape[1:]
+                    )
+                )
+
+        offsets = np.zeros(len(arrays)+1, dtype=np.int64)
+        np.cumsum([a.shape[0] for a in arrays], out=offsets[1:])
+
+        if arrays:
+            data = np.concatenate(arrays)
+        else:
+            data = np.empty(0)
+
+        return cls(data, offsets, ids)
+
+
+    @property
+    def lengths(self):
+        """The length of each entry"""
+        return np.diff(self.offsets)
+
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+
+    def __getitem__(self, i):
+        """
+        Returns a view of the values of the i-th entry, or a RaggedArray of
+        the entries in a slice (with a step of 1), which shares :attr:`data`.
+        """
+
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+
+            if step != 1:
+                raise IndexError('RaggedArray slices must have a step of 1')
+
+            stop = max(start, stop)
+            offsets = self.offsets[start:stop+1]
+
+            return RaggedArray(
+                self.data[offsets[0]:offsets[-1]],
+                offsets - offsets[0],
+                None if self.ids is None else self.ids[start:stop]
+            )
+
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(
+                'Index {} is out of range for a RaggedArray with {} '\
+                'entries'.format(i, n)
+            )
+
+        if i < 0:
+            i += n
+
+        return self.data[self.offsets[i]:self.offsets[i+1]]
+
+
+    def __iter__(self):
+        for start, stop in zip(self.offsets[:-1], self.offsets[1:]):
+            yield self.data[start:stop]
+
+
+    def to_list(self):
+        """Returns a list of views of each entry"""
+        return list(self)
+
+
+    def padded(self, fill_value=0):
+        """
+        Returns an array of shape :code:`(len(self), max(self.lengths), ...)`.
+        If all of the entries have the same length, this is a view of
+        :attr:`data`. Otherwise, the entries are copied into a new array, and
+        the missing values are set to :code:`fill_value`.
+        """
+
+        lengths = self.lengths
+        n = len(self)
+        inner = self.data.shape[1:]
+
+        if n == 0:
+            return self.data.reshape((0, 0) + inner)
+
+        if np.all(lengths == lengths[0]):
+            return self.data.reshape((n, lengths[0]) + inner)
+
+        padded = np.full(
+            (n, lengths.max()) + inner, fill_value, dtype=self.data.dtype
+        )
+
+        rows = np.repeat(np.arange(n), lengths)
+        cols = np.arange(self.data.shape[0]) - np.repeat(
+            self.offsets[:-1], lengths
+        )
+
+        padded[rows, cols] = self.data
+
+        return padded
+
+
+    def __str__(self):
+        return 'RaggedArray(nentries={}, shape={}, dtype={})'.format(
+            len(self), self.data.shape, self.data.dtype
+        )
+
+
+    def __repr__(self):
+        return str(self)
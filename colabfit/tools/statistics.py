@@ -0,0 +1,391 @@
+import numpy as np
+from hashlib import blake2b
+
+
+class StreamingStatistics:
+    """
+    Accumulates the statistics of a stream of values in a single pass, using
+    constant memory. Accumulators built over different parts of the data can
+    be combined with :meth:`merge`, which gives the same results as
+    accumulating all of the values together, up to floating-point error.
+
+    The mean and variance are accumulated using the pairwise update of Chan et
+    al. (a generalization of Welford's algorithm to batches of values).
+    Quantiles are approximated using a uniform random sample of at most
+    :attr:`sample_size` values, so they are exact if fewer values are seen.
+
+    Attributes:
+
+        n (int):
+            The number of values seen
+
+        mean (float):
+            The mean of the values
+
+        m2 (float):
+            The sum of the squared deviations from the mean
+
+        min (float):
+            The minimum value
+
+        max (float):
+            The maximum value
+
+        sum_abs (float):
+            The sum of the absolute values
+
+        sample_size (int):
+            The maximum size of the sample used for approximating quantiles. If
+            0, no sample is kept.
+    """
+
+    def __init__(self, sample_size=0, seed=None):
+        self.n          = 0
+        self.mean       = 0.0
+        self.m2         = 0.0
+        self.min        = np.inf
+        self.max        = -np.inf
+        self.sum_abs    = 0.0
+
+        self.sample_size    = sample_size
+        self.sample         = np.empty(0)
+        self._rng           = np.random.default_rng(seed)
+
+
+    def update(self, values):
+        """Adds an array of values (of any shape) to the statistics"""
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        if values.shape[0] == 0:
+            return
+
+        other = StreamingStatistics(sample_size=self.sample_size)
+
+        other.n = values.shape[0]
+        other.mean = np.average(values)
+        other.m2 = np.sum((values - other.mean)**2)
+        other.min = np.min(values)
+        other.max = np.max(values)
+        other.sum_abs = np.sum(np.abs(values))
+
+        if self.sample_size > 0:
+            if other.n > self.sample_size:
+                other.sample = self._rng.choice(
+                    values, self.sample_size, replace=False
+                )
+            else:
+                other.sample = values.copy()
+
+        self.merge(other)
+
+
+    def merge(self, other, weight=1):
+        """
+        Adds the statistics accumulated by another accumulator. If
+        :code:`weight` is not 1, each of the values of :code:`other` counts as
+        :code:`weight` values (e.g., when combining strata that were sampled at
+        different rates), so :attr:`n` is the weighted number of values.
+        """
+
+        if other.n == 0:
+            return
+
+        n_other = other.n*weight
+        n = self.n + n_other
+        delta = other.mean - self.mean
+
+        self.mean += delta*n_other/n
+        self.m2 += other.m2*weight + delta**2*self.n*n_other/n
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum_abs += other.sum_abs*weight
+
+        if self.sample_size > 0:
+            self.sample = self._merge_samples(
+                self.sample, self.n, other.sample, n_other
+            )
+
+        self.n = n
+
+
+    def _merge_samples(self, sample1, n1, sample2, n2):
+        """
+        Combines uniform samples of two populations into a uniform sample of
+        their union. The number of values taken from each sample follows the
+        hypergeometric distribution of a sample of the union. Weighted
+        populations (see :meth:`merge`) are rounded up, and the number of
+        values taken from each sample is capped by its size.
+        """
+
+        size = int(min(
+            self.sample_size, n1 + n2, len(sample1) + len(sample2)
+        ))
+
+        if size == len(sample1) + len(sample2):
+            return np.concatenate([sample1, sample2])
+
+        k1 = self._rng.hypergeometric(int(np.ceil(n1)), int(np.ceil(n2)), size)
+        k1 = min(max(k1, size - len(sample2)), len(sample1))
+
+        return np.concatenate([
+            self._rng.choice(sample1, k1, replace=False),
+            self._rng.choice(sample2, size-k1, replace=False),
+        ])
+
+
+    def quantiles(self, q):
+        """
+        Returns the (approximate) quantiles :code:`q` of the values, or NaNs if
+        no values were seen.
+        """
+
+        if self.sample_size == 0:
+            raise RuntimeError(
+                'Quantiles require an accumulator with sample_size > 0'
+            )
+
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan)
+
+        return np.quantile(self.sample, q)
+
+
+    def result(self, quantiles=None):
+        """
+        Returns a dictionary with the 'average', 'std', 'min', 'max',
+        'average_abs', and 'count' of the values (NaN if no values were seen),
+        and the approximate 'quantiles' (as a dictionary of quantile: value)
+        if :code:`quantiles` is not None.
+        """
+
+        if self.n == 0:
+            results = {
+                'average': np.nan,
+                'std': np.nan,
+                'min': np.nan,
+                'max': np.nan,
+                'average_abs': np.nan,
+            }
+        else:
+            results = {
+                'average': self.mean,
+                'std': np.sqrt(self.m2/self.n),
+                'min': self.min,
+                'max': self.max,
+                'average_abs': self.sum_abs/self.n,
+            }
+
+        results['count'] = self.n
+
+        if quantiles is not None:
+            results['quantiles'] = dict(zip(
+                quantiles, np.atleast_1d(self.quantiles(quantiles)).tolist()
+            ))
+
+        return results
+
+
+class StreamingHistogram:
+    """
+    Accumulates the counts of a stream of values in fixed bins, using constant
+    memory. Accumulators with the same bins can be combined with
+    :meth:`merge`.
+
+    Attributes:
+
+        bin_edges (np.ndarray):
+            The edges of the bins, as returned by :code:`np.histogram`. Values
+            outside of the edges are ignored.
+
+        counts (np.ndarray):
+            The number of values in each bin
+    """
+
+    def __init__(self, bin_edges):
+        self.bin_edges  = np.asarray(bin_edges, dtype=np.float64)
+        self.counts     = np.zeros(self.bin_edges.shape[0]-1, dtype=np.int64)
+
+
+    @classmethod
+    def from_range(cls, vmin, vmax, nbins):
+        """
+        Builds a histogram with :code:`nbins` equal bins between :code:`vmin`
+        and :code:`vmax`. Like :code:`np.histogram`, an empty range is
+        extended by 0.5 on each side, and a missing range defaults to (0, 1).
+        """
+
+        if (vmin is None) or (vmax is None):
+            vmin, vmax = 0.0, 1.0
+
+        if vmin == vmax:
+            vmin, vmax = vmin - 0.5, vmax + 0.5
+
+        return cls(np.linspace(vmin, vmax, nbins+1))
+
+
+    def update(self, values):
+        """Adds an array of values (of any shape) to the counts"""
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+
+        self.counts += np.histogram(values, bins=self.bin_edges)[0]
+
+
+    def merge(self, other):
+        """Adds the counts of another histogram with the same bins"""
+
+        if not np.array_equal(self.bin_edges, other.bin_edges):
+            raise RuntimeError('Histograms must have the same bins to be merged')
+
+        self.counts += other.counts
+
+
+    def result(self):
+        """Returns :code:`(counts, bin_edges)`, like :code:`np.histogram`"""
+
+        return self.counts, self.bin_edges
+
+
+class DistinctCounter:
+    """
+    Approximates the number of distinct values in a stream using a
+    HyperLogLog sketch of :code:`2**precision` registers, so the memory used
+    doesn't depend on the number of values. The relative standard error of
+    the estimate is about :code:`1.04/sqrt(2**precision)` (0.8% for the
+    default precision). Sketches with the same precision can be combined with
+    :meth:`merge`.
+
+    Values are hashed using their :code:`repr`, so values that are equal but
+    of different types (e.g., lists and tuples) are counted separately.
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise RuntimeError('The precision must be between 4 and 18')
+
+        self.precision  = precision
+        self.registers  = np.zeros(2**precision, dtype=np.uint8)
+
+
+    def update(self, values):
+        """Adds an iterable of values to the sketch"""
+
+        hashes = np.fromiter(
+            (
+                int.from_bytes(
+                    blake2b(repr(v).encode(), digest_size=8).digest(), 'big'
+                )
+                for v in values
+            ),
+            dtype=np.uint64
+        )
+
+        if hashes.shape[0] == 0:
+            return
+
+        p = np.uint64(self.precision)
+
+        # The first p bits select the register, and the register keeps the
+        # largest position of the first 1 in the remaining bits
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = hashes << p
+
+        nbits = 64 - self.precision
+        with np.errstate(divide='ignore'):
+            rank = np.where(
+                rest == 0,
+                nbits + 1,
+                64 - np.floor(np.log2(rest.astype(np.float64))).astype(np.int64)
+            )
+
+        rank = np.minimum(rank, nbits + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+
+
+    def merge(self, other):
+        """Adds the values counted by another sketch"""
+
+        if other.precision != self.precision:
+            raise RuntimeError(
+                'Sketches must have the same precision to be merged'
+            )
+
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+
+    def count(self):
+        """Returns the estimated number of distinct values"""
+
+        m = self.registers.shape[0]
+
+        alpha = 0.7213/(1 + 1.079/m)
+        estimate = alpha*m**2/np.sum(2.0**(-self.registers.astype(np.float64)))
+
+        nempty = np.count_nonzero(self.registers == 0)
+
+        # Linear counting is more accurate for small cardinalities
+        if (estimate <= 2.5*m) and (nempty > 0):
+            estimate = m*np.log(m/nempty)
+
+        return int(round(estimate))
+
+
+def ratio_standard_error(strata, ratio):
+    """
+    Returns the standard error of a ratio estimate (e.g., the average of the
+    values in a sample of documents, where each document has a different
+    number of values) from a stratified random sample of documents, using the
+    linearization of the ratio estimator with finite population corrections.
+    Values within a document are treated as a cluster, so correlations within
+    documents are accounted for.
+
+    Args:
+
+        strata (list):
+            A list of :code:`(population, totals, counts)` for each stratum,
+            where :code:`population` is the number of documents in the
+            stratum, and :code:`totals` and :code:`counts` are arrays with the
+            sum and the number of values of each sampled document.
+
+        ratio (float):
+            The estimated ratio (the sum of all of the values divided by their
+            number)
+
+    Returns:
+
+        stderr (float):
+            The standard error of the ratio, or NaN if it can't be estimated
+            (if a stratum has a single sampled document, or none)
+    """
+
+    variance = 0.0
+    total_count = 0.0
+
+    for population, totals, counts in strata:
+        n = len(totals)
+
+        if population == 0:
+            continue
+
+        if (n == 0) or ((n == 1) and (population > 1)):
+            return np.nan
+
+        totals = np.asarray(totals, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.float64)
+
+        total_count += population*np.average(counts)
+
+        if n > 1:
+            residuals = totals - ratio*counts
+
+            variance += population**2*(1 - n/population)*np.var(
+                residuals, ddof=1
+            )/n
+
+    if total_count == 0:
+        return np.nan
+
+    return np.sqrt(variance)/total_count